@@ -0,0 +1,94 @@
+import math
+from typing import Dict, List, Optional, Tuple
+
+from index_segments import BASE, SYNONYMS, IndexGeneration
+
+class BM25Scorer:
+    """
+    Puntuación BM25 / BM25+ sobre una generación del índice.
+    Usa las frecuencias reales de cada término en el documento (número de posiciones
+    de la posting), el número de tokens del documento como longitud y las estadísticas
+    de colección que la generación mantiene de forma incremental (N y tokens totales),
+    de modo que el coste de una consulta solo depende de las postings de sus términos.
+    En una partición se recorren solo sus postings pero se puntúa con las estadísticas
+    de la colección completa, así que los scores son comparables con los del índice.
+    """
+    def __init__(self, k1: float = 1.2, b: float = 0.75, delta: float = 0.0):
+        """
+        Args:
+            k1: Saturación de la frecuencia del término
+            b: Normalización por longitud del documento (0 = ninguna, 1 = completa)
+            delta: Cota inferior de BM25+ para documentos largos (0 = BM25 clásico)
+        """
+        self.k1 = k1
+        self.b = b
+        self.delta = delta
+
+    @staticmethod
+    def idf(doc_freq: int, total_documents: int) -> float:
+        """IDF de BM25 en su variante no negativa: log(1 + (N - df + 0.5) / (df + 0.5))"""
+        return math.log(1 + (total_documents - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def _term_postings(self, generation: IndexGeneration, term: str,
+                       use_synonyms: bool) -> Tuple[int, List[Tuple[int, Dict[str, List[int]]]]]:
+        """
+        Postings de un término por segmento (limitadas a la partición) y su frecuencia
+        documental viva en la colección completa
+        """
+        layers = (BASE, SYNONYMS) if use_synonyms else (BASE,)
+        parts = []
+        for position, segment in enumerate(generation.segments):
+            for layer in layers:
+                for postings in generation.segment_postings(segment, layer, term):
+                    parts.append((position, postings))
+        collection = generation.collection
+        doc_freq = sum(collection.document_frequency(term, layer) for layer in layers) if parts else 0
+        return doc_freq, parts
+
+    def score(self, generation: IndexGeneration, query_weights: Dict[str, float],
+              use_synonyms: bool = True) -> Dict[str, float]:
+        """
+        Puntúa los documentos que contienen algún término de la consulta
+        Args:
+            generation: Generación fijada por la consulta (o una partición suya)
+            query_weights: término -> peso de consulta (frecuencia en la consulta x importancia x penalización)
+            use_synonyms: Si se recorren también las postings de la capa de sinónimos
+        Returns:
+            Dict doc_id -> score BM25 (sin ordenar)
+        """
+        collection = generation.collection
+        total_documents = collection.total_documents
+        if total_documents == 0 or generation.total_documents == 0:
+            return {}
+        avgdl = collection.average_tokens() or 1.0
+        k1, b, delta = self.k1, self.b, self.delta
+        segments, masks = generation.segments, generation.masks
+        scores: Dict[str, float] = {}
+
+        for term, weight in query_weights.items():
+            if weight == 0:
+                continue
+            doc_freq, parts = self._term_postings(generation, term, use_synonyms)
+            if doc_freq <= 0:
+                continue
+            term_weight = weight * self.idf(doc_freq, total_documents)
+            for position, postings in parts:
+                mask = masks[position]
+                token_counts = segments[position].token_counts
+                for doc_id, positions in postings.items():
+                    if mask and doc_id in mask:
+                        continue
+                    tf = len(positions)
+                    norm = k1 * (1 - b + b * token_counts[doc_id] / avgdl)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + term_weight * ((tf * (k1 + 1)) / (tf + norm) + delta)
+        return scores
+
+    def params(self) -> Dict[str, float]:
+        return {'k1': self.k1, 'b': self.b, 'delta': self.delta}
+
+    def with_params(self, k1: Optional[float] = None, b: Optional[float] = None,
+                    delta: Optional[float] = None) -> 'BM25Scorer':
+        """Copia con los parámetros indicados en la petición (el resto, los de este scorer)"""
+        return BM25Scorer(self.k1 if k1 is None else k1,
+                          self.b if b is None else b,
+                          self.delta if delta is None else delta)
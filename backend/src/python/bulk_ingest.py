@@ -0,0 +1,193 @@
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from text_processor import TextProcessor
+from write_ahead_log import WriteAheadLog
+
+# Procesador propio de cada proceso de análisis (se crea en el inicializador del pool)
+_worker_processor: Optional[TextProcessor] = None
+
+def _init_worker():
+    global _worker_processor
+    _worker_processor = TextProcessor()
+
+def _analyze_texts(texts: List[str]) -> List[Dict]:
+    """Analiza un bloque de textos en un proceso del pool"""
+    return [_worker_processor.analyze_document(text) for text in texts]
+
+class BulkIngestor:
+    """
+    Ingesta masiva de reseñas: analiza lotes en paralelo, los escribe en el almacén
+    con un único commit por lote y aplica las actualizaciones del índice en bloque.
+    """
+    def __init__(self, review_handler, workers: Optional[int] = None, chunk_size: int = 64):
+        """
+        Args:
+            review_handler: ReviewFileHandler con el almacén y el índice a actualizar
+            workers: Procesos de análisis (por defecto, número de CPUs; 1 = análisis en línea)
+            chunk_size: Reseñas por tarea enviada a cada proceso
+        """
+        self.review_handler = review_handler
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.chunk_size = chunk_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 1:
+            return None
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        return self._executor
+
+    def analyze(self, texts: List[str]) -> List[Dict]:
+        """Analiza los textos repartiéndolos entre los procesos del pool"""
+        executor = self._get_executor()
+        if executor is None or len(texts) <= self.chunk_size:
+            processor = self.review_handler.text_processor
+            return [processor.analyze_document(text) for text in texts]
+        chunks = [texts[i:i + self.chunk_size] for i in range(0, len(texts), self.chunk_size)]
+        analyses = []
+        for chunk_result in executor.map(_analyze_texts, chunks):
+            analyses.extend(chunk_result)
+        return analyses
+
+    def _mark_duplicates(self, records: List[Tuple[int, Dict]], analyses: List[Dict],
+                         policy: str) -> Tuple[List[Tuple[int, Dict]], List[Dict], List[Dict]]:
+        """
+        Busca casi duplicados de cada reseña en el índice y en las reseñas anteriores del
+        mismo lote (con un LSH local). Las duplicadas se anotan con duplicate_of y, con la
+        política 'skip', se sacan del lote.
+        Returns:
+            Registros y análisis que se ingresan y estados de los descartados
+        """
+        processor = self.review_handler.text_processor
+        batch_lsh = processor.duplicates.new_lsh()
+        batch_signatures = {}
+        kept_records, kept_analyses, skipped = [], [], []
+        for (line, review), analysis in zip(records, analyses):
+            signature = analysis.get('signature')
+            duplicate_of = None
+            matches = processor.find_duplicates(signature, exclude=review['id'])
+            if matches:
+                duplicate_of = matches[0][0]
+            elif signature is not None:
+                similar = [(doc_id, processor.duplicates.hasher.similarity(signature, batch_signatures[doc_id]))
+                           for doc_id in batch_lsh.candidates(signature) if doc_id != review['id']]
+                similar = [match for match in similar if match[1] >= processor.duplicates.threshold]
+                if similar:
+                    duplicate_of = max(similar, key=lambda match: match[1])[0]
+            if duplicate_of is not None:
+                review['duplicate_of'] = duplicate_of
+                if policy == 'skip':
+                    skipped.append({'line': line, 'id': review['id'], 'status': 'duplicate',
+                                    'duplicate_of': duplicate_of})
+                    continue
+            if signature is not None:
+                batch_lsh.add(review['id'], signature)
+                batch_signatures[review['id']] = signature
+            kept_records.append((line, review))
+            kept_analyses.append(analysis)
+        return kept_records, kept_analyses, skipped
+
+    def ingest_batch(self, records: List[Tuple[int, Dict]], duplicates: Optional[str] = None) -> List[Dict]:
+        """
+        Ingresa un lote de reseñas ya validadas
+        Args:
+            records: Pares (número de línea, datos de la reseña)
+            duplicates: Política con las casi duplicadas (allow, link o skip; por defecto
+                        la del ReviewFileHandler)
+        Returns:
+            Estado por registro: {'line', 'id', 'status'[, 'error' | 'duplicate_of']}
+        """
+        if not records:
+            return []
+        policy = self.review_handler.resolve_duplicate_policy(duplicates)
+        for _, review in records:
+            if not review.get('id'):
+                review['id'] = str(uuid.uuid4())
+
+        try:
+            analyses = self.analyze([self.review_handler.index_text(review) for _, review in records])
+        except Exception as e:
+            return [{'line': line, 'id': review['id'], 'status': 'error', 'error': f"análisis: {str(e)}"}
+                    for line, review in records]
+
+        skipped = []
+        # Un solo escritor a la vez (lotes, save_review y checkpoints comparten el lock)
+        with self.review_handler.write_lock:
+            if policy != 'allow':
+                records, analyses, skipped = self._mark_duplicates(records, analyses, policy)
+                if not records:
+                    return skipped
+            # Versiones guardadas de las reseñas del lote, para deshacerlo si falla el almacén
+            store = self.review_handler.store
+            previous = {review['id']: store.get(review['id']) if review['id'] in store else None
+                        for _, review in records}
+            # Group commit en el WAL: el lote es duradero con un único fsync
+            try:
+                self.review_handler.wal.append_many(
+                    (WriteAheadLog.OP_PUT, review['id'], review) for _, review in records)
+            except Exception as e:
+                return skipped + [{'line': line, 'id': review['id'], 'status': 'error', 'error': f"wal: {str(e)}"}
+                                  for line, review in records]
+            
+            processor = self.review_handler.text_processor
+            processed_at = datetime.now().isoformat()
+            for _, review in records:
+                review['metadata'] = {
+                    'fecha_procesamiento': processed_at,
+                    'idioma': 'es',
+                    'version_sistema': '1.0'
+                }
+
+            # Escritura en el almacén sin fsync propio: la durabilidad la da el WAL
+            try:
+                store.put_many((self.review_handler.stored_review(review) for _, review in records), sync=False)
+            except Exception as e:
+                self._undo_batch(previous)
+                return skipped + [{'line': line, 'id': review['id'], 'status': 'error', 'error': f"almacén: {str(e)}"}
+                                  for line, review in records]
+
+            # Actualizaciones del índice en bloque
+            reviews = [review for _, review in records]
+            processor.index_analyses([(review['id'], analysis) for review, analysis in zip(reviews, analyses)],
+                                     self.review_handler.index_categories(reviews),
+                                     self.review_handler.index_ratings(reviews))
+            self.review_handler.maybe_checkpoint()
+
+        statuses = [{'line': line, 'id': review['id'], 'status': 'indexed'} for line, review in records]
+        for status, (_, review) in zip(statuses, records):
+            if 'duplicate_of' in review:
+                status['duplicate_of'] = review['duplicate_of']
+        return skipped + statuses
+
+    def _undo_batch(self, previous: Dict[str, Optional[Dict]]):
+        """
+        Deshace un lote que ya está en el WAL pero no se pudo guardar en el almacén:
+        registra en el WAL la versión anterior de cada reseña (o su borrado si es nueva),
+        para que la reproducción al arrancar no aplique un lote que se informó como
+        fallido, y restaura el almacén (que puede haber guardado parte del lote)
+        """
+        mutations = [(WriteAheadLog.OP_PUT, review_id, review) if review is not None
+                     else (WriteAheadLog.OP_DELETE, review_id, None)
+                     for review_id, review in previous.items()]
+        try:
+            self.review_handler.wal.append_many(mutations)
+        except Exception as e:
+            print(f"Error deshaciendo el lote en el WAL: {str(e)}")
+        try:
+            for op, review_id, review in mutations:
+                if op == WriteAheadLog.OP_PUT:
+                    self.review_handler.store.put(review, sync=False)
+                else:
+                    self.review_handler.store.delete(review_id, sync=False)
+        except Exception as e:
+            print(f"Error restaurando el almacén tras el lote fallido: {str(e)}")
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
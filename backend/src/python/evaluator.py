@@ -1,10 +1,15 @@
 import json
-from typing import List, Set, Dict
+from typing import List, Set, Dict, Optional, Tuple, Union
 import math
+import numpy as np
 from pathlib import Path
 import re
+from pattern_matcher import PatternMatcher
 
 class Evaluator:
+    # Score por debajo del cual un documento recuperado se cuenta como no relevante
+    LOW_SCORE_THRESHOLD = 0.05
+
     def __init__(self, similarity_threshold: float = 0.05):
         """
         Inicializa el evaluador con pseudo-relevance feedback y soporte de sinónimos
@@ -30,6 +35,19 @@ class Evaluator:
             'decepcionante', 'falla', 'problema', 'error', 'defecto', 'no recomendable',
             'insatisfecho', 'inestable'
         }
+        
+        # Patrones que marcan un documento como no relevante en búsquedas booleanas
+        self.nonrelevant_patterns = {
+            'mala batería', 'poca duración', 'dura poco',
+            'batería corta', 'apenas dura'
+        }
+        
+        # Los patrones no relevantes se compilan una sola vez; los términos de cada consulta,
+        # en un autómata cacheado por consulta. Ambos buscan subcadenas del texto en minúsculas
+        self._nonrelevant_matcher = PatternMatcher(
+            [(pattern, 'no_relevante') for pattern in self.nonrelevant_patterns], characters=True).build()
+        self._matcher_cache: Dict[frozenset, PatternMatcher] = {}
+        self._matcher_cache_size = 256
             
     def _load_sinonimos(self) -> Dict:
         """Carga el diccionario de sinónimos"""
@@ -104,6 +122,59 @@ class Evaluator:
         
         return patterns
 
+    def _get_matcher(self, expanded_terms: Set[str]) -> PatternMatcher:
+        """Devuelve el autómata (por caracteres) con los términos de la consulta en minúsculas"""
+        key = frozenset(term.lower() for term in expanded_terms)
+        matcher = self._matcher_cache.get(key)
+        if matcher is None:
+            matcher = PatternMatcher([(term, 'termino') for term in key], characters=True).build()
+            if len(self._matcher_cache) >= self._matcher_cache_size:
+                self._matcher_cache.pop(next(iter(self._matcher_cache)))
+            self._matcher_cache[key] = matcher
+        return matcher
+
+    def judge_document(self, text: str, expanded_terms: Set[str], matcher: PatternMatcher,
+                       window: int = 5) -> Dict:
+        """
+        Analiza un documento en tiempo lineal con los mismos criterios de siempre: términos
+        buscados contenidos en el texto (subcadenas, en una pasada del autómata) y palabras
+        positivas/negativas a menos de window palabras de una aparición exacta de un
+        término, consultadas con sumas acumuladas en lugar de recorrer cada ventana
+        Args:
+            text: Texto de la reseña
+            expanded_terms: Términos de la consulta expandidos con sinónimos
+            matcher: Autómata de los términos devuelto por _get_matcher
+            window: Palabras a cada lado de un término buscado
+        Returns:
+            Dict con el número de términos contenidos y presencia de menciones positivas y negativas
+        """
+        text = text.lower()
+        found = {match.pattern for match in matcher.find_all(text)}
+        words = text.split()
+        size = len(words)
+        positive = [0] * (size + 1)
+        negative = [0] * (size + 1)
+        for position, word in enumerate(words):
+            positive[position + 1] = positive[position] + (word in self.positive_words)
+            negative[position + 1] = negative[position] + (word in self.negative_words)
+        
+        has_positive = has_negative = False
+        for position, word in enumerate(words):
+            if word in expanded_terms:
+                low, high = max(0, position - window), min(size, position + window + 1)
+                has_positive = has_positive or positive[high] > positive[low]
+                has_negative = has_negative or negative[high] > negative[low]
+        
+        return {
+            'matching_terms': sum(1 for term in expanded_terms if term.lower() in found),
+            'has_positive': has_positive,
+            'has_negative': has_negative
+        }
+
+    def is_nonrelevant(self, text: str) -> bool:
+        """Si el texto contiene alguno de los patrones no relevantes (una pasada del autómata)"""
+        return bool(self._nonrelevant_matcher.find_all(text))
+
     def expand_query_terms(self, query_terms: List[str]) -> Set[str]:
         """
         Expande los términos de búsqueda con sus sinónimos
@@ -155,39 +226,27 @@ class Evaluator:
         """
         relevant_docs = set()
         expanded_terms = self.expand_query_terms(query_terms) if query_terms else set()
+        matcher = self._get_matcher(expanded_terms)
         
         for doc in results:
-            review_text = doc.get('resena', '').lower()
             rating = float(doc.get('puntuacion', 0))
             
-            # Contar términos que coinciden
-            matching_terms = sum(1 for term in expanded_terms if term.lower() in review_text)
-            
-            # Buscar palabras positivas cerca de los términos buscados
-            has_positive = False
-            has_negative = False
-            
-            # Dividir el texto en palabras
-            words = review_text.split()
-            
-            # Buscar términos de búsqueda y palabras positivas/negativas cercanas
-            for i, word in enumerate(words):
-                if word in expanded_terms:
-                    # Mirar 5 palabras antes y después
-                    context = words[max(0, i-5):min(len(words), i+6)]
-                    has_positive = has_positive or any(pos in context for pos in self.positive_words)
-                    has_negative = has_negative or any(neg in context for neg in self.negative_words)
+            # Términos contenidos y menciones positivas/negativas a 5 palabras de un término
+            judgment = self.judge_document(doc.get('resena', ''), expanded_terms, matcher)
+            matching_terms = judgment['matching_terms']
             
             # Un documento es relevante si:
             # - Has good rating (≥ 3) OR has positive mentions OR has multiple query terms
             # - AND doesn't have negative mentions
-            if (rating >= 3 or has_positive or matching_terms >= 2) and not has_negative:
-                relevant_docs.add(doc['review_id'])
+            # (las reseñas se identifican por 'id', igual que en get_nonrelevant_docs_boolean;
+            # no tienen campo 'review_id')
+            if (rating >= 3 or judgment['has_positive'] or matching_terms >= 2) and not judgment['has_negative']:
+                relevant_docs.add(doc['id'])
                 
         return relevant_docs
 
     def get_nonrelevant_docs(self, ranked_results: Dict[str, float], 
-                            low_threshold: float = 0.05) -> Set[str]:
+                            low_threshold: float = LOW_SCORE_THRESHOLD) -> Set[str]:
         """
         Determina documentos no relevantes basado en scores bajos
         """
@@ -203,15 +262,9 @@ class Evaluator:
         nonrelevant_docs = set()
         
         for doc in results:
-            if doc['id'] not in relevant_docs:
-                if 'resena' in doc:
-                    text = doc['resena'].lower()
-                    negative_patterns = [
-                        'mala batería', 'poca duración', 'dura poco',
-                        'batería corta', 'apenas dura'
-                    ]
-                    if any(pattern in text for pattern in negative_patterns):
-                        nonrelevant_docs.add(doc['id'])
+            if doc['id'] not in relevant_docs and 'resena' in doc:
+                if self.is_nonrelevant(doc['resena']):
+                    nonrelevant_docs.add(doc['id'])
         
         return nonrelevant_docs
     
@@ -355,4 +408,169 @@ class Evaluator:
             metrics['overall']['recall'] /= total_queries
             metrics['overall']['f1'] /= total_queries
             
-        return metrics 
\ No newline at end of file
+        return metrics
+
+    def runs_to_arrays(self, runs: List[Dict[str, float]],
+                       judgments: Optional[List[Union[Set[str], Dict[str, float]]]] = None
+                       ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Convierte rankings en diccionarios a matrices rellenadas para las métricas por lotes
+        Args:
+            runs: Lista de Dict[doc_id -> score], uno por consulta
+            judgments: Lista de relevantes por consulta (conjunto de doc_id o Dict[doc_id -> grado]);
+                       si es None solo se rellena la matriz de scores
+        Returns:
+            Tuple(scores, relevancia, num_relevantes); las celdas vacías de scores son NaN
+        """
+        width = max((len(run) for run in runs), default=0)
+        scores = np.full((len(runs), width), np.nan)
+        relevance = np.zeros((len(runs), width))
+        num_relevant = np.zeros(len(runs))
+        
+        for row, run in enumerate(runs):
+            if run:
+                scores[row, :len(run)] = np.fromiter(run.values(), dtype=float, count=len(run))
+            if judgments is None:
+                continue
+            labels = judgments[row]
+            if not isinstance(labels, dict):
+                labels = dict.fromkeys(labels, 1.0)
+            relevance[row, :len(run)] = [labels.get(doc_id, 0.0) for doc_id in run]
+            num_relevant[row] = sum(1 for grade in labels.values() if grade > 0)
+        
+        return scores, relevance, num_relevant
+
+    def pseudo_relevance_labels(self, scores: np.ndarray) -> np.ndarray:
+        """
+        Versión vectorizada de get_relevant_docs para una matriz de scores (NaN = vacío)
+        Returns:
+            Matriz binaria de relevancia alineada con scores
+        """
+        scores = np.asarray(scores, dtype=float)
+        filled = np.where(np.isnan(scores), -np.inf, scores)
+        order = np.argsort(-filled, axis=1, kind='stable')
+        ranks = np.empty_like(order)
+        np.put_along_axis(ranks, order, np.arange(scores.shape[1])[None, :], axis=1)
+        
+        # Los scores sobre el umbral forman un prefijo del ranking: los top_k primeros
+        # son relevantes, y además cualquiera que supere 1.5x el umbral
+        above = filled >= self.similarity_threshold
+        high = filled >= self.similarity_threshold * 1.5
+        return ((above & (ranks < self.top_k)) | high).astype(float)
+
+    def batch_metrics(self, scores: np.ndarray, relevance: np.ndarray, k: int = 10,
+                      num_relevant: Optional[np.ndarray] = None) -> Dict:
+        """
+        Calcula métricas de ranking para muchas consultas a la vez con NumPy
+        Args:
+            scores: Matriz (consultas x documentos) de scores; NaN marca posiciones vacías
+            relevance: Matriz de la misma forma con grados de relevancia (0 = no relevante)
+            k: Corte para P@k, R@k y nDCG@k (al menos 1)
+            num_relevant: Relevantes totales por consulta (por defecto, los presentes en cada fila)
+        Returns:
+            Dict con arrays por consulta ('per_query') y medias ('overall')
+        Raises:
+            ValueError: Si k es menor que 1
+        """
+        if k < 1:
+            raise ValueError(f"k debe ser al menos 1 (k={k})")
+        scores = np.asarray(scores, dtype=float)
+        relevance = np.asarray(relevance, dtype=float)
+        num_queries, width = scores.shape if scores.ndim == 2 else (0, 0)
+        valid = ~np.isnan(scores)
+        
+        # Ordenar cada fila por score descendente (las posiciones vacías al final)
+        order = np.argsort(np.where(valid, -scores, np.inf), axis=1, kind='stable')
+        grades = np.take_along_axis(np.where(valid, relevance, 0.0), order, axis=1)
+        hits = grades > 0
+        
+        retrieved = valid.sum(axis=1)
+        if num_relevant is None:
+            num_relevant = hits.sum(axis=1)
+        num_relevant = np.asarray(num_relevant, dtype=float)
+        
+        def safe_div(numerator, denominator):
+            return np.divide(numerator, denominator, out=np.zeros(num_queries), where=denominator > 0)
+        
+        ranks = np.arange(1, width + 1)
+        cumulative_hits = np.cumsum(hits, axis=1)
+        hits_at_k = cumulative_hits[:, min(k, width) - 1] if width else np.zeros(num_queries)
+        total_hits = cumulative_hits[:, -1] if width else np.zeros(num_queries)
+        
+        precision = safe_div(total_hits, retrieved)
+        recall = safe_div(total_hits, num_relevant)
+        f1 = safe_div(2 * precision * recall, precision + recall)
+        average_precision = safe_div((hits * cumulative_hits / ranks).sum(axis=1), num_relevant)
+        
+        first_hit = hits.argmax(axis=1) if width else np.zeros(num_queries, dtype=int)
+        reciprocal_rank = np.where(hits.any(axis=1), 1.0 / (first_hit + 1), 0.0) if width else np.zeros(num_queries)
+        
+        # nDCG@k con ganancia exponencial sobre los grados de relevancia
+        discounts = 1.0 / np.log2(ranks[:k] + 1)
+        dcg = ((2 ** grades[:, :k] - 1) * discounts).sum(axis=1)
+        ideal_grades = -np.sort(-np.where(valid, relevance, 0.0), axis=1)[:, :k]
+        ideal_dcg = ((2 ** ideal_grades - 1) * discounts[:ideal_grades.shape[1]]).sum(axis=1)
+        ndcg = safe_div(dcg, ideal_dcg)
+        
+        per_query = {
+            'precision': precision,
+            'recall': recall,
+            'f1_score': f1,
+            'average_precision': average_precision,
+            'precision_at_k': hits_at_k / k,
+            'recall_at_k': safe_div(hits_at_k, num_relevant),
+            'ndcg_at_k': ndcg,
+            'reciprocal_rank': reciprocal_rank,
+            'retrieved_count': retrieved,
+            'relevant_count': num_relevant,
+            'retrieved_and_relevant': total_hits
+        }
+        
+        def mean(values):
+            return float(values.mean()) if num_queries else 0.0
+        
+        return {
+            'k': k,
+            'per_query': per_query,
+            'overall': {
+                'map': mean(average_precision),
+                'mrr': mean(reciprocal_rank),
+                'ndcg_at_k': mean(ndcg),
+                'precision_at_k': mean(per_query['precision_at_k']),
+                'recall_at_k': mean(per_query['recall_at_k']),
+                'precision': mean(precision),
+                'recall': mean(recall),
+                'f1': mean(f1)
+            }
+        }
+
+    def evaluate_ranked_batch(self, search_results: Dict[str, Dict[str, float]], k: int = 10,
+                              query_terms: Dict[str, List[str]] = None) -> Dict:
+        """
+        Equivalente por lotes de evaluate_ranked_search: misma estructura de salida,
+        con P@k, R@k, nDCG@k y MRR añadidos, calculada de una vez para todas las consultas
+        Args:
+            search_results: Dict[query_id -> Dict[doc_id -> score]]
+            k: Corte para las métricas @k (al menos 1)
+            query_terms: Dict[query_id -> List[términos]]
+        """
+        query_ids = list(search_results.keys())
+        scores, _, _ = self.runs_to_arrays([search_results[query_id] for query_id in query_ids])
+        relevance = self.pseudo_relevance_labels(scores)
+        batch = self.batch_metrics(scores, relevance, k=k)
+        nonrelevant = (np.nan_to_num(scores, nan=np.inf) < self.LOW_SCORE_THRESHOLD).sum(axis=1)
+        
+        per_query = {}
+        for row, query_id in enumerate(query_ids):
+            metrics = {name: float(values[row]) for name, values in batch['per_query'].items()}
+            for name in ('retrieved_count', 'relevant_count', 'retrieved_and_relevant'):
+                metrics[name] = int(metrics[name])
+            metrics['nonrelevant_count'] = int(nonrelevant[row])
+            metrics['expanded_terms'] = (list(self.expand_query_terms(query_terms[query_id]))
+                                         if query_terms and query_id in query_terms else [])
+            per_query[query_id] = metrics
+        
+        return {
+            'per_query': per_query,
+            'overall': batch['overall']
+        }
@@ -171,14 +171,13 @@ class ExperimentRunner:
             )
             processed_with_syn = self.process_search_results(results_with_syn)
             
-            # Búsqueda sin sinónimos
-            self.review_handler.text_processor.use_synonyms = False
+            # Búsqueda sin sinónimos (solo capa base del índice, sin tocar el estado compartido)
             results_without_syn = self.review_handler.search_reviews(
                 need['consulta_libre'], 
-                'tf_idf'
+                'tf_idf',
+                use_synonyms=False
             )
             processed_without_syn = self.process_search_results(results_without_syn)
-            self.review_handler.text_processor.use_synonyms = True
             
             # Evaluar resultados
             scores_with_syn = {str(r['id']): r['score'] for r in processed_with_syn}
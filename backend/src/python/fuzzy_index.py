@@ -0,0 +1,93 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+def edit_distance(a: str, b: str, max_distance: int) -> Optional[int]:
+    """
+    Distancia de Damerau-Levenshtein (alineamiento óptimo: inserción, borrado,
+    sustitución y transposición de letras contiguas) acotada a max_distance.
+    Returns:
+        La distancia o None si supera max_distance
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    if a == b:
+        return 0
+    before_previous_row = previous_row = None
+    row = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        previous_row, row = row, [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous_row[j] + 1, row[j - 1] + 1, previous_row[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, before_previous_row[j - 2] + 1)
+            row[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return None
+        before_previous_row = previous_row
+    return row[-1] if row[-1] <= max_distance else None
+
+class DeletionIndex:
+    """
+    Índice de borrados al estilo SymSpell para corregir términos mal escritos.
+    Al construirlo se generan, para cada palabra del vocabulario, todas las variantes
+    con hasta max_distance letras borradas (solo de los primeros prefix_length
+    caracteres); en una consulta se generan los borrados del término y cada uno se
+    busca en el diccionario, por lo que el coste no depende del tamaño del
+    vocabulario. Los candidatos se verifican con la distancia de edición real.
+    """
+    def __init__(self, words: Dict[str, int], max_distance: int = 2, prefix_length: int = 7):
+        """
+        Args:
+            words: palabra (normalizada) -> frecuencia documental
+            max_distance: Distancia de edición máxima de las correcciones
+            prefix_length: Caracteres de cada palabra que generan borrados
+        """
+        self.words = words
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self._deletes: Dict[str, List[str]] = defaultdict(list)  # borrado -> palabras que lo generan
+        for word in words:
+            for variant in self._variants(word[:prefix_length], max_distance):
+                self._deletes[variant].append(word)
+        self._deletes = dict(self._deletes)
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    @staticmethod
+    def _variants(term: str, max_distance: int) -> Set[str]:
+        """El término y todas sus variantes con hasta max_distance letras borradas"""
+        variants = {term}
+        frontier = {term}
+        for _ in range(max_distance):
+            frontier = {candidate[:i] + candidate[i + 1:] for candidate in frontier if len(candidate) > 1
+                        for i in range(len(candidate))} - variants
+            variants |= frontier
+        return variants
+
+    def lookup(self, term: str, max_distance: Optional[int] = None, limit: int = 5) -> List[Tuple[str, int, int]]:
+        """
+        Palabras del vocabulario a distancia <= max_distance de term
+        Returns:
+            (palabra, distancia, frecuencia) ordenadas por distancia y frecuencia descendente
+        """
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        if term in self.words:
+            return [(term, 0, self.words[term])]
+        candidates = set()
+        for variant in self._variants(term[:self.prefix_length], max_distance):
+            candidates.update(self._deletes.get(variant, ()))
+        matches = []
+        for word in candidates:
+            distance = edit_distance(term, word, max_distance)
+            if distance is not None:
+                matches.append((word, distance, self.words[word]))
+        matches.sort(key=lambda match: (match[1], -match[2], match[0]))
+        return matches[:limit]
+
+    def stats(self) -> Dict:
+        return {'words': len(self.words), 'deletes': len(self._deletes),
+                'max_distance': self.max_distance, 'prefix_length': self.prefix_length}
@@ -0,0 +1,159 @@
+import heapq
+import math
+import threading
+import weakref
+from array import array
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from index_segments import IndexGeneration, IndexSegment
+
+class ImpactList:
+    """
+    Postings de un término en un segmento ordenadas por impacto descendente: documentos,
+    nivel cuantizado de su impacto (array de bytes) y posición del documento en el
+    segmento (para desempatar como el orden de indexación), con los tramos de cada nivel
+    """
+    __slots__ = ('doc_ids', 'levels', 'ordinals', 'runs')
+
+    def __init__(self, doc_ids: List[str], levels: array, ordinals: array):
+        self.doc_ids = doc_ids
+        self.levels = levels
+        self.ordinals = ordinals
+        runs = []  # (nivel, inicio, fin) de cada tramo de documentos con el mismo nivel
+        start = 0
+        for position in range(1, len(levels) + 1):
+            if position == len(levels) or levels[position] != levels[start]:
+                runs.append((levels[start], start, position))
+                start = position
+        self.runs = runs
+
+class ImpactIndex:
+    """
+    Postings ordenadas por impacto para recorridos score-at-a-time con parada temprana.
+    El impacto de una posting es el factor del documento en el score (doc_factor)
+    cuantizado en 256 niveles logarítmicos: nivel = 1 + floor(-log2(factor) * scale),
+    así que 2 ** (-(nivel - 1) / scale) es una cota superior del factor de todo el nivel
+    (el nivel 0 agrupa los factores mayores que 1, sin cota).
+    Como los segmentos son inmutables, las listas de cada (segmento, capa, término) se
+    construyen la primera vez que una consulta las pide y no hay que recalcularlas aunque
+    cambien las estadísticas de la colección: la parte que depende de ellas (IDF, pesos
+    de la consulta) se calcula una vez por término en cada consulta.
+    """
+    def __init__(self, doc_factor: Callable[[IndexSegment, str], float], scale: int = 8):
+        """
+        Args:
+            doc_factor: Factor del documento en el score (no depende de la consulta)
+            scale: Niveles por potencia de 2 (8: niveles separados un 9 %)
+        """
+        self.doc_factor = doc_factor
+        self.scale = scale
+        self._segments = weakref.WeakKeyDictionary()  # segmento -> {(capa, término, categoría) -> ImpactList}
+        self._lock = threading.Lock()
+
+    def level(self, factor: float) -> int:
+        if factor > 1.0:
+            return 0
+        return min(255, 1 + int(-math.log2(factor) * self.scale)) if factor > 0 else 255
+
+    def bound(self, level: int) -> float:
+        """Cota superior del factor de los documentos de un nivel"""
+        return math.inf if level == 0 else 2.0 ** (-(level - 1) / self.scale)
+
+    def _cache(self, segment: IndexSegment) -> Dict:
+        with self._lock:
+            cache = self._segments.get(segment)
+            if cache is None:
+                cache = self._segments[segment] = {}
+        return cache
+
+    def postings(self, segment: IndexSegment, layer: str, term: str,
+                 category: Optional[str] = None) -> Optional[ImpactList]:
+        """
+        Postings de un término en una capa del segmento (o solo las de los documentos de una
+        categoría) ordenadas por impacto (None si no tiene)
+        """
+        if category is None:
+            postings = segment.postings[layer].get(term)
+        else:
+            postings = segment.category_postings(layer, term).get(category) if term in segment.postings[layer] else None
+        if not postings:
+            return None
+        cache = self._cache(segment)
+        impacts = cache.get((layer, term, category))
+        if impacts is None:
+            ordinals = segment.ordinals()
+            entries = sorted((self.level(self.doc_factor(segment, doc_id)), ordinals[doc_id], doc_id)
+                             for doc_id in postings)
+            impacts = ImpactList([doc_id for _, _, doc_id in entries], array('B', (level for level, _, _ in entries)),
+                                 array('I', (ordinal for _, ordinal, _ in entries)))
+            cache[(layer, term, category)] = impacts
+        return impacts
+
+    def search(self, generation: IndexGeneration, terms: Sequence[str], weights: Sequence[float],
+               layers: Iterable[str], score: Callable[[IndexSegment, str, List[int]], float],
+               limit: Optional[int] = None, min_score: Optional[float] = None) -> List[Tuple[str, float]]:
+        """
+        Recorre las postings de los términos nivel a nivel (de mayor a menor impacto).
+        Todas las postings de un documento tienen su mismo nivel, así que al terminar un
+        nivel los scores de sus documentos son definitivos. El recorrido para cuando la cota
+        de los niveles restantes (cota del nivel x suma de weights) queda por debajo de
+        min_score o, con limit, del k-ésimo score. En una partición solo se recorren las
+        listas de sus categorías.
+        Args:
+            terms: Términos de la consulta (en el orden en que score los suma)
+            weights: Peso máximo de cada término: score(doc) <= factor(doc) x suma de los
+                     weights de sus términos
+            score: Score exacto de un documento a partir de los índices de los términos
+                   que contiene (en el orden de terms)
+            limit: Documentos devueltos (None: todos)
+            min_score: Score mínimo de los documentos devueltos
+        Returns:
+            (doc_id, score) ordenados por score descendente y, a igualdad, por orden de indexación
+        """
+        if limit is not None and limit <= 0:
+            return []
+        layers = tuple(layers)
+        categories = (None,) if generation.categories is None else sorted(generation.categories)
+        by_level = defaultdict(list)  # nivel -> (término, segmento, lista, inicio, fin) en el orden de terms
+        for term_index, term in enumerate(terms):
+            for position, segment in enumerate(generation.segments):
+                for layer in layers:
+                    for category in categories:
+                        impacts = self.postings(segment, layer, term, category)
+                        if impacts is not None:
+                            for level, start, end in impacts.runs:
+                                by_level[level].append((term_index, position, impacts, start, end))
+        total_weight = sum(weights)
+        heap: List[Tuple[float, int, int, str]] = []  # (score, -segmento, -ordinal, doc_id): el peor arriba
+        for level in sorted(by_level):
+            bound = self.bound(level) * total_weight * (1 + 1e-9)
+            if (min_score is not None and bound < min_score) or \
+                    (limit is not None and len(heap) >= limit and heap[0][0] > bound):
+                break
+            matched: Dict[Tuple[int, str], List[int]] = {}
+            order: Dict[Tuple[int, str], int] = {}
+            for term_index, position, impacts, start, end in by_level[level]:
+                mask = generation.masks[position]
+                for offset in range(start, end):
+                    doc_id = impacts.doc_ids[offset]
+                    if mask and doc_id in mask:
+                        continue
+                    key = (position, doc_id)
+                    found = matched.get(key)
+                    if found is None:
+                        matched[key] = [term_index]
+                        order[key] = impacts.ordinals[offset]
+                    else:
+                        found.append(term_index)
+            for (position, doc_id), term_indexes in matched.items():
+                item = (score(generation.segments[position], doc_id, term_indexes), -position, -order[(position, doc_id)],
+                        doc_id)
+                if min_score is not None and item[0] < min_score:
+                    continue
+                if limit is None or len(heap) < limit:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+        heap.sort(reverse=True)
+        return [(doc_id, doc_score) for doc_score, _, _, doc_id in heap]
@@ -0,0 +1,98 @@
+import argparse
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+class IndexCompactor:
+    """
+    Compactación del índice (ReviewFileHandler.compact_index) en un hilo en segundo
+    plano: reconciliación con el almacén (o reconstrucción si cambió el diccionario de
+    sinónimos), reescritura sin postings muertas ni términos vacíos y checkpoint.
+    Las búsquedas y escrituras siguen mientras tanto: el análisis de la reconciliación
+    y la fusión de segmentos se hacen fuera del lock de escritura, que solo se toma para
+    aplicar las correcciones y sustituir los segmentos compactados. No se solapa con una
+    reconstrucción del índice (ReviewFileHandler.maintenance).
+    """
+    def __init__(self, review_handler, analyze: Optional[Callable[[List[str]], List[Dict]]] = None):
+        """
+        Args:
+            review_handler: ReviewFileHandler cuyo índice se compacta
+            analyze: Función de análisis por lotes si hay que reconstruir (p. ej. BulkIngestor.analyze)
+        """
+        self.review_handler = review_handler
+        self.analyze = analyze
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._status = {'state': 'idle'}
+        self._started_time = 0.0
+
+    def start(self, reconcile: bool = True) -> bool:
+        """Lanza una compactación (False si ya hay una, o una reconstrucción, en curso)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            if self.review_handler.maintenance_operation is not None:
+                return False
+            self._started_time = time.time()
+            self._status = {
+                'state': 'running',
+                'reconcile': reconcile,
+                'started_at': datetime.now().isoformat(),
+                'finished_at': None,
+                'elapsed_seconds': 0.0
+            }
+            self._thread = threading.Thread(target=self._run, args=(reconcile,), name='index-compaction', daemon=True)
+            self._thread.start()
+            return True
+
+    def _progress(self, processed: int, failed: int, total: int):
+        with self._lock:
+            self._status['processed'] = processed
+            self._status['failed'] = failed
+            self._status['total'] = total
+
+    def run(self, reconcile: bool = True) -> Dict:
+        """Compacta el índice en el hilo actual y devuelve el resultado de compact_index"""
+        return self.review_handler.compact_index(reconcile=reconcile, analyze=self.analyze, progress=self._progress)
+
+    def _run(self, reconcile: bool):
+        try:
+            result = {'state': 'completed', 'result': self.run(reconcile)}
+        except Exception as e:
+            print(f"Error compactando el índice: {str(e)}")
+            result = {'state': 'failed', 'error': str(e)}
+        with self._lock:
+            self._status.update(result)
+            self._status['finished_at'] = datetime.now().isoformat()
+            self._status['elapsed_seconds'] = time.time() - self._started_time
+
+    def status(self) -> Dict:
+        """Estado y resultado de la última compactación"""
+        with self._lock:
+            status = dict(self._status)
+        if status['state'] == 'running':
+            status['elapsed_seconds'] = time.time() - self._started_time
+        return status
+
+    def wait(self, timeout: Optional[float] = None):
+        """Espera a que termine la compactación en curso"""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+def main():
+    """Compactación offline (con el servicio parado): recupera el índice, lo compacta y guarda un checkpoint"""
+    parser = argparse.ArgumentParser(description="Compacta el índice de reseñas sin arrancar el servicio")
+    parser.add_argument('--no-reconcile', action='store_true',
+                        help="No reconciliar el índice con el almacén (solo reescribirlo)")
+    args = parser.parse_args()
+
+    from review_file_handler import ReviewFileHandler
+    handler = ReviewFileHandler()
+    result = IndexCompactor(handler).run(reconcile=not args.no_reconcile)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+class IndexRebuilder:
+    """
+    Reconstrucción del índice en un hilo en segundo plano. El índice nuevo se
+    construye aparte (ReviewFileHandler.rebuild_index) y sustituye al activo de forma
+    atómica; mientras tanto las búsquedas siguen usando el índice anterior completo.
+    """
+    def __init__(self, review_handler, analyze: Optional[Callable[[List[str]], List[Dict]]] = None):
+        """
+        Args:
+            review_handler: ReviewFileHandler cuyo índice se reconstruye
+            analyze: Función de análisis por lotes (p. ej. BulkIngestor.analyze para usar su pool)
+        """
+        self.review_handler = review_handler
+        self.analyze = analyze
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._status = {'state': 'idle'}
+        self._started_time = 0.0
+
+    def start(self) -> bool:
+        """Lanza una reconstrucción (False si ya hay una, o una compactación, en curso)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            if self.review_handler.maintenance_operation is not None:
+                return False
+            self._started_time = time.time()
+            self._status = {
+                'state': 'running',
+                'processed': 0,
+                'failed': 0,
+                'total': len(self.review_handler.store),
+                'started_at': datetime.now().isoformat(),
+                'finished_at': None,
+                'elapsed_seconds': 0.0
+            }
+            self._thread = threading.Thread(target=self._run, name='index-rebuild', daemon=True)
+            self._thread.start()
+            return True
+
+    def _progress(self, processed: int, failed: int, total: int):
+        with self._lock:
+            self._status['processed'] = processed
+            self._status['failed'] = failed
+            self._status['total'] = total
+
+    def _run(self):
+        try:
+            processor = self.review_handler.rebuild_index(analyze=self.analyze, progress=self._progress)
+            with self._lock:
+                failed = self._status['failed']
+            # Las reseñas de los lotes que fallaron no están en el índice nuevo
+            result = {
+                'state': 'completed_with_errors' if failed else 'completed',
+                'documents': processor.total_documents,
+                'vocabulary_size': len(processor.inverted_index)
+            }
+        except Exception as e:
+            print(f"Error reconstruyendo el índice: {str(e)}")
+            result = {'state': 'failed', 'error': str(e)}
+        with self._lock:
+            self._status.update(result)
+            self._status['finished_at'] = datetime.now().isoformat()
+            self._status['elapsed_seconds'] = time.time() - self._started_time
+
+    def status(self) -> Dict:
+        """Estado de la última reconstrucción y su progreso"""
+        with self._lock:
+            status = dict(self._status)
+        if status['state'] == 'running':
+            status['elapsed_seconds'] = time.time() - self._started_time
+            total = status.get('total') or 0
+            status['progress'] = (status['processed'] + status['failed']) / total if total else 0.0
+        return status
+
+    def wait(self, timeout: Optional[float] = None):
+        """Espera a que termine la reconstrucción en curso"""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
@@ -0,0 +1,548 @@
+import math
+import threading
+from array import array
+from collections import OrderedDict, defaultdict
+from collections.abc import Mapping
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
+
+# Capas del índice: términos del texto original y términos que solo aparecen por sinónimos
+BASE = 'base'
+SYNONYMS = 'synonyms'
+
+class IndexSegment:
+    """
+    Segmento inmutable del índice: postings de ambas capas (posiciones de los tokens
+    que generan cada término), longitudes, número de tokens, vectores de términos,
+    firmas MinHash, posiciones de carácter de los tokens, categoría y puntuación de un
+    conjunto de documentos. Una vez publicado no se modifica nunca, por lo que los lectores pueden
+    recorrerlo sin locks mientras los escritores crean segmentos nuevos.
+    """
+    __slots__ = ('postings', 'lengths', 'token_counts', 'vectors', 'signatures', 'offsets', 'categories',
+                 'ratings', '_category_stats', '_category_postings', '_category_lock', '_ordinals', '_size',
+                 '__weakref__')
+    # Términos por segmento cuyas postings repartidas por categoría se conservan (LRU)
+    CATEGORY_POSTINGS_CACHE_SIZE = 256
+
+    def __init__(self, postings: Dict[str, Dict[str, Dict[str, List[int]]]], lengths: Dict[str, int],
+                 token_counts: Dict[str, int], vectors: Optional[Dict[str, Dict[str, float]]] = None,
+                 signatures: Optional[Dict[str, bytes]] = None, offsets: Optional[Dict[str, array]] = None,
+                 categories: Optional[Dict[str, str]] = None, ratings: Optional[array] = None):
+        """
+        Args:
+            postings: capa -> término -> {doc_id -> posiciones}
+            lengths: doc_id -> longitud del documento (la usada por tf_idf)
+            token_counts: doc_id -> número de tokens (la longitud que normaliza BM25)
+            vectors: doc_id -> {stem -> peso} con los stems de más peso (índice directo de "más como este")
+            signatures: doc_id -> firma MinHash del texto (detección de casi duplicados)
+            offsets: doc_id -> [inicio, fin, inicio, fin, ...] en el texto indexado de cada
+                     token (la posición de las postings), para construir fragmentos resaltados
+            categories: doc_id -> categoría de la reseña (partición del índice a la que pertenece)
+            ratings: Puntuación de cada documento en el orden de lengths (columna de
+                     float64; NaN si el documento no tiene puntuación)
+        """
+        self.postings = postings
+        self.lengths = lengths
+        self.token_counts = token_counts
+        self.vectors = vectors if vectors is not None else {}
+        self.signatures = signatures if signatures is not None else {}
+        self.offsets = offsets if offsets is not None else {}
+        self.categories = categories if categories is not None else {}
+        self.ratings = ratings if ratings is not None else array('d', [math.nan]) * len(lengths)
+        self._category_stats = None  # caché de category_stats (el segmento no cambia)
+        # Caché LRU de category_postings: (capa, término) -> categoría -> postings
+        self._category_postings: "OrderedDict[Tuple[str, str], Dict]" = OrderedDict()
+        self._category_lock = threading.Lock()
+        self._ordinals = None  # doc_id -> posición en el orden de lengths
+        self._size = None  # caché de size()
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def __getstate__(self):
+        return {'postings': self.postings, 'lengths': self.lengths, 'token_counts': self.token_counts,
+                'vectors': self.vectors, 'signatures': self.signatures, 'offsets': self.offsets,
+                'categories': self.categories, 'ratings': self.ratings}
+
+    def __setstate__(self, state):
+        self.postings = state['postings']
+        self.lengths = state['lengths']
+        self.token_counts = state['token_counts']
+        self.vectors = state['vectors']
+        self.signatures = state['signatures']
+        self.offsets = state['offsets']
+        self.categories = state['categories']
+        self.ratings = state['ratings']
+        self._category_stats = None
+        self._category_postings = OrderedDict()
+        self._category_lock = threading.Lock()
+        self._ordinals = None
+        self._size = None
+
+    def size(self) -> Dict:
+        """
+        Postings por capa y bytes estimados del segmento serializado, a partir de sus
+        estructuras (términos, posiciones, columnas por documento, vectores, firmas y
+        offsets) sin serializarlo; se calcula la primera vez que se pide
+        """
+        size = self._size
+        if size is None:
+            postings = {}
+            estimated = 0
+            for layer, terms in self.postings.items():
+                postings[layer] = 0
+                for term, documents in terms.items():
+                    postings[layer] += len(documents)
+                    estimated += len(term) + 8
+                    for positions in documents.values():
+                        estimated += 6 + 2 * len(positions)
+            for doc_id in self.lengths:
+                estimated += len(doc_id) + 24  # id, longitud, tokens, puntuación y categoría
+            estimated += sum(len(signature) for signature in self.signatures.values())
+            estimated += sum(offsets.itemsize * len(offsets) for offsets in self.offsets.values())
+            estimated += sum(len(stem) + 12 for vector in self.vectors.values() for stem in vector)
+            size = self._size = {'postings': postings, 'bytes': estimated}
+        return size
+
+    def ordinals(self) -> Dict[str, int]:
+        """doc_id -> posición del documento en el segmento (orden de indexación y fila de las columnas)"""
+        ordinals = self._ordinals
+        if ordinals is None:
+            ordinals = self._ordinals = {doc_id: ordinal for ordinal, doc_id in enumerate(self.lengths)}
+        return ordinals
+
+    def rating(self, doc_id: str) -> Optional[float]:
+        """Puntuación del documento (None si no la tiene)"""
+        rating = self.ratings[self.ordinals()[doc_id]]
+        return None if math.isnan(rating) else rating
+
+    def category_stats(self) -> Dict[str, Tuple[int, int, int]]:
+        """
+        categoría -> (documentos, suma de longitudes, suma de tokens) del segmento; se
+        calcula la primera vez que se pide
+        """
+        stats = self._category_stats
+        if stats is None:
+            totals = defaultdict(lambda: [0, 0, 0])
+            for doc_id, category in self.categories.items():
+                total = totals[category]
+                total[0] += 1
+                total[1] += self.lengths[doc_id]
+                total[2] += self.token_counts[doc_id]
+            stats = self._category_stats = {category: tuple(total) for category, total in totals.items()}
+        return stats
+
+    def category_postings(self, layer: str, term: str) -> Dict[str, Dict[str, List[int]]]:
+        """
+        Postings de un término en una capa repartidas por categoría (categoría ->
+        {doc_id -> posiciones}); se reparten cuando una consulta por categorías las pide,
+        así que buscar en una partición solo recorre las suyas. Solo se conservan las de
+        los CATEGORY_POSTINGS_CACHE_SIZE términos usados más recientemente, para no
+        duplicar con el tiempo todas las postings de un segmento de larga vida
+        """
+        key = (layer, term)
+        cache = self._category_postings
+        with self._category_lock:
+            split = cache.get(key)
+            if split is not None:
+                cache.move_to_end(key)
+                return split
+        split = defaultdict(dict)
+        categories = self.categories
+        for doc_id, positions in self.postings[layer].get(term, {}).items():
+            category = categories.get(doc_id)
+            if category is not None:
+                split[category][doc_id] = positions
+        split = dict(split)
+        with self._category_lock:
+            cache[key] = split
+            while len(cache) > self.CATEGORY_POSTINGS_CACHE_SIZE:
+                cache.popitem(last=False)
+        return split
+
+    @classmethod
+    def merge(cls, segments: List['IndexSegment'], masks: List[FrozenSet[str]]) -> 'IndexSegment':
+        """Fusiona segmentos (del más antiguo al más nuevo) descartando los documentos enmascarados"""
+        builder = SegmentBuilder()
+        for segment, mask in zip(segments, masks):
+            for layer, terms in segment.postings.items():
+                target = builder.postings[layer]
+                for term, postings in terms.items():
+                    live = {doc_id: positions for doc_id, positions in postings.items() if doc_id not in mask}
+                    if live:
+                        target[term].update(live)
+            for doc_id, length in segment.lengths.items():
+                if doc_id not in mask:
+                    builder.lengths[doc_id] = length
+                    builder.token_counts[doc_id] = segment.token_counts[doc_id]
+                    if doc_id in segment.vectors:
+                        builder.vectors[doc_id] = segment.vectors[doc_id]
+                    if doc_id in segment.signatures:
+                        builder.signatures[doc_id] = segment.signatures[doc_id]
+                    if doc_id in segment.offsets:
+                        builder.offsets[doc_id] = segment.offsets[doc_id]
+                    if doc_id in segment.categories:
+                        builder.categories[doc_id] = segment.categories[doc_id]
+                    rating = segment.rating(doc_id)
+                    if rating is not None:
+                        builder.ratings[doc_id] = rating
+        return builder.build()
+
+class SegmentBuilder:
+    """Construye un segmento delta en el escritor antes de publicarlo"""
+    def __init__(self):
+        self.postings = {BASE: defaultdict(dict), SYNONYMS: defaultdict(dict)}
+        self.lengths: Dict[str, int] = {}
+        self.token_counts: Dict[str, int] = {}
+        self.vectors: Dict[str, Dict[str, float]] = {}
+        self.signatures: Dict[str, bytes] = {}
+        self.offsets: Dict[str, array] = {}
+        self.categories: Dict[str, str] = {}
+        self.ratings: Dict[str, float] = {}
+        self._doc_terms: Dict[str, List[Tuple[str, str]]] = {}  # solo para reemplazar un documento repetido en el lote
+
+    def add(self, doc_id: str, length: int, term_positions: Dict[str, List[int]], base_terms: Set[str],
+            token_count: int, vector: Optional[Dict[str, float]] = None,
+            signature: Optional[bytes] = None, offsets: Optional[array] = None,
+            category: Optional[str] = None, rating: Optional[float] = None) -> Dict[str, List[str]]:
+        """
+        Añade un documento: cada término va a la capa base si no depende de sinónimos
+        o a la capa de sinónimos si solo aparece por la expansión
+        Args:
+            term_positions: término -> posiciones de los tokens que lo generan (su frecuencia es len)
+            vector: stem -> peso de los términos principales del documento
+            signature: Firma MinHash del texto del documento
+            offsets: Posiciones de carácter [inicio, fin) de cada token en el texto indexado
+            category: Categoría del documento (sin ella no pertenece a ninguna partición)
+            rating: Puntuación de la reseña (atributo del documento que usa el ranking)
+        Returns:
+            Términos añadidos por capa
+        """
+        if doc_id in self._doc_terms:
+            for layer, term in self._doc_terms.pop(doc_id):
+                self.postings[layer][term].pop(doc_id, None)
+        added = {BASE: [], SYNONYMS: []}
+        doc_terms = []
+        for term, positions in term_positions.items():
+            layer = BASE if term in base_terms else SYNONYMS
+            self.postings[layer][term][doc_id] = positions
+            added[layer].append(term)
+            doc_terms.append((layer, term))
+        self._doc_terms[doc_id] = doc_terms
+        self.lengths[doc_id] = length
+        self.token_counts[doc_id] = token_count
+        if vector is not None:
+            self.vectors[doc_id] = vector
+        else:
+            self.vectors.pop(doc_id, None)
+        if signature is not None:
+            self.signatures[doc_id] = signature
+        else:
+            self.signatures.pop(doc_id, None)
+        if offsets is not None:
+            self.offsets[doc_id] = offsets
+        else:
+            self.offsets.pop(doc_id, None)
+        if category is not None:
+            self.categories[doc_id] = category
+        else:
+            self.categories.pop(doc_id, None)
+        if rating is not None:
+            self.ratings[doc_id] = rating
+        else:
+            self.ratings.pop(doc_id, None)
+        return added
+
+    def build(self) -> IndexSegment:
+        postings = {layer: {term: docs for term, docs in terms.items() if docs}
+                    for layer, terms in self.postings.items()}
+        return IndexSegment(postings, dict(self.lengths), dict(self.token_counts), dict(self.vectors),
+                            dict(self.signatures), dict(self.offsets), dict(self.categories),
+                            array('d', (self.ratings.get(doc_id, math.nan) for doc_id in self.lengths)))
+
+class IndexGeneration:
+    """
+    Versión inmutable y consistente del índice: lista de segmentos (del más antiguo
+    al más nuevo) y, por segmento, los documentos reemplazados o borrados (máscara).
+    Cada escritura publica una generación nueva; una consulta fija la generación al
+    empezar y ve el mismo índice durante toda la petición.
+    Una partición (partition) es una vista de una generación limitada a los documentos
+    de unas categorías: comparte sus segmentos y máscaras y guarda en collection la
+    generación completa, cuyas estadísticas (N, frecuencias documentales, longitud media)
+    usan los motores para puntuar, así que los scores de una partición son los mismos
+    que en el índice completo.
+    """
+    __slots__ = ('number', 'segments', 'masks', 'total_documents', 'total_length', 'total_tokens', 'categories',
+                 '_collection', '_vocabulary', '_document_frequencies', '_partitions')
+
+    def __init__(self, number: int = 0, segments: Tuple[IndexSegment, ...] = (),
+                 masks: Tuple[FrozenSet[str], ...] = (), total_documents: int = 0, total_length: int = 0,
+                 total_tokens: int = 0, categories: Optional[FrozenSet[str]] = None,
+                 collection: Optional['IndexGeneration'] = None):
+        """
+        Args:
+            categories: Categorías de la partición (None: todos los documentos)
+            collection: Generación completa de la que la partición es una vista
+        """
+        self.number = number
+        self.segments = tuple(segments)
+        self.masks = tuple(masks)
+        self.total_documents = total_documents
+        self.total_length = total_length
+        self.total_tokens = total_tokens
+        self.categories = categories
+        self._collection = collection
+        self._vocabulary = {}  # caché por capa (la generación no cambia)
+        self._document_frequencies = {}
+        self._partitions = None
+
+    def __getstate__(self):
+        return {'number': self.number, 'segments': self.segments, 'masks': self.masks,
+                'total_documents': self.total_documents, 'total_length': self.total_length,
+                'total_tokens': self.total_tokens}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @property
+    def collection(self) -> 'IndexGeneration':
+        """Generación completa con las estadísticas de colección (ella misma si no es una partición)"""
+        return self if self._collection is None else self._collection
+
+    def average_length(self) -> float:
+        """Longitud media de los documentos vivos (1.0 si no hay documentos)"""
+        return self.total_length / self.total_documents if self.total_documents > 0 else 1.0
+
+    def average_tokens(self) -> float:
+        """Número medio de tokens por documento (avgdl de BM25)"""
+        return self.total_tokens / self.total_documents if self.total_documents > 0 else 1.0
+
+    def contains(self, segment: IndexSegment, doc_id: str) -> bool:
+        """Si un documento del segmento pertenece a la vista (siempre, si no es una partición)"""
+        return self.categories is None or segment.categories.get(doc_id) in self.categories
+
+    def segment_postings(self, segment: IndexSegment, layer: str, term: str) -> List[Dict[str, List[int]]]:
+        """
+        Postings de un término en un segmento limitadas a la vista, sin aplicar la máscara:
+        las del segmento o, en una partición, las de cada una de sus categorías
+        """
+        if self.categories is None:
+            postings = segment.postings[layer].get(term)
+            return [postings] if postings else []
+        split = segment.category_postings(layer, term)
+        return [split[category] for category in self.categories if category in split]
+
+    def postings(self, term: str, layer: str = BASE) -> Dict[str, List[int]]:
+        """Postings vivas de un término en una capa (no deben modificarse)"""
+        result = None
+        shared = True
+        for segment, mask in zip(self.segments, self.masks):
+            for part in self.segment_postings(segment, layer, term):
+                if mask:
+                    part = {doc_id: positions for doc_id, positions in part.items() if doc_id not in mask}
+                    if not part:
+                        continue
+                if result is None:
+                    result = part
+                else:
+                    if shared:
+                        result = dict(result)
+                        shared = False
+                    result.update(part)
+        return result or {}
+
+    def document_length(self, doc_id: str) -> Optional[int]:
+        for segment, mask in zip(reversed(self.segments), reversed(self.masks)):
+            length = segment.lengths.get(doc_id)
+            if length is not None and doc_id not in mask:
+                return length if self.contains(segment, doc_id) else None
+        return None
+
+    def iter_lengths(self) -> Iterator[Tuple[str, int]]:
+        """Recorre (doc_id, longitud) de los documentos vivos en orden de indexación"""
+        for segment, mask in zip(self.segments, self.masks):
+            if self.categories is not None:
+                for doc_id, length in segment.lengths.items():
+                    if doc_id not in mask and self.contains(segment, doc_id):
+                        yield doc_id, length
+            elif mask:
+                for doc_id, length in segment.lengths.items():
+                    if doc_id not in mask:
+                        yield doc_id, length
+            else:
+                yield from segment.lengths.items()
+
+    def vocabulary(self, layer: str = BASE) -> List[str]:
+        """Términos de la capa con al menos un documento vivo"""
+        vocabulary = self._vocabulary.get(layer)
+        if vocabulary is None:
+            if len(self.segments) == 1 and not self.masks[0] and self.categories is None:
+                vocabulary = list(self.segments[0].postings[layer])
+            else:
+                seen = {}
+                for segment in self.segments:
+                    for term in segment.postings[layer]:
+                        if term not in seen:
+                            seen[term] = bool(self.postings(term, layer))
+                vocabulary = [term for term, live in seen.items() if live]
+            self._vocabulary[layer] = vocabulary
+        return vocabulary
+
+    @staticmethod
+    def _live_count(postings: Dict[str, List[int]], mask: FrozenSet[str]) -> int:
+        """Documentos de unas postings que no están en la máscara"""
+        live = len(postings)
+        if mask:
+            live -= sum(1 for doc_id in mask if doc_id in postings) if len(mask) < live \
+                else sum(1 for doc_id in postings if doc_id in mask)
+        return live
+
+    def document_frequency(self, term: str, layer: str = BASE) -> int:
+        """Número de documentos vivos con el término en la capa (sin fusionar postings)"""
+        doc_freq = 0
+        for segment, mask in zip(self.segments, self.masks):
+            for postings in self.segment_postings(segment, layer, term):
+                doc_freq += self._live_count(postings, mask)
+        return doc_freq
+
+    def category_frequencies(self, term: str, layer: str = BASE) -> Dict[str, int]:
+        """categoría -> número de documentos vivos de la categoría con el término en la capa"""
+        frequencies = defaultdict(int)
+        for segment, mask in zip(self.segments, self.masks):
+            if term in segment.postings[layer]:
+                for category, postings in segment.category_postings(layer, term).items():
+                    frequencies[category] += self._live_count(postings, mask)
+        return dict(frequencies)
+
+    def document_vector(self, doc_id: str) -> Optional[Dict[str, float]]:
+        """Vector de términos de la versión viva del documento (None si no está indexado)"""
+        position = self.locate(doc_id)
+        if position is None:
+            return None
+        return self.segments[position].vectors.get(doc_id, {})
+
+    def document_frequencies(self, layer: str = BASE) -> Dict[str, int]:
+        """término -> número de documentos vivos que lo contienen en la capa (sin fusionar postings)"""
+        frequencies = self._document_frequencies.get(layer)
+        if frequencies is None:
+            frequencies = defaultdict(int)
+            for segment, mask in zip(self.segments, self.masks):
+                for term, postings in segment.postings[layer].items():
+                    if self.categories is None:
+                        live = self._live_count(postings, mask)
+                    else:
+                        live = sum(1 for doc_id in postings if doc_id not in mask and self.contains(segment, doc_id))
+                    if live:
+                        frequencies[term] += live
+            frequencies = dict(frequencies)
+            self._document_frequencies[layer] = frequencies
+        return frequencies
+
+    def locate(self, doc_id: str) -> Optional[int]:
+        """Índice del segmento que contiene la versión viva del documento"""
+        for position in range(len(self.segments) - 1, -1, -1):
+            if doc_id in self.segments[position].lengths and doc_id not in self.masks[position]:
+                return position if self.contains(self.segments[position], doc_id) else None
+        return None
+
+    def rating(self, doc_id: str) -> Optional[float]:
+        """Puntuación de la versión viva del documento (None si no la tiene o no está indexado)"""
+        position = self.locate(doc_id)
+        if position is None:
+            return None
+        return self.segments[position].rating(doc_id)
+
+    def partition(self, categories: Iterable[str]) -> 'IndexGeneration':
+        """
+        Vista de la generación limitada a los documentos de unas categorías: los segmentos
+        con documentos vivos de alguna de ellas, con sus mismas máscaras, y sus propios
+        totales. Los documentos no se copian ni se enmascaran uno a uno: la categoría de
+        cada documento está en su segmento (IndexSegment.categories).
+        """
+        categories = frozenset(categories)
+        segments, masks = [], []
+        totals = [0, 0, 0]
+        for segment, mask in zip(self.segments, self.masks):
+            stats = segment.category_stats()
+            dead = defaultdict(list)  # categoría -> documentos enmascarados
+            for doc_id in mask:
+                category = segment.categories.get(doc_id)
+                if category in categories:
+                    dead[category].append(doc_id)
+            live = 0
+            for category in categories & stats.keys():
+                documents, length, tokens = stats[category]
+                removed = dead.get(category, ())
+                live += documents - len(removed)
+                totals[0] += documents - len(removed)
+                totals[1] += length - sum(segment.lengths[doc_id] for doc_id in removed)
+                totals[2] += tokens - sum(segment.token_counts[doc_id] for doc_id in removed)
+            if live:
+                segments.append(segment)
+                masks.append(mask)
+        return IndexGeneration(self.number, segments, masks, *totals, categories=categories, collection=self)
+
+    def partitions(self) -> Dict[str, 'IndexGeneration']:
+        """
+        Subíndices por categoría (partition de cada categoría), calculados una vez por
+        generación a partir de las estadísticas por categoría de cada segmento, que se
+        reutilizan entre generaciones
+        """
+        partitions = self._partitions
+        if partitions is None:
+            categories = set()
+            for segment in self.segments:
+                categories.update(segment.category_stats())
+            partitions = {category: self.partition([category]) for category in sorted(categories)}
+            partitions = {category: partition for category, partition in partitions.items()
+                          if partition.total_documents > 0}
+            self._partitions = partitions
+        return partitions
+
+    def stats(self) -> Dict:
+        return {
+            'generation': self.number,
+            'segments': [len(segment) for segment in self.segments],
+            'masked_documents': sum(len(mask) for mask in self.masks),
+            'total_documents': self.total_documents
+        }
+
+class PostingsView(Mapping):
+    """Vista de solo lectura término -> postings de una capa de una generación"""
+    def __init__(self, generation: IndexGeneration, layer: str):
+        self._generation = generation
+        self._layer = layer
+
+    def __getitem__(self, term: str) -> Dict[str, List[int]]:
+        postings = self._generation.postings(term, self._layer)
+        if not postings:
+            raise KeyError(term)
+        return postings
+
+    def __contains__(self, term) -> bool:
+        return bool(self._generation.postings(term, self._layer))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._generation.vocabulary(self._layer))
+
+    def __len__(self) -> int:
+        return len(self._generation.vocabulary(self._layer))
+
+class DocumentLengthsView(Mapping):
+    """Vista de solo lectura doc_id -> longitud de los documentos vivos de una generación"""
+    def __init__(self, generation: IndexGeneration):
+        self._generation = generation
+
+    def __getitem__(self, doc_id: str) -> int:
+        length = self._generation.document_length(doc_id)
+        if length is None:
+            raise KeyError(doc_id)
+        return length
+
+    def __contains__(self, doc_id) -> bool:
+        return self._generation.document_length(doc_id) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return (doc_id for doc_id, _ in self._generation.iter_lengths())
+
+    def __len__(self) -> int:
+        return self._generation.total_documents
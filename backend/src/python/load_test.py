@@ -0,0 +1,358 @@
+"""
+Generador de carga para el servicio: reproduce una mezcla de consultas contra la API y
+mide cuántas peticiones por segundo aguanta una instancia y cómo crece la latencia con
+la concurrencia.
+
+La mezcla sale de necesidades_informacion.json (consulta libre con tf_idf y bm25,
+consulta booleana con boolean), de los ejemplos de búsqueda de docs/Peticiones_Postman.md
+o de un registro de consultas en JSON Lines (un cuerpo de /search por línea, o
+{"method", "path", "body"}). Las peticiones se envían al servicio en el mismo proceso
+(transporte ASGI de httpx, sin red) o a un uvicorn local con --url. En el mismo proceso la
+app corre en un hilo con su propio bucle de eventos, así que el generador no mide sus
+propias esperas como latencia del servicio; aun así ambos comparten el GIL, por lo que
+las cifras de capacidad de una instancia se deben medir con --url.
+
+Sin --rate la carga es cerrada: --concurrency clientes envían una petición tras otra.
+Con --rate la carga es abierta: las llegadas siguen un proceso de Poisson de --rate
+peticiones por segundo con como mucho --concurrency en vuelo, y la latencia se mide
+desde la llegada prevista (incluye la espera), no desde el envío.
+
+Uso:
+    python load_test.py --source necesidades --concurrency 8 --duration 30
+    python load_test.py --url http://localhost:8000 --source postman --rate 20 --duration 60
+    python load_test.py --source log --log consultas.jsonl --requests 500 --output carga.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+DATA_DIR = Path(__file__).parent / 'data'
+POSTMAN_PATH = Path(__file__).resolve().parents[3] / 'docs' / 'Peticiones_Postman.md'
+
+def necesidades_queries(path: Path = DATA_DIR / 'necesidades_informacion.json') -> List[Dict]:
+    """Búsquedas de las necesidades de información: libre con tf_idf y bm25, booleana con boolean"""
+    with open(path, 'r', encoding='utf-8') as f:
+        necesidades = json.load(f)['necesidades']
+    queries = []
+    for necesidad in necesidades:
+        for search_type in ('tf_idf', 'bm25'):
+            queries.append(search_request({'query': necesidad['consulta_libre'], 'search_type': search_type}))
+        queries.append(search_request({'query': necesidad['consulta_booleana'], 'search_type': 'boolean'}))
+    return queries
+
+def postman_queries(path: Path = POSTMAN_PATH) -> List[Dict]:
+    """
+    Peticiones de ejemplo de la sección de búsqueda de Peticiones_Postman.md: los bloques
+    http (método, ruta y cuerpo) y los cuerpos json con query que no son respuestas
+    """
+    text = path.read_text(encoding='utf-8')
+    start = text.index('## 1. Búsqueda')
+    end = text.find('\n## ', start + 1)
+    section = text[start:end if end != -1 else len(text)]
+    queries = []
+    for language, block in re.findall(r'```(http|json)\n(.*?)```', section, re.S):
+        if language == 'http':
+            head, _, body = block.partition('\n\n')
+            method, url = head.split('\n')[0].split()[:2]
+            route = '/' + url.split('://', 1)[-1].split('/', 1)[-1]
+            if '{' in route:  # rutas con parámetros de ejemplo ({metrics_id})
+                continue
+            body = json.loads(body) if body.strip() else None
+            queries.append({'method': method, 'path': route, 'body': body, 'label': label_for(method, route, body)})
+        else:
+            try:
+                body = json.loads(block)
+            except ValueError:
+                continue
+            if isinstance(body, dict) and 'query' in body and 'results' not in body:
+                queries.append(search_request(body))
+    return queries
+
+def log_queries(path: Path) -> List[Dict]:
+    """Registro de consultas en JSON Lines: un cuerpo de /search o {"method", "path", "body"} por línea"""
+    queries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if 'path' in entry:
+                method = entry.get('method', 'POST').upper()
+                queries.append({'method': method, 'path': entry['path'], 'body': entry.get('body'),
+                                'label': label_for(method, entry['path'], entry.get('body'))})
+            else:
+                queries.append(search_request(entry))
+    return queries
+
+def search_request(body: Dict) -> Dict:
+    return {'method': 'POST', 'path': '/search', 'body': body, 'label': label_for('POST', '/search', body)}
+
+def label_for(method: str, path: str, body: Optional[Dict]) -> str:
+    """Grupo de la petición en el informe: tipo de búsqueda en /search y método y ruta en el resto"""
+    if path == '/search' and body is not None:
+        return f"search:{body.get('search_type', 'tf_idf')}"
+    return f"{method} {path.split('?')[0]}"
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """Media, p50, p90, p95, p99 y máximo (en milisegundos, por rango más cercano)"""
+    if not values:
+        return {'mean': None, 'p50': None, 'p90': None, 'p95': None, 'p99': None, 'max': None}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        return round(ordered[max(0, min(len(ordered) - 1, int(q * len(ordered) + 0.999999) - 1))] * 1000, 3)
+
+    return {'mean': round(sum(ordered) / len(ordered) * 1000, 3), 'p50': rank(0.5), 'p90': rank(0.9),
+            'p95': rank(0.95), 'p99': rank(0.99), 'max': round(ordered[-1] * 1000, 3)}
+
+class LoadTest:
+    """Envía la mezcla de peticiones con el modelo de carga elegido y agrega los tiempos"""
+    def __init__(self, queries: List[Dict], concurrency: int = 8, rate: Optional[float] = None,
+                 duration: Optional[float] = 30.0, max_requests: Optional[int] = None, warmup: int = 0,
+                 seed: int = 0):
+        """
+        Args:
+            queries: Peticiones ({'method', 'path', 'body', 'label'}) que se eligen al azar
+            concurrency: Clientes (carga cerrada) o peticiones en vuelo como máximo (carga abierta)
+            rate: Llegadas por segundo (None: carga cerrada)
+            duration: Segundos de medida (None: hasta max_requests)
+            max_requests: Peticiones medidas como máximo
+            warmup: Peticiones que se envían antes de medir (una por una)
+        """
+        if not queries:
+            raise ValueError("La mezcla de consultas está vacía")
+        if duration is None and max_requests is None:
+            raise ValueError("Hay que indicar duration o max_requests")
+        self.queries = queries
+        self.concurrency = concurrency
+        self.rate = rate
+        self.duration = duration
+        self.max_requests = max_requests
+        self.warmup = warmup
+        self.random = random.Random(seed)
+        self.samples: List[Dict] = []
+
+    async def send(self, client: httpx.AsyncClient, query: Dict, scheduled: Optional[float] = None):
+        """Envía una petición y guarda su estado y latencias (desde el envío y desde la llegada prevista)"""
+        started = time.perf_counter()
+        status, error = None, None
+        try:
+            response = await client.request(query['method'], query['path'], json=query['body'])
+            status = response.status_code
+            if status >= 400:
+                error = f"HTTP {status}"
+        except Exception as e:
+            error = type(e).__name__
+        finished = time.perf_counter()
+        self.samples.append({'label': query['label'], 'status': status, 'error': error,
+                             'service': finished - started,
+                             'latency': finished - (started if scheduled is None else scheduled)})
+
+    def _budget_left(self, issued: int, deadline: Optional[float]) -> bool:
+        if self.max_requests is not None and issued >= self.max_requests:
+            return False
+        return deadline is None or time.perf_counter() < deadline
+
+    async def _closed(self, client: httpx.AsyncClient, deadline: Optional[float]):
+        issued = 0
+
+        async def worker():
+            nonlocal issued
+            while self._budget_left(issued, deadline):
+                issued += 1
+                await self.send(client, self.random.choice(self.queries))
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+
+    async def _open(self, client: httpx.AsyncClient, deadline: Optional[float]):
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = []
+
+        async def arrival(query: Dict, scheduled: float):
+            async with slots:
+                await self.send(client, query, scheduled)
+
+        issued = 0
+        next_arrival = time.perf_counter()
+        while self._budget_left(issued, deadline):
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(arrival(self.random.choice(self.queries), next_arrival)))
+            issued += 1
+            next_arrival += self.random.expovariate(self.rate)
+        await asyncio.gather(*tasks)
+
+    async def run(self, client: httpx.AsyncClient) -> Dict:
+        for query in self.queries[:self.warmup]:
+            await self.send(client, query)
+        self.samples = []
+        started = time.perf_counter()
+        deadline = started + self.duration if self.duration is not None else None
+        if self.rate is None:
+            await self._closed(client, deadline)
+        else:
+            await self._open(client, deadline)
+        return self.report(time.perf_counter() - started)
+
+    def report(self, elapsed: float) -> Dict:
+        """Throughput, percentiles de latencia y errores, en total y por grupo de petición"""
+        by_label = defaultdict(list)
+        for sample in self.samples:
+            by_label[sample['label']].append(sample)
+        errors = [sample for sample in self.samples if sample['error']]
+        report = {
+            'mode': 'closed' if self.rate is None else 'open',
+            'concurrency': self.concurrency,
+            'rate': self.rate,
+            'elapsed': round(elapsed, 3),
+            'requests': len(self.samples),
+            'throughput': round(len(self.samples) / elapsed, 3) if elapsed > 0 else None,
+            'errors': len(errors),
+            'error_rate': round(len(errors) / len(self.samples), 4) if self.samples else None,
+            'status_codes': dict(Counter(str(sample['status']) for sample in self.samples)),
+            'error_types': dict(Counter(sample['error'] for sample in errors)),
+            'latency_ms': percentiles([sample['latency'] for sample in self.samples]),
+            'by_label': {label: {'requests': len(samples),
+                                 'errors': sum(1 for sample in samples if sample['error']),
+                                 'latency_ms': percentiles([sample['latency'] for sample in samples])}
+                         for label, samples in sorted(by_label.items())}
+        }
+        if self.rate is not None:
+            # En carga abierta latency incluye la espera por un hueco; service es solo la petición
+            report['service_ms'] = percentiles([sample['service'] for sample in self.samples])
+        return report
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float) -> bool:
+    """Espera a que /health/ready responda 200 (índice cargado y caliente)"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if (await client.get('/health/ready')).status_code == 200:
+                return True
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    return False
+
+class ServiceLoop:
+    """
+    Bucle de eventos propio en un hilo para la app en el mismo proceso: el arranque, las
+    peticiones y la parada se ejecutan en él, separados del bucle del generador de carga
+    """
+    def __init__(self, app):
+        self.app = app
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='load-test-service', daemon=True)
+
+    async def call(self, coroutine):
+        """Ejecuta coroutine en el bucle del servicio y espera el resultado desde el bucle actual"""
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, self.loop))
+
+    async def start(self):
+        self.thread.start()
+        await self.call(self.app.router.startup())
+
+    async def stop(self):
+        try:
+            await self.call(self.app.router.shutdown())
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+
+class ServiceTransport(httpx.AsyncBaseTransport):
+    """Transporte ASGI que atiende cada petición en el bucle de ServiceLoop"""
+    def __init__(self, service: ServiceLoop):
+        self.service = service
+        self.transport = httpx.ASGITransport(app=service.app)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        async def handle():
+            response = await self.transport.handle_async_request(request)
+            # Cuerpo sin decodificar: las cabeceras (content-encoding) viajan con él
+            content = b''.join([chunk async for chunk in response.aiter_raw()])
+            await response.aclose()
+            return response.status_code, response.headers, content
+
+        status_code, headers, content = await self.service.call(handle())
+        return httpx.Response(status_code, headers=headers, content=content, request=request)
+
+async def run_load_test(test: LoadTest, url: Optional[str] = None, ready_timeout: float = 120.0,
+                        timeout: float = 60.0) -> Dict:
+    """Ejecuta la prueba contra url o, sin ella, contra la app en el mismo proceso (transporte ASGI)"""
+    if url is not None:
+        async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+            if not await wait_ready(client, ready_timeout):
+                raise RuntimeError(f"El servicio en {url} no está listo")
+            report = await test.run(client)
+        report['target'] = url
+        return report
+
+    from text_service import app
+    service = ServiceLoop(app)
+    await service.start()
+    try:
+        transport = ServiceTransport(service)
+        async with httpx.AsyncClient(transport=transport, base_url='http://load-test', timeout=timeout) as client:
+            if not await wait_ready(client, ready_timeout):
+                raise RuntimeError("El índice no está listo")
+            report = await test.run(client)
+    finally:
+        await service.stop()
+    report['target'] = 'asgi'
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API de búsqueda")
+    parser.add_argument('--source', choices=['necesidades', 'postman', 'log'], default='necesidades',
+                        help="Origen de la mezcla de consultas")
+    parser.add_argument('--log', type=Path, help="Registro de consultas (JSON Lines) para --source log")
+    parser.add_argument('--url', help="Servicio en marcha (p. ej. http://localhost:8000); sin él, en el mismo proceso")
+    parser.add_argument('--concurrency', type=int, default=8, help="Clientes o peticiones en vuelo")
+    parser.add_argument('--rate', type=float, help="Llegadas por segundo (carga abierta); sin él, carga cerrada")
+    parser.add_argument('--duration', type=float, default=30.0, help="Segundos de medida")
+    parser.add_argument('--requests', type=int, help="Peticiones medidas como máximo (con --duration 0, sin límite de tiempo)")
+    parser.add_argument('--warmup', type=int, default=0, help="Peticiones de calentamiento antes de medir")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=60.0, help="Timeout de cada petición en segundos")
+    parser.add_argument('--output', type=Path, help="Fichero en el que guardar el informe JSON")
+    parser.add_argument('--verbose', action='store_true', help="No silenciar las trazas del servicio en el mismo proceso")
+    args = parser.parse_args()
+
+    if args.source == 'necesidades':
+        queries = necesidades_queries()
+    elif args.source == 'postman':
+        queries = postman_queries()
+    else:
+        if args.log is None:
+            parser.error("--source log necesita --log")
+        queries = log_queries(args.log)
+    test = LoadTest(queries, args.concurrency, args.rate, args.duration or None, args.requests, args.warmup, args.seed)
+
+    # Las trazas del servicio (print) irían a la misma salida que el informe
+    quiet = args.url is None and not args.verbose
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull if quiet else sys.stdout):
+        report = asyncio.run(run_load_test(test, args.url, timeout=args.timeout))
+    report['source'] = args.source
+    report['queries'] = len(queries)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.write_text(output, encoding='utf-8')
+    print(output)
+
+if __name__ == "__main__":
+    main()
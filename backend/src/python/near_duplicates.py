@@ -0,0 +1,188 @@
+import threading
+import weakref
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from index_segments import IndexGeneration, IndexSegment
+
+class MinHasher:
+    """
+    Firmas MinHash de un texto sobre sus shingles de palabras. Las permutaciones se
+    generan con una semilla fija, así que las firmas calculadas en otro proceso (p. ej.
+    en el pool de la ingesta masiva) o antes de un reinicio son comparables.
+    """
+    PRIME = (1 << 31) - 1
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 3, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        random_state = np.random.RandomState(seed)
+        self._a = random_state.randint(1, self.PRIME, size=num_perm, dtype=np.uint64)
+        self._b = random_state.randint(0, self.PRIME, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, tokens: List[str]) -> Set[str]:
+        """Secuencias de shingle_size palabras (el texto entero si es más corto)"""
+        if len(tokens) < self.shingle_size:
+            return {' '.join(tokens)} if tokens else set()
+        return {' '.join(tokens[i:i + self.shingle_size]) for i in range(len(tokens) - self.shingle_size + 1)}
+
+    def signature(self, tokens: List[str]) -> Optional[bytes]:
+        """Firma de num_perm valores uint32 (None si el texto no tiene tokens)"""
+        shingles = self.shingles(tokens)
+        if not shingles:
+            return None
+        hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) % self.PRIME for shingle in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        permuted = (hashes[:, None] * self._a + self._b) % self.PRIME
+        return permuted.min(axis=0).astype(np.uint32).tobytes()
+
+    @staticmethod
+    def similarity(signature_a: bytes, signature_b: bytes) -> float:
+        """Estimación de la similitud de Jaccard: fracción de valores iguales de las firmas"""
+        return float(np.mean(np.frombuffer(signature_a, dtype=np.uint32) == np.frombuffer(signature_b, dtype=np.uint32)))
+
+class LSHIndex:
+    """
+    Locality-Sensitive Hashing por bandas: la firma se divide en bands bandas de rows
+    valores y dos documentos son candidatos si coinciden en alguna banda completa.
+    Con 16 x 8 la probabilidad de ser candidato supera 0.5 a partir de Jaccard ~0.7.
+    """
+    def __init__(self, bands: int = 16, rows: int = 8):
+        self.bands = bands
+        self.rows = rows
+        self._band_bytes = rows * 4
+        self._buckets: List[Dict[bytes, List[str]]] = [defaultdict(list) for _ in range(bands)]
+
+    def _keys(self, signature: bytes) -> Iterable[Tuple[int, bytes]]:
+        for band in range(self.bands):
+            yield band, signature[band * self._band_bytes:(band + 1) * self._band_bytes]
+
+    def add(self, doc_id: str, signature: bytes):
+        for band, key in self._keys(signature):
+            self._buckets[band][key].append(doc_id)
+
+    def candidates(self, signature: bytes) -> Set[str]:
+        found = set()
+        for band, key in self._keys(signature):
+            found.update(self._buckets[band].get(key, ()))
+        return found
+
+    def buckets(self) -> Iterable[List[str]]:
+        """Cubetas con más de un documento (pares candidatos)"""
+        for buckets in self._buckets:
+            for doc_ids in buckets.values():
+                if len(doc_ids) > 1:
+                    yield doc_ids
+
+class NearDuplicateDetector:
+    """
+    Detección de reseñas casi duplicadas con MinHash + LSH sobre las firmas que cada
+    documento guarda en su segmento del índice. Las cubetas LSH se construyen por
+    segmento la primera vez que se consultan y se reutilizan mientras el segmento siga
+    vivo, de modo que una comprobación cuesta unas búsquedas en diccionarios por banda
+    y segmento, sin recorrer la colección.
+    """
+    def __init__(self, num_perm: int = 128, bands: int = 16, threshold: float = 0.8):
+        """
+        Args:
+            num_perm: Valores de cada firma (bands x rows)
+            bands: Bandas del LSH
+            threshold: Similitud de Jaccard estimada a partir de la cual dos reseñas son duplicadas
+        """
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self._segment_lsh = weakref.WeakKeyDictionary()  # segmento -> LSHIndex de sus firmas
+        self._lock = threading.Lock()
+
+    def new_lsh(self) -> LSHIndex:
+        return LSHIndex(self.bands, self.rows)
+
+    def _lsh(self, segment: IndexSegment) -> LSHIndex:
+        with self._lock:
+            lsh = self._segment_lsh.get(segment)
+        if lsh is None:
+            lsh = self.new_lsh()
+            for doc_id, signature in segment.signatures.items():
+                lsh.add(doc_id, signature)
+            with self._lock:
+                self._segment_lsh[segment] = lsh
+        return lsh
+
+    def find(self, generation: IndexGeneration, signature: Optional[bytes],
+             exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        Documentos vivos de la generación casi duplicados de una firma
+        Returns:
+            (doc_id, similitud) con similitud >= threshold, de mayor a menor
+        """
+        if signature is None:
+            return []
+        matches = []
+        for segment, mask in zip(generation.segments, generation.masks):
+            for doc_id in self._lsh(segment).candidates(signature):
+                if doc_id == exclude or doc_id in mask:
+                    continue
+                similarity = MinHasher.similarity(signature, segment.signatures[doc_id])
+                if similarity >= self.threshold:
+                    matches.append((doc_id, similarity))
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        return matches
+
+    def clusters(self, generation: IndexGeneration) -> List[Dict]:
+        """
+        Agrupa los documentos vivos casi duplicados (componentes conexas de los pares
+        candidatos del LSH que superan threshold)
+        Returns:
+            Grupos {'ids', 'size', 'min_similarity'} ordenados por tamaño
+        """
+        signatures = {}
+        for segment, mask in zip(generation.segments, generation.masks):
+            signatures.update((doc_id, signature) for doc_id, signature in segment.signatures.items()
+                              if doc_id not in mask)
+        lsh = self.new_lsh()
+        for doc_id, signature in signatures.items():
+            lsh.add(doc_id, signature)
+
+        parent: Dict[str, str] = {}
+        def find_root(doc_id: str) -> str:
+            root = doc_id
+            while parent[root] != root:
+                root = parent[root]
+            while parent[doc_id] != root:
+                parent[doc_id], doc_id = root, parent[doc_id]
+            return root
+
+        duplicate_pairs: Dict[Tuple[str, str], float] = {}
+        checked = set()
+        for doc_ids in lsh.buckets():
+            for i, first in enumerate(doc_ids):
+                for second in doc_ids[i + 1:]:
+                    pair = (first, second) if first < second else (second, first)
+                    if pair in checked:
+                        continue
+                    checked.add(pair)
+                    similarity = MinHasher.similarity(signatures[first], signatures[second])
+                    if similarity >= self.threshold:
+                        duplicate_pairs[pair] = similarity
+                        parent.setdefault(first, first)
+                        parent.setdefault(second, second)
+                        root_first, root_second = find_root(first), find_root(second)
+                        if root_first != root_second:
+                            parent[root_second] = root_first
+
+        groups = defaultdict(list)
+        for doc_id in parent:
+            groups[find_root(doc_id)].append(doc_id)
+        min_similarity = {}
+        for pair, similarity in duplicate_pairs.items():
+            root = find_root(pair[0])
+            min_similarity[root] = min(similarity, min_similarity.get(root, 1.0))
+        clusters = [{'ids': sorted(doc_ids), 'size': len(doc_ids), 'min_similarity': min_similarity[root]}
+                    for root, doc_ids in groups.items()]
+        clusters.sort(key=lambda cluster: (-cluster['size'], cluster['ids']))
+        return clusters
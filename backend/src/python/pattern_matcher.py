@@ -0,0 +1,104 @@
+import re
+from collections import deque, namedtuple
+from typing import Dict, Iterable, List, Tuple
+
+# Coincidencia de un patrón: posiciones en palabras [start, end) del texto
+PatternMatch = namedtuple('PatternMatch', ['start', 'end', 'label', 'pattern'])
+
+class PatternMatcher:
+    """
+    Autómata Aho-Corasick a nivel de palabra (o de carácter) con coincidencias
+    posicionales. Los patrones se compilan una sola vez y cada texto se recorre en una
+    única pasada, independientemente del número de patrones.
+    """
+    # Comodín para patrones numéricos como "dura más de [0-9]+ horas"
+    NUMBER = '[0-9]+'
+
+    _WORD_RE = re.compile(r'[0-9]+|[^\W\d_]+')
+    _ACCENTS = str.maketrans('áéíóúüàèìòùñ', 'aeiouuaeioun')
+
+    def __init__(self, patterns: Iterable[Tuple[str, str]] = (), characters: bool = False):
+        """
+        Args:
+            patterns: Pares (patrón, etiqueta); un patrón puede tener varias etiquetas
+            characters: Buscar los patrones como subcadenas del texto en minúsculas (como
+                        `patrón in texto`) en lugar de como secuencias de palabras normalizadas
+        """
+        self.characters = characters
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._terminal: List[List[Tuple[str, str, int]]] = [[]]  # patrones que terminan en cada estado
+        self._output: List[List[Tuple[str, str, int]]] = [[]]  # terminales más los heredados por fallo
+        self._built = False
+        for pattern, label in patterns:
+            self.add(pattern, label)
+
+    @classmethod
+    def tokenize(cls, text: str) -> List[str]:
+        """Divide el texto en palabras normalizadas (minúsculas, sin acentos, números como comodín)"""
+        words = cls._WORD_RE.findall(text.lower().translate(cls._ACCENTS))
+        return [cls.NUMBER if word.isdigit() else word for word in words]
+
+    def add(self, pattern: str, label: str):
+        """Añade un patrón al autómata (invalida la compilación previa)"""
+        if self.characters:
+            words = list(pattern.lower())
+        else:
+            # El comodín numérico se sustituye por un dígito para que tokenize lo reconozca
+            words = self.tokenize(pattern.replace(self.NUMBER, ' 0 '))
+        if not words:
+            return
+        state = 0
+        for word in words:
+            next_state = self._goto[state].get(word)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][word] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._terminal.append([])
+            state = next_state
+        entry = (label, pattern, len(words))
+        if entry not in self._terminal[state]:
+            self._terminal[state].append(entry)
+        self._built = False
+
+    def build(self) -> 'PatternMatcher':
+        """Calcula los enlaces de fallo en anchura y propaga las salidas"""
+        self._output = [list(entries) for entries in self._terminal]
+        queue = deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for word, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(word, 0)
+                if self._fail[next_state] == next_state:
+                    self._fail[next_state] = 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+        self._built = True
+        return self
+
+    def find_words(self, words: List[str]) -> List[PatternMatch]:
+        """Devuelve todas las coincidencias sobre una lista de palabras ya tokenizada (o de caracteres)"""
+        if not self._built:
+            self.build()
+        goto, fail, output = self._goto, self._fail, self._output
+        matches = []
+        state = 0
+        for position, word in enumerate(words):
+            while state and word not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(word, 0)
+            for label, pattern, length in output[state]:
+                matches.append(PatternMatch(position - length + 1, position + 1, label, pattern))
+        return matches
+
+    def find_all(self, text: str) -> List[PatternMatch]:
+        """Tokeniza el texto y devuelve todas las coincidencias en una sola pasada"""
+        return self.find_words(list(text.lower()) if self.characters else self.tokenize(text))
@@ -0,0 +1,341 @@
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from types import FrameType
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool as starlette_run_in_threadpool
+
+# Petición perfilada en curso en este contexto: (perfilador, token); la copia de contexto
+# de run_in_threadpool la lleva al hilo del pool
+_profiled_request = contextvars.ContextVar('profiled_request', default=None)
+
+class RequestProfiler:
+    """
+    Perfilador por muestreo bajo demanda para las peticiones en curso. Una sesión perfila
+    las próximas N peticiones o las de una ventana de tiempo: mientras una petición
+    elegida se atiende, un hilo toma cada interval segundos las pilas de los hilos que
+    la atienden (sys._current_frames) y cuenta las pilas iguales. En el bucle de eventos
+    una muestra es de la petición cuya corrutina del middleware está en la pila (si no
+    hay ninguna, el bucle está ocioso o atiende otra petición y se descarta); el trabajo
+    enviado al pool con run_in_threadpool de este módulo se muestrea en su hilo del
+    pool. Sin sesión activa no hay hilo de muestreo y el coste por petición es
+    comprobar el atributo active.
+    Las pilas se devuelven plegadas (formato de flamegraph.pl y speedscope) y agregadas
+    por función y por componente (TextProcessor, ReviewFileHandler, Evaluator).
+    """
+    IDLE = 'idle'
+    RUNNING = 'running'
+    DONE = 'done'
+
+    def __init__(self, components: Iterable[str] = ('TextProcessor', 'ReviewFileHandler', 'Evaluator'),
+                 excluded_paths: Iterable[str] = ('/admin/profile', '/health'), max_depth: int = 128):
+        """
+        Args:
+            components: Clases cuyas funciones se agregan por separado en el informe
+            excluded_paths: Prefijos de ruta que nunca se perfilan (el propio perfilador, salud)
+            max_depth: Marcos guardados por pila (los más cercanos a la raíz se descartan)
+        """
+        self.components = tuple(components)
+        self.excluded_paths = tuple(excluded_paths)
+        self.max_depth = max_depth
+        self.active = False  # lo consulta el middleware en cada petición
+        self.state = self.IDLE
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._labels: Dict[object, str] = {}  # código -> "módulo:función"
+        self._session = 0
+        self._reset(None, None, 0.005, None)
+
+    def _reset(self, requests: Optional[int], seconds: Optional[float], interval: float,
+               paths: Optional[List[str]]):
+        self.requests = requests
+        self.seconds = seconds
+        self.interval = interval
+        self.paths = tuple(paths) if paths else None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.requests_started = 0
+        self.requests_finished = 0
+        self.samples = 0
+        self._threads: Counter = Counter()  # hilo -> registros (peticiones o trabajos del pool) en curso
+        self._frames: Dict[FrameType, str] = {}  # corrutina del middleware de cada petición -> ruta
+        self._workers: Dict[int, str] = {}  # hilo del pool -> ruta de la petición para la que trabaja
+        self._paths: Dict[int, str] = {}  # petición -> ruta
+        self._stacks: Counter = Counter()  # pila (raíz primero) -> muestras
+        self._by_path: Counter = Counter()  # ruta -> peticiones
+        self._samples_by_path: Counter = Counter()  # ruta -> muestras
+
+    def start(self, requests: Optional[int] = None, seconds: Optional[float] = None, interval: float = 0.005,
+              paths: Optional[List[str]] = None) -> Dict:
+        """
+        Empieza una sesión (descarta los resultados de la anterior)
+        Args:
+            requests: Perfilar las próximas requests peticiones
+            seconds: Perfilar las peticiones durante seconds segundos
+            interval: Segundos entre muestras
+            paths: Prefijos de ruta a perfilar (None: todas salvo excluded_paths)
+        """
+        if (requests is None) == (seconds is None):
+            raise ValueError("Hay que indicar requests o seconds (solo uno)")
+        with self._lock:
+            if self.state == self.RUNNING:
+                raise RuntimeError("Ya hay una sesión de perfilado en curso")
+            self._reset(requests, seconds, interval, paths)
+            self._session += 1
+            self.started_at = time.perf_counter()
+            self.state = self.RUNNING
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._sample_loop, name='request-profiler', daemon=True)
+            self._thread.start()
+            self.active = True
+        return self.status()
+
+    def stop(self) -> Dict:
+        """Termina la sesión en curso (si la hay) y conserva sus resultados"""
+        with self._lock:
+            self._finish()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        return self.status()
+
+    def _finish(self):
+        """Cierra la sesión (con el lock tomado)"""
+        if self.state == self.RUNNING:
+            self.active = False
+            self.state = self.DONE
+            self.finished_at = time.perf_counter()
+            self._stop.set()
+
+    def request_started(self, path: str, frame: Optional[FrameType] = None) -> Optional[Tuple]:
+        """
+        Registra el inicio de una petición atendida en el hilo actual
+        Args:
+            frame: Marco de la corrutina que atiende la petición (identifica sus muestras
+                   en el bucle de eventos); sin él, todas las muestras del hilo son suyas
+        Returns:
+            Token (sesión, petición, hilo, marco) si se perfila, None si no
+        """
+        if path.startswith(self.excluded_paths) or (self.paths is not None and not path.startswith(self.paths)):
+            return None
+        with self._lock:
+            if self.state != self.RUNNING or (self.requests is not None and self.requests_started >= self.requests):
+                return None
+            self.requests_started += 1
+            self._by_path[path] += 1
+            request = self.requests_started
+            self._paths[request] = path
+            ident = threading.get_ident()
+            self._threads[ident] += 1
+            if frame is not None:
+                self._frames[frame] = path
+            else:
+                self._workers[ident] = path
+            return self._session, request, ident, frame
+
+    def request_finished(self, token: Optional[Tuple]):
+        if token is None:
+            return
+        session, request, ident, frame = token
+        with self._lock:
+            if session != self._session:  # petición de una sesión anterior
+                return
+            self._release_thread(ident)
+            if frame is not None:
+                self._frames.pop(frame, None)
+            else:
+                self._workers.pop(ident, None)
+            self._paths.pop(request, None)
+            self.requests_finished += 1
+            if self.requests is not None and self.requests_finished >= self.requests:
+                self._finish()
+
+    def worker_started(self, token: Tuple) -> Optional[int]:
+        """Registra el hilo actual (del pool) como trabajando para una petición perfilada"""
+        session, request, _, _ = token
+        with self._lock:
+            path = self._paths.get(request)
+            if session != self._session or self.state != self.RUNNING or path is None:
+                return None
+            ident = threading.get_ident()
+            self._threads[ident] += 1
+            self._workers[ident] = path
+            return ident
+
+    def worker_finished(self, token: Tuple, ident: Optional[int]):
+        if ident is None:
+            return
+        with self._lock:
+            if token[0] != self._session:
+                return
+            self._release_thread(ident)
+            self._workers.pop(ident, None)
+
+    def _release_thread(self, ident: int):
+        self._threads[ident] -= 1
+        if self._threads[ident] <= 0:
+            del self._threads[ident]
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            filename = code.co_filename
+            module = filename if filename.startswith('<') else os.path.splitext(os.path.basename(filename))[0]
+            label = self._labels[code] = f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+        return label
+
+    def _sample_loop(self):
+        deadline = self.started_at + self.seconds if self.seconds is not None else None
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            if deadline is not None and time.perf_counter() >= deadline:
+                with self._lock:
+                    self._finish()
+                break
+            with self._lock:
+                threads = list(self._threads)
+                requests = dict(self._frames)
+                workers = dict(self._workers)
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            for ident in threads:
+                frame = frames.get(ident)
+                if frame is None or ident == own:
+                    continue
+                path = workers.get(ident)
+                stack = []
+                while frame is not None:
+                    if path is None:
+                        path = requests.get(frame)
+                    if len(stack) < self.max_depth:
+                        stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                if path is None:  # el hilo no está atendiendo ninguna petición perfilada
+                    continue
+                stack.reverse()
+                with self._lock:
+                    self._stacks[tuple(stack)] += 1
+                    self._samples_by_path[path] += 1
+                    self.samples += 1
+
+    def status(self) -> Dict:
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return {
+            'state': self.state,
+            'mode': 'requests' if self.requests is not None else 'seconds',
+            'requests': self.requests,
+            'seconds': self.seconds,
+            'interval_ms': self.interval * 1000,
+            'paths': list(self.paths) if self.paths else None,
+            'requests_profiled': self.requests_started,
+            'requests_finished': self.requests_finished,
+            'samples': self.samples,
+            'elapsed': round(end - self.started_at, 3) if self.started_at is not None else None
+        }
+
+    def collapsed(self) -> str:
+        """Pilas plegadas: "raíz;...;hoja muestras" por línea, de más a menos muestras"""
+        with self._lock:
+            stacks = self._stacks.most_common()
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in stacks)
+
+    def report(self, top: int = 25) -> Dict:
+        """
+        Estado de la sesión y agregados por función: muestras propias (la función es la
+        hoja de la pila), muestras totales (aparece en la pila) y su tiempo estimado
+        (muestras x intervalo), globales y por componente
+        """
+        with self._lock:
+            stacks = list(self._stacks.items())
+            by_path = {path: {'requests': requests, 'samples': self._samples_by_path[path],
+                              'ms': round(self._samples_by_path[path] * self.interval * 1000, 1)}
+                       for path, requests in self._by_path.items()}
+        own_samples = Counter()
+        total_samples = Counter()
+        component_samples = Counter()
+        for stack, count in stacks:
+            own_samples[stack[-1]] += count
+            frames = set(stack)
+            for frame in frames:
+                total_samples[frame] += count
+            for component in {self._component(frame) for frame in frames} - {None}:
+                component_samples[component] += count
+
+        def entry(function: str) -> Dict:
+            return {'function': function, 'self_samples': own_samples[function],
+                    'total_samples': total_samples[function],
+                    'self_ms': round(own_samples[function] * self.interval * 1000, 1),
+                    'total_ms': round(total_samples[function] * self.interval * 1000, 1)}
+
+        by_component = defaultdict(list)
+        for function in total_samples:
+            component = self._component(function)
+            if component is not None:
+                by_component[component].append(function)
+        return {
+            'profile': self.status(),
+            'paths': by_path,
+            'top_self': [entry(function) for function, _ in own_samples.most_common(top)],
+            'top_total': [entry(function) for function, _ in total_samples.most_common(top)],
+            'components': {component: {'samples': component_samples[component],
+                                        'ms': round(component_samples[component] * self.interval * 1000, 1),
+                                        'functions': sorted((entry(function) for function in functions),
+                                                            key=lambda item: item['total_samples'],
+                                                            reverse=True)[:top]}
+                           for component, functions in sorted(by_component.items())}
+        }
+
+    def _component(self, label: str) -> Optional[str]:
+        """Componente de una función "módulo:Clase.función" (None si no es de ninguno)"""
+        qualname = label.split(':', 1)[-1]
+        owner = qualname.split('.', 1)[0]
+        return owner if owner in self.components and '.' in qualname else None
+
+class ProfilerMiddleware:
+    """
+    Middleware ASGI del perfilador: sin sesión activa solo comprueba profiler.active (sin
+    la sobrecarga de un middleware de Starlette); con ella, registra las peticiones
+    elegidas mientras se atienden, hasta enviar la respuesta completa
+    """
+    def __init__(self, app, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if not self.profiler.active or scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        # El marco de esta corrutina está en la pila del bucle mientras se atiende la petición
+        token = self.profiler.request_started(scope['path'], sys._getframe())
+        context = _profiled_request.set((self.profiler, token)) if token is not None else None
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if context is not None:
+                _profiled_request.reset(context)
+            self.profiler.request_finished(token)
+
+async def run_in_threadpool(func: Callable, *args, **kwargs):
+    """
+    run_in_threadpool de Starlette que, si la petición en curso se está perfilando,
+    registra el hilo del pool que ejecuta func para que también se muestree
+    """
+    profiled = _profiled_request.get()
+    if profiled is None:
+        return await starlette_run_in_threadpool(func, *args, **kwargs)
+    profiler, token = profiled
+
+    def call():
+        ident = profiler.worker_started(token)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.worker_finished(token, ident)
+
+    return await starlette_run_in_threadpool(call)
@@ -1,14 +1,36 @@
 import os
 import json
-from typing import Dict, List
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 from datetime import datetime
 from text_processor import TextProcessor
+from index_segments import IndexGeneration
+from review_store import ReviewStore
+from write_ahead_log import WriteAheadLog
 import uuid
+from contextlib import contextmanager
 from pathlib import Path
 
 class ReviewFileHandler:
-    def __init__(self):
-        self.data_dir = Path(__file__).parent / 'data'
+    DUPLICATE_POLICIES = ('allow', 'link', 'skip')
+    # Campos calculados que no se guardan con la reseña (el índice ya tiene el análisis)
+    DERIVED_FIELDS = ('analisis_texto', 'score', 'snippets')
+
+    def __init__(self, checkpoint_interval: int = 1000, recover_index: bool = True,
+                 data_dir: Optional[Path] = None):
+        """
+        Args:
+            checkpoint_interval: Mutaciones registradas en el WAL entre checkpoints del índice
+            recover_index: Recuperar el índice al crearlo; si es False lo hace load_index()
+                           (p. ej. el ciclo de vida del servicio, en segundo plano)
+            data_dir: Directorio del almacén, el WAL y los data/*.txt que se importan
+                      (por defecto, data/ junto a este fichero)
+        """
+        # Desglose del arranque en segundos (almacén, carga del índice y reproducción del WAL)
+        self.startup_timings: Dict[str, float] = {}
+        started = time.perf_counter()
+        self.data_dir = Path(data_dir) if data_dir is not None else Path(__file__).parent / 'data'
         print(f"\nReviewFileHandler inicializado")
         print(f"Directorio de datos: {self.data_dir}")
         print(f"El directorio existe: {self.data_dir.exists()}")
@@ -17,108 +39,482 @@ class ReviewFileHandler:
         self.text_processor = TextProcessor()
         self.data_dir.mkdir(exist_ok=True)
         
-        # Procesar las reseñas existentes al inicializar
-        self.process_reviews()
+        # Almacén segmentado de reseñas; la primera vez se importan los data/*.txt
+        self.store = ReviewStore(self.data_dir / 'store')
+        imported = 0
+        if len(self.store) == 0:
+            imported = self.store.import_legacy_files(self.data_dir)
+            print(f"Reseñas importadas al almacén segmentado: {imported}")
+        self._rebuild_on_load = imported > 0
+        self.startup_timings['store'] = time.perf_counter() - started
+        
+        # Las mutaciones se registran en el WAL antes de aplicarse (una sola escritura a la vez)
+        self.write_lock = threading.RLock()
+        self._checkpoints_paused = 0  # > 0 mientras una reconstrucción necesita la cola del WAL
+        # Reconstrucción y compactación se excluyen (la compactación puede reconstruir, de ahí el RLock)
+        self.maintenance_lock = threading.RLock()
+        self.maintenance_operation: Optional[str] = None  # operación de mantenimiento en curso
+        self.checkpoint_interval = checkpoint_interval
+        # Política por defecto con las reseñas casi duplicadas (allow, link o skip)
+        self.duplicate_policy = os.environ.get('DUPLICATE_POLICY', 'link')
+        self.wal = WriteAheadLog(self.data_dir / 'wal')
+        
+        # Recuperar el índice: último checkpoint + cola del WAL (o reconstrucción completa)
+        if recover_index:
+            self.load_index()
+    
+    @contextmanager
+    def maintenance(self, operation: str):
+        """
+        Reserva el índice para una operación de mantenimiento ('rebuild' o 'compact')
+        Raises:
+            RuntimeError: si otro hilo ya está reconstruyendo o compactando el índice
+        """
+        if not self.maintenance_lock.acquire(blocking=False):
+            raise RuntimeError(f"Ya hay una reconstrucción o compactación del índice en curso "
+                               f"({self.maintenance_operation})")
+        previous = self.maintenance_operation
+        self.maintenance_operation = operation
+        try:
+            yield
+        finally:
+            self.maintenance_operation = previous
+            self.maintenance_lock.release()
+    
+    def load_index(self):
+        """Recupera el índice del arranque (si se acaban de importar reseñas, se reconstruye)"""
+        self.recover(rebuild=self._rebuild_on_load)
+    
+    @staticmethod
+    def index_text(review: Dict) -> str:
+        """Texto que se indexa de una reseña: título del producto y reseña"""
+        return f"{review['producto']}. {review['resena']}"
+    
+    @staticmethod
+    def index_categories(reviews: Iterable[Dict]) -> Dict[str, str]:
+        """id -> categoría de las reseñas (la partición del índice en la que se indexan)"""
+        return {review['id']: review.get('categoria') for review in reviews}
     
-    def save_review(self, review_data: Dict) -> str:
+    @staticmethod
+    def review_rating(review: Dict) -> Optional[float]:
+        """Puntuación de una reseña como atributo del índice (None si no tiene una válida)"""
+        try:
+            return float(review['puntuacion'])
+        except (KeyError, TypeError, ValueError):
+            return None
+    
+    @classmethod
+    def index_ratings(cls, reviews: Iterable[Dict]) -> Dict[str, Optional[float]]:
+        """id -> puntuación de las reseñas (columna del índice que usa el ranking)"""
+        return {review['id']: cls.review_rating(review) for review in reviews}
+    
+    @classmethod
+    def stored_review(cls, review: Dict) -> Dict:
+        """Reseña con solo los campos de origen (y metadatos) que se guardan en el almacén"""
+        if not any(field in review for field in cls.DERIVED_FIELDS):
+            return review
+        return {key: value for key, value in review.items() if key not in cls.DERIVED_FIELDS}
+    
+    def resolve_duplicate_policy(self, policy: Optional[str] = None) -> str:
+        policy = policy or self.duplicate_policy
+        if policy not in self.DUPLICATE_POLICIES:
+            raise ValueError(f"Política de duplicados no válida: {policy}")
+        return policy
+    
+    def find_duplicate(self, review_data: Dict) -> Optional[Tuple[str, float]]:
+        """Reseña indexada casi duplicada de review_data (la más parecida) o None"""
+        signature = self.text_processor.text_signature(self.index_text(review_data))
+        matches = self.text_processor.find_duplicates(signature, exclude=review_data.get('id'))
+        return matches[0] if matches else None
+    
+    def save_review(self, review_data: Dict, duplicates: Optional[str] = None) -> str:
+        """
+        Guarda e indexa una reseña. Si es casi duplicada de otra ya indexada se anota
+        en review_data['duplicate_of'] y, según la política, se guarda igualmente
+        ('link') o no se guarda ('skip'); con 'allow' no se comprueba.
+        Returns:
+            ID de la reseña guardada (o de la existente si se descarta por duplicada)
+        """
+        policy = self.resolve_duplicate_policy(duplicates)
         # Generar ID único si no existe
-        if 'id' not in review_data:
+        if not review_data.get('id'):
             review_data['id'] = str(uuid.uuid4())
         
-        # Procesar el texto de la reseña
-        text_analysis = self.text_processor.process_text(
-            review_data['resena'], 
-            doc_id=review_data['id']
-        )
+        with self.write_lock:
+            if policy != 'allow':
+                duplicate = self.find_duplicate(review_data)
+                if duplicate is not None:
+                    review_data['duplicate_of'] = duplicate[0]
+                    if policy == 'skip':
+                        print(f"Reseña {review_data['id']} descartada: duplicada de {duplicate[0]} "
+                              f"(similitud {duplicate[1]:.2f})")
+                        return duplicate[0]
+            # La mutación es duradera en cuanto está en el WAL
+            self.wal.append(WriteAheadLog.OP_PUT, review_data['id'], review_data)
+            self._apply_put(review_data)
+            self.maybe_checkpoint()
+        
+        return review_data['id']
+    
+    def delete_review(self, review_id: str) -> bool:
+        """Borra una reseña del almacén y del índice"""
+        with self.write_lock:
+            if review_id not in self.store:
+                return False
+            self.wal.append(WriteAheadLog.OP_DELETE, review_id)
+            self._apply_delete(review_id)
+            self.maybe_checkpoint()
+        return True
+    
+    def _apply_put(self, review_data: Dict):
+        """Indexa la reseña y la guarda en el almacén (el fsync lo cubre el WAL)"""
+        # Indexar el texto de la reseña (mismo texto que al reconstruir el índice)
+        self.text_processor.index_document(review_data['id'], self.index_text(review_data), review_data.get('categoria'),
+                                           self.review_rating(review_data))
         
-        # Añadir análisis y metadatos
-        review_data['analisis_texto'] = text_analysis
+        # Añadir metadatos; el análisis solo vive en el índice
         review_data['metadata'] = {
             'fecha_procesamiento': datetime.now().isoformat(),
             'idioma': 'es',
             'version_sistema': '1.0'
         }
         
-        # Guardar todo en un archivo .txt
-        filename = f"review_{review_data['id']}.txt"
-        filepath = self.data_dir / filename
-        
-        # Guardar el JSON en formato legible en el archivo .txt
-        with filepath.open('w', encoding='utf-8') as f:
-            json.dump(review_data, f, ensure_ascii=False, indent=2)
-        
-        return filename
+        # Guardar la reseña en el almacén segmentado (append-only)
+        self.store.put(self.stored_review(review_data), sync=False)
+    
+    def _apply_delete(self, review_id: str):
+        self.text_processor.remove_document(review_id)
+        self.store.delete(review_id, sync=False)
     
-    def load_review(self, filename: str) -> Dict:
-        """Carga una reseña desde un archivo"""
-        filepath = self.data_dir / filename
+    def maybe_checkpoint(self):
+        """Hace un checkpoint si el WAL acumula checkpoint_interval mutaciones"""
+        if self.wal.records_since_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+    
+    def checkpoint(self) -> Dict:
+        """
+        Guarda el índice en un checkpoint y vacía el WAL. El almacén se sincroniza
+        antes para que las mutaciones del log que se descartan ya sean duraderas en él.
+        """
+        with self.write_lock:
+            if self._checkpoints_paused:
+                print("Checkpoint aplazado: reconstrucción del índice en curso")
+                return self.wal.stats()
+            self.store.sync()
+            self.wal.save_checkpoint(self.text_processor.export_state(), self.wal.last_lsn)
+            print(f"Checkpoint del índice en LSN {self.wal.last_lsn}: {self.text_processor.total_documents} documentos")
+            return self.wal.stats()
+    
+    def recover(self, rebuild: bool = False):
+        """
+        Restaura el índice al arrancar: carga el último checkpoint y reproduce las
+        mutaciones posteriores del WAL. Sin checkpoint (o con rebuild=True) se
+        reconstruye desde el almacén, se reproduce el WAL completo y se guarda un checkpoint.
+        """
+        with self.write_lock:
+            started = time.perf_counter()
+            state = None if rebuild else self.wal.load_checkpoint()
+            if state is not None:
+                try:
+                    self.text_processor.load_state(state)
+                except ValueError as e:
+                    print(f"Checkpoint descartado ({str(e)}), se reconstruye el índice")
+                    state = None
+            if state is not None:
+                print(f"Índice restaurado del checkpoint LSN {self.wal.checkpoint_lsn}: {self.text_processor.total_documents} documentos")
+                self.startup_timings['checkpoint_load'] = time.perf_counter() - started
+                started = time.perf_counter()
+                replayed = self.replay_wal(self.wal.checkpoint_lsn)
+                print(f"Mutaciones reproducidas del WAL: {replayed}")
+                self.startup_timings['wal_replay'] = time.perf_counter() - started
+                return
+            
+            self.process_reviews()
+            self.startup_timings['index_rebuild'] = time.perf_counter() - started
+            started = time.perf_counter()
+            replayed = self.replay_wal(0)
+            print(f"Mutaciones reproducidas del WAL: {replayed}")
+            self.checkpoint()
+            self.startup_timings['wal_replay'] = time.perf_counter() - started
+    
+    def replay_wal(self, after_lsn: int) -> int:
+        """
+        Reaplica las mutaciones del WAL posteriores a after_lsn. Es idempotente: solo
+        se reescriben en el almacén las reseñas que no estén ya guardadas tal cual.
+        """
+        replayed = 0
+        for lsn, mutation in self.wal.replay(after_lsn):
+            try:
+                if mutation['op'] == WriteAheadLog.OP_PUT:
+                    review = mutation['review']
+                    stored = self.store.get(review['id'])
+                    if stored is not None and all(stored.get(key) == value for key, value in review.items()):
+                        self.text_processor.index_document(stored['id'], self.index_text(stored), stored.get('categoria'),
+                                                           self.review_rating(stored))
+                    else:
+                        self._apply_put(review)
+                elif mutation['op'] == WriteAheadLog.OP_DELETE:
+                    self._apply_delete(mutation['id'])
+                replayed += 1
+            except Exception as e:
+                print(f"Error reproduciendo LSN {lsn}: {str(e)}")
+        return replayed
+    
+    def load_review(self, review_id: str) -> Dict:
+        """Carga una reseña por id desde el almacén (un único acceso al segmento)"""
         try:
-            with filepath.open('r', encoding='utf-8') as f:
-                review = json.load(f)
-                print(f"\nProcesando reseña: {filename}")
-                print(f"ID: {review.get('id', 'No ID')}")
-                print(f"Producto: {review.get('producto', 'No producto')}")
-                return review
+            review = self.store.get(review_id)
+            if review is None:
+                print(f"Reseña {review_id} no encontrada")
+                return None
+            print(f"\nProcesando reseña: {review_id}")
+            print(f"Producto: {review.get('producto', 'No producto')}")
+            # Las reseñas guardadas por versiones anteriores incluyen el análisis completo
+            return self.stored_review(review)
         except Exception as e:
-            print(f"Error cargando reseña {filename}: {str(e)}")
+            print(f"Error cargando reseña {review_id}: {str(e)}")
             return None
     
     def list_reviews(self) -> List[str]:
+        """Ids de las reseñas almacenadas en orden de almacenamiento"""
         try:
-            return [f.name for f in self.data_dir.glob('*.txt')]
+            return self.store.ids()
         except Exception as e:
             print(f"Error listing reviews: {str(e)}")
             return []
     
-    def search_reviews(self, query: str, search_type: str = 'tf_idf', operator: str = 'AND', min_score: float = 0.01) -> List[Dict]:
+    def iter_reviews(self):
+        """Recorre todas las reseñas con una lectura secuencial del almacén"""
+        return self.store.scan()
+    
+    def compact_store(self) -> Dict:
+        """
+        Compacta el almacén eliminando versiones reemplazadas de las reseñas y los
+        campos calculados que guardaban las versiones anteriores
+        """
+        with self.write_lock:
+            if self._checkpoints_paused:
+                raise RuntimeError("Reconstrucción del índice en curso, inténtelo más tarde")
+            result = self.store.compact(transform=self.stored_review)
+        print(f"Almacén compactado: {result['bytes_before']} -> {result['bytes_after']} bytes")
+        return result
+    
+    @staticmethod
+    def _indexable(review: Optional[Dict]) -> bool:
+        return bool(review) and 'resena' in review and 'id' in review and 'producto' in review
+    
+    def _index_drift(self, generation: IndexGeneration, review: Dict) -> Optional[str]:
+        """
+        Diferencia entre una reseña del almacén y su documento en el índice: 'missing' si
+        no está indexada, 'attributes' si el índice tiene otra categoría o puntuación
+        """
+        position = generation.locate(review['id'])
+        if position is None:
+            return 'missing'
+        segment = generation.segments[position]
+        if segment.categories.get(review['id']) != review.get('categoria') or \
+                segment.rating(review['id']) != self.review_rating(review):
+            return 'attributes'
+        return None
+    
+    def reconcile_index(self, batch_size: int = 500) -> Dict:
+        """
+        Reconcilia la tabla de documentos del índice con el almacén: quita del índice los
+        documentos que ya no están en el almacén, indexa las reseñas que faltan y reindexa
+        las que tienen en el índice otra categoría o puntuación. Los candidatos se buscan
+        con una lectura secuencial del almacén y se analizan sin bloquear las escrituras;
+        después, con el lock de escritura, se comprueba cada uno contra el estado actual
+        y se aplica su análisis (solo se analiza de nuevo una reseña que cambió entretanto).
+        Returns:
+            Documentos quitados, indexados y reindexados
+        """
+        generation = self.text_processor.generation
+        indexed = {doc_id for doc_id, _ in generation.iter_lengths()}
+        candidates = []
+        for review in self.iter_reviews():
+            if not self._indexable(review):
+                continue
+            indexed.discard(review['id'])
+            if self._index_drift(generation, review) is not None:
+                candidates.append(review['id'])
+        candidates.extend(indexed)  # indexados que no están en el almacén
+        
+        # Análisis fuera del lock: id -> (reseña analizada, análisis)
+        analyzer = self.text_processor
+        prepared = {}
+        for review_id in candidates:
+            review = self.store.get(review_id)
+            if review is not None and self._indexable(review):
+                prepared[review_id] = (review, analyzer.analyze_document(self.index_text(review)))
+        
+        result = {'removed': 0, 'indexed': 0, 'reindexed': 0}
+        with self.write_lock:
+            processor = self.text_processor
+            orphans = []
+            analyses = []
+            reviews = []
+            for review_id in candidates:
+                review = self.store.get(review_id)
+                if review is None:
+                    orphans.append(review_id)
+                elif self._indexable(review):
+                    drift = self._index_drift(processor.generation, review)
+                    if drift is not None:
+                        result['indexed' if drift == 'missing' else 'reindexed'] += 1
+                        analyzed, analysis = prepared.get(review_id, (None, None))
+                        if analyzed != review:
+                            analysis = processor.analyze_document(self.index_text(review))
+                        analyses.append((review_id, analysis))
+                        reviews.append(review)
+            result['removed'] = processor.remove_documents(orphans)
+            for start in range(0, len(reviews), batch_size):
+                batch = reviews[start:start + batch_size]
+                processor.index_analyses(analyses[start:start + batch_size],
+                                         self.index_categories(batch), self.index_ratings(batch))
+        print(f"Índice reconciliado con el almacén: {result}")
+        return result
+    
+    def compact_index(self, reconcile: bool = True, analyze: Optional[Callable[[List[str]], List[Dict]]] = None,
+                      progress: Optional[Callable[[int, int, int], None]] = None) -> Dict:
+        """
+        Compacta el índice para que su tamaño sea proporcional a las reseñas vivas:
+        1. Si el índice se analizó con otro diccionario de sinónimos se reconstruye
+           (rebuild_index), porque sus postings de sinónimos no son las que genera el
+           diccionario actual; si no, se reconcilia con el almacén (reconcile_index)
+        2. Se reescribe sin postings de documentos borrados ni términos vacíos
+        3. Se guarda un checkpoint (el índice compactado es el que se recupera al arrancar)
+        Args:
+            reconcile: Reconciliar el índice con el almacén antes de reescribirlo
+            analyze, progress: Como en rebuild_index, si hay que reconstruir
+        Returns:
+            Estado del diccionario de sinónimos, reconciliación, tamaño antes y después y WAL
+        Raises:
+            RuntimeError: si ya hay una reconstrucción o compactación en curso
+        """
+        with self.maintenance('compact'):
+            stale = self.text_processor.synonyms_stale()
+            result = {'synonyms': 'unknown' if stale is None else ('stale' if stale else 'current'),
+                      'reanalyzed': False, 'reconciled': None}
+            if stale:
+                self.rebuild_index(analyze=analyze, progress=progress)
+                result['reanalyzed'] = True
+            elif reconcile:
+                result['reconciled'] = self.reconcile_index()
+            result['index'] = self.text_processor.compact()
+            result['wal'] = self.checkpoint()
+            return result
+    
+    def search_reviews(self, query: str, search_type: str = 'tf_idf', operator: str = 'AND', min_score: float = 0.01,
+                       use_synonyms: Optional[bool] = None, bm25_params: Optional[Dict] = None,
+                       fuzzy: bool = False, snippets: bool = False, categories: Optional[List[str]] = None,
+                       route: bool = False, limit: Optional[int] = None, details: Optional[Dict] = None) -> List[Dict]:
         """
         Busca reseñas usando el sistema especificado
         Args:
             query: Texto de búsqueda
-            search_type: 'boolean' o 'tf_idf'
+            search_type: 'boolean', 'tf_idf', 'bm25', 'semantic' o 'hybrid'
             operator: 'AND', 'OR', 'NOT' (solo para búsqueda booleana)
-            min_score: Score mínimo para incluir un resultado (solo para tf_idf)
+            min_score: Score mínimo para incluir un resultado (no se aplica a la búsqueda booleana)
+            use_synonyms: Expansión por sinónimos para esta consulta (None = valor por defecto del procesador)
+            bm25_params: k1, b y delta de BM25 para esta consulta (los que falten, por defecto)
+            fuzzy: Corregir los términos mal escritos de la consulta
+            snippets: Añadir a cada resultado fragmentos de la reseña con los términos resaltados
+            categories: Buscar solo en las particiones de estas categorías
+            route: Sin categories, enviar la consulta solo a las particiones de las categorías
+                   a las que está ligado su vocabulario (si no hay ninguna, al índice completo)
+            limit: Número máximo de resultados (no se aplica a la búsqueda booleana)
+            details: Si se pasa, se rellena con 'corrections' (token -> corrección aplicada
+                     a la consulta, o None sin fuzzy) y 'categories' (particiones en las que
+                     se buscó, o None si se buscó en el índice completo)
         Returns:
             Lista de reseñas ordenadas por relevancia
         """
         results = []
+        processor = self.text_processor
+        generation = processor.generation  # La consulta y sus particiones ven la misma generación
+        # La consulta se corrige una sola vez (para todas las particiones y los fragmentos)
+        corrections = None
+        if fuzzy:
+            query, corrections = processor.correct_query(query, generation)
+            fuzzy = False
+        selected = processor.select_partitions(query, categories, route, generation)
+        if details is not None:
+            details['corrections'] = corrections
+            details['categories'] = selected
+        target = generation
+        if selected is not None:
+            # Una sola búsqueda en la vista de las categorías elegidas: recorre solo sus
+            # postings y puntúa con las estadísticas de la colección completa
+            target = generation.partition(selected)
+            print(f"Consulta enviada a las particiones: {selected}")
         
         if search_type == 'boolean':
             # Búsqueda booleana
-            matching_ids = self.text_processor.boolean_search(query, operator)
-            for filename in self.list_reviews():
-                review = self.load_review(filename)
-                if review and review['id'] in matching_ids:
-                    results.append(review)
-                    
-        elif search_type == 'tf_idf':
-            # Búsqueda por similitud tf-idf
-            scores = self.text_processor.tf_idf_search(query)
-            for filename in self.list_reviews():
-                review = self.load_review(filename)
-                if review and review['id'] in scores:
-                    base_score = scores[review['id']]
-                    
-                    # Aplicar factor de rating de forma más agresiva
-                    rating = float(review.get('puntuacion', 3.0))
-                    rating_factor = (rating / 5.0) ** 2  # Factor exponencial
-                    
-                    # Penalizar más fuertemente las reviews negativas
-                    if rating < 3.0:
-                        rating_factor *= 0.3  # Penalización extra para ratings bajos
-                    
-                    # Calcular score final
-                    final_score = base_score * rating_factor
-                    
-                    if final_score >= min_score:  # Solo incluir resultados que superen el umbral
-                        review['score'] = final_score
+            matching_ids = processor.boolean_search(query, operator, use_synonyms=use_synonyms, fuzzy=fuzzy,
+                                                    generation=target)
+            for review_id in self.list_reviews():
+                if review_id in matching_ids:
+                    review = self.load_review(review_id)
+                    if review:
                         results.append(review)
-            
-            # Ordenar por puntuación
-            results.sort(key=lambda x: x.get('score', 0), reverse=True)
+                    
+        elif search_type in ('tf_idf', 'bm25', 'semantic', 'hybrid'):
+            # Búsqueda por similitud (tf-idf, BM25, semántica o híbrida). El factor de la
+            # puntuación, min_score y limit se aplican en el motor con la puntuación guardada
+            # en el índice, así que solo se leen del almacén las reseñas que se devuelven
+            ranked = processor.ranked_search(query, search_type, min_score, limit, use_synonyms,
+                                             bm25_params, fuzzy, target)
+            for review_id, final_score in ranked:
+                review = self.load_review(review_id)
+                if review:
+                    review['score'] = final_score
+                    results.append(review)
         
+        if snippets:
+            self.add_snippets(results, query, use_synonyms, fuzzy)
         return results
     
+    def add_snippets(self, results: List[Dict], query: str, use_synonyms: Optional[bool] = None, fuzzy: bool = False):
+        """Añade a cada resultado ('snippets') fragmentos de la reseña con los términos de la consulta resaltados"""
+        processor = self.text_processor
+        if fuzzy:
+            query = processor.correct_query(query)[0]
+        terms = processor.highlight_terms(query, use_synonyms)
+        generation = processor.generation
+        for review in results:
+            text = self.index_text(review)
+            review['snippets'] = processor.snippets(review['id'], text, terms, use_synonyms,
+                                                    start=len(text) - len(review['resena']), generation=generation)
+    
+    def similar_reviews(self, review_id: str, limit: int = 10) -> Optional[List[Dict]]:
+        """
+        Reseñas más parecidas a una reseña indexada ("más como este")
+        Returns:
+            Reseñas con su score o None si la reseña no está en el índice
+        """
+        similar = self.text_processor.more_like_this(review_id, limit)
+        if similar is None:
+            return None
+        results = []
+        for similar_id, score in similar:
+            review = self.load_review(similar_id)
+            if review:
+                review['score'] = score
+                results.append(review)
+        return results
+
+    def duplicate_report(self) -> List[Dict]:
+        """Grupos de reseñas casi duplicadas del corpus indexado, con el producto de cada una"""
+        report = []
+        for cluster in self.text_processor.duplicate_clusters():
+            reviews = []
+            for review_id in cluster['ids']:
+                review = self.load_review(review_id)
+                reviews.append({'id': review_id, 'producto': review.get('producto') if review else None})
+            report.append({'size': cluster['size'], 'min_similarity': cluster['min_similarity'],
+                           'reviews': reviews})
+        return report
+
     def get_statistics(self) -> Dict:
         """
         Calcula estadísticas sobre las reseñas almacenadas
@@ -135,8 +531,7 @@ class ReviewFileHandler:
         
         total_rating = 0
         
-        for filename in self.list_reviews():
-            review = self.load_review(filename)
+        for review in self.iter_reviews():
             if review:
                 stats['total_reviews'] += 1
                 total_rating += review['puntuacion']
@@ -156,46 +551,105 @@ class ReviewFileHandler:
         return stats
 
     def process_reviews(self):
-        """Procesa todas las reseñas y actualiza el índice"""
+        """
+        Procesa todas las reseñas y reconstruye el índice. El índice nuevo se construye
+        aparte y sustituye al actual de forma atómica, de modo que las búsquedas nunca
+        ven un índice vacío o parcial.
+        """
         print("\n=== Iniciando carga de reseñas ===")
         print(f"Directorio de datos: {self.data_dir}")
         print(f"El directorio existe: {self.data_dir.exists()}")
-        review_files = self.list_reviews()
-        print(f"Contenido del directorio: {review_files}")
+        print(f"Reseñas en el almacén: {len(self.store)}")
         
-        # Reiniciar el índice
-        self.text_processor.inverted_index.clear()
-        self.text_processor.document_lengths.clear()
-        self.text_processor.total_documents = 0
+        processor = self.rebuild_index()
         
-        processed_count = 0
-        for filename in review_files:
-            try:
-                review = self.load_review(filename)
-                if review and 'resena' in review and 'id' in review and 'producto' in review:
-                    print(f"\nProcesando reseña: {filename}")
-                    print(f"ID: {review['id']}")
-                    print(f"Producto: {review['producto']}")
-                    
-                    # Procesar el título del producto y la reseña como un solo texto
-                    combined_text = f"{review['producto']}. {review['resena']}"
-                    result = self.text_processor.process_text(combined_text, doc_id=review['id'])
-                    
-                    # Verificar que el documento se indexó correctamente
-                    if review['id'] in self.text_processor.document_lengths:
-                        processed_count += 1
-                        print(f"Reseña {review['id']} indexada correctamente")
-                        print(f"Longitud del documento: {self.text_processor.document_lengths[review['id']]}")
-                        print(f"Términos indexados: {len([term for term, docs in self.text_processor.inverted_index.items() if review['id'] in docs])}")
-                    else:
-                        print(f"Error: La reseña {review['id']} no se indexó correctamente")
+        print(f"\nTotal de reseñas procesadas: {processor.total_documents}")
+        print(f"Tamaño del índice invertido: {len(processor.inverted_index)} términos")
+        print("Términos en el índice:", sorted(list(processor.inverted_index.keys())))
+        print("Documentos indexados:", sorted(list(processor.document_lengths.keys())))
+        print("=== Carga de reseñas completada ===\n")
+    
+    def rebuild_index(self, analyze: Optional[Callable[[List[str]], List[Dict]]] = None,
+                      progress: Optional[Callable[[int, int, int], None]] = None,
+                      batch_size: int = 500) -> TextProcessor:
+        """
+        Reconstruye el índice sin bloquear búsquedas ni escrituras:
+        1. Se anota el LSN actual y se aplazan los checkpoints (el WAL no se vacía)
+        2. Se indexa el almacén en un TextProcessor nuevo
+        3. Se aplican las mutaciones del WAL posteriores al LSN inicial y, bajo el
+           lock de escritura, se sustituye self.text_processor por el índice nuevo
+        Args:
+            analyze: Función que analiza un lote de textos (p. ej. el pool de la ingesta masiva)
+            progress: Callback (reseñas indexadas, reseñas de lotes fallidos, total) llamado tras cada lote
+            batch_size: Reseñas por lote de análisis
+        Returns:
+            El TextProcessor nuevo, ya activo
+        Raises:
+            RuntimeError: si ya hay una reconstrucción o compactación en curso
+        """
+        with self.maintenance('rebuild'):
+            return self._rebuild_index(analyze, progress, batch_size)
+    
+    def _rebuild_index(self, analyze: Optional[Callable[[List[str]], List[Dict]]],
+                       progress: Optional[Callable[[int, int, int], None]], batch_size: int) -> TextProcessor:
+        with self.write_lock:
+            self._checkpoints_paused += 1
+            start_lsn = self.wal.last_lsn
+            total = len(self.store)
+        try:
+            processor = TextProcessor()
+            analyze = analyze or (lambda texts: [processor.analyze_document(text) for text in texts])
+            processed = 0
+            failed = 0
+            batch = []
+            
+            def flush():
+                nonlocal processed, failed
+                try:
+                    analyses = analyze([self.index_text(review) for review in batch])
+                    processor.index_analyses([(review['id'], analysis) for review, analysis in zip(batch, analyses)],
+                                             self.index_categories(batch), self.index_ratings(batch))
+                    processed += len(batch)
+                except Exception as e:
+                    print(f"Error procesando lote de reseñas: {str(e)}")
+                    failed += len(batch)
+                batch.clear()
+                if progress:
+                    progress(processed, failed, total)
+            
+            for review in self.iter_reviews():
+                if self._indexable(review):
+                    batch.append(review)
                 else:
-                    print(f"Error: Reseña {filename} no tiene el formato esperado")
-            except Exception as e:
-                print(f"Error procesando {filename}: {str(e)}")
-        
-        print(f"\nTotal de reseñas procesadas: {processed_count}")
-        print(f"Tamaño del índice invertido: {len(self.text_processor.inverted_index)} términos")
-        print("Términos en el índice:", sorted(list(self.text_processor.inverted_index.keys())))
-        print("Documentos indexados:", sorted(list(self.text_processor.document_lengths.keys())))
-        print("=== Carga de reseñas completada ===\n") 
\ No newline at end of file
+                    print(f"Error: Reseña {review.get('id')} no tiene el formato esperado")
+                if len(batch) >= batch_size:
+                    flush()
+            flush()
+            # Autocompletado y corrección listos antes de sustituir el índice (las primeras
+            # consultas no los construyen; luego se actualizan en segundo plano)
+            processor.warm_derived()
+            
+            # Ponerse al día con el WAL fuera del lock y terminar con el lock tomado
+            caught_up = self._catch_up(processor, start_lsn)
+            with self.write_lock:
+                self._catch_up(processor, caught_up)
+                processor.use_synonyms = self.text_processor.use_synonyms
+                self.text_processor = processor
+        finally:
+            with self.write_lock:
+                self._checkpoints_paused -= 1
+        self.maybe_checkpoint()
+        return processor
+    
+    def _catch_up(self, processor: TextProcessor, after_lsn: int) -> int:
+        """Aplica a un índice en construcción las mutaciones del WAL posteriores a after_lsn"""
+        last_lsn = after_lsn
+        for lsn, mutation in self.wal.replay(after_lsn):
+            if mutation['op'] == WriteAheadLog.OP_PUT:
+                review = mutation['review']
+                processor.index_analysis(review['id'], processor.analyze_document(self.index_text(review)),
+                                         review.get('categoria'), self.review_rating(review))
+            elif mutation['op'] == WriteAheadLog.OP_DELETE:
+                processor.remove_document(mutation['id'])
+            last_lsn = lsn
+        return last_lsn
@@ -0,0 +1,339 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+class ReviewStore:
+    """
+    Almacén de reseñas en segmentos append-only con índice de offsets por id.
+    Cada registro es una cabecera binaria seguida del id y del JSON compacto de la
+    reseña. Las lecturas por id son un único acceso al segmento (mapeado en memoria)
+    y el recorrido completo del corpus es una lectura secuencial de los segmentos.
+    """
+    MAGIC = b'RVW1'
+    HEADER = struct.Struct('<4sBIII')  # magic, operación, longitud id, longitud payload, crc32
+    OP_PUT = 1
+    OP_DELETE = 2
+
+    def __init__(self, store_dir: Path, max_segment_bytes: int = 64 * 1024 * 1024):
+        """
+        Args:
+            store_dir: Directorio donde se guardan los ficheros segment_*.seg
+            max_segment_bytes: Tamaño a partir del cual se abre un segmento nuevo
+        """
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.max_segment_bytes = max_segment_bytes
+        self._lock = threading.RLock()
+        self._offsets: Dict[str, Tuple[int, int, int]] = {}  # review_id -> (segmento, offset payload, longitud)
+        self._maps: Dict[int, mmap.mmap] = {}
+        # Recorridos (scan) en curso: los mapas reemplazados o desmapeados mientras tanto y
+        # los segmentos borrados por una compactación se liberan cuando termina el último
+        self._scans = 0
+        self._retired_maps: List[mmap.mmap] = []
+        self._retired_paths: List[Path] = []
+        self._segment_sizes: Dict[int, int] = {}
+        self._dead_bytes = 0
+        self._active_file = None
+        self._load_segments()
+
+    # ------------------------------------------------------------------
+    # Apertura y recuperación
+    # ------------------------------------------------------------------
+    def _segment_path(self, segment: int) -> Path:
+        return self.store_dir / f"segment_{segment:06d}.seg"
+
+    def _segment_numbers(self) -> List[int]:
+        return sorted(int(path.stem.split('_')[1]) for path in self.store_dir.glob('segment_*.seg'))
+
+    def _iter_records(self, segment: int, data) -> Iterator[Tuple[int, int, str, int, int]]:
+        """Recorre los registros de un segmento: (op, offset registro, id, offset payload, longitud payload)"""
+        offset = 0
+        size = len(data)
+        while offset + self.HEADER.size <= size:
+            magic, op, id_len, payload_len, crc = self.HEADER.unpack_from(data, offset)
+            end = offset + self.HEADER.size + id_len + payload_len
+            if magic != self.MAGIC or end > size:
+                break
+            body = data[offset + self.HEADER.size:end]
+            if zlib.crc32(body) != crc:
+                break
+            review_id = bytes(body[:id_len]).decode('utf-8')
+            yield op, offset, review_id, offset + self.HEADER.size + id_len, payload_len
+            offset = end
+
+    def _load_segments(self):
+        """Reconstruye el índice de offsets leyendo las cabeceras de todos los segmentos"""
+        segments = self._segment_numbers()
+        for segment in segments:
+            self._map_segment(segment)
+            data = self._maps.get(segment, b'')
+            valid_end = 0
+            for op, offset, review_id, payload_offset, payload_len in self._iter_records(segment, data):
+                self._apply(op, review_id, segment, payload_offset, payload_len)
+                valid_end = payload_offset + payload_len
+            if valid_end < self._segment_sizes[segment]:
+                # Registro incompleto al final (escritura interrumpida): se descarta
+                print(f"ReviewStore: truncando segmento {segment} en {valid_end} bytes")
+                self._unmap_segment(segment)
+                with self._segment_path(segment).open('r+b') as f:
+                    f.truncate(valid_end)
+                self._map_segment(segment)
+        self._open_active(segments[-1] if segments else 1)
+
+    def _apply(self, op: int, review_id: str, segment: int, payload_offset: int, payload_len: int):
+        """Actualiza el índice de offsets con un registro (los anteriores pasan a ser basura)"""
+        previous = self._offsets.pop(review_id, None)
+        if previous is not None:
+            self._dead_bytes += previous[2]
+        if op == self.OP_PUT:
+            self._offsets[review_id] = (segment, payload_offset, payload_len)
+
+    def _map_segment(self, segment: int):
+        path = self._segment_path(segment)
+        size = path.stat().st_size if path.exists() else 0
+        self._segment_sizes[segment] = size
+        self._unmap_segment(segment)
+        if size > 0:
+            with path.open('rb') as f:
+                self._maps[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _unmap_segment(self, segment: int):
+        old = self._maps.pop(segment, None)
+        if old is not None:
+            if self._scans:
+                self._retired_maps.append(old)  # un recorrido en curso aún lo lee
+            else:
+                old.close()
+
+    def _release_retired(self):
+        """Cierra los mapas y borra los segmentos retirados (con el lock tomado y sin recorridos en curso)"""
+        for data in self._retired_maps:
+            data.close()
+        self._retired_maps = []
+        for path in self._retired_paths:
+            path.unlink()
+        self._retired_paths = []
+
+    def _open_active(self, segment: int):
+        if self._active_file is not None:
+            self._active_file.close()
+        self._active_segment = segment
+        self._active_file = self._segment_path(segment).open('ab')
+        self._segment_sizes.setdefault(segment, self._active_file.tell())
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _encode(review: Dict) -> bytes:
+        return json.dumps(review, ensure_ascii=False, separators=(',', ':'),
+                          default=lambda value: sorted(value) if isinstance(value, set) else str(value)).encode('utf-8')
+
+    def _write_record(self, op: int, review_id: str, payload: bytes):
+        if self._segment_sizes[self._active_segment] >= self.max_segment_bytes:
+            self._active_file.flush()
+            os.fsync(self._active_file.fileno())
+            self._open_active(self._active_segment + 1)
+        id_bytes = review_id.encode('utf-8')
+        body = id_bytes + payload
+        header = self.HEADER.pack(self.MAGIC, op, len(id_bytes), len(payload), zlib.crc32(body))
+        record_offset = self._segment_sizes[self._active_segment]
+        self._active_file.write(header + body)
+        self._segment_sizes[self._active_segment] = record_offset + len(header) + len(body)
+        self._apply(op, review_id, self._active_segment, record_offset + len(header) + len(id_bytes), len(payload))
+
+    def _commit(self, sync: bool = True):
+        """Hace duraderas las escrituras pendientes (un único fsync por grupo)"""
+        self._active_file.flush()
+        if sync:
+            os.fsync(self._active_file.fileno())
+
+    def sync(self):
+        """Fuerza a disco las escrituras hechas con sync=False"""
+        with self._lock:
+            self._commit()
+
+    def put(self, review: Dict, sync: bool = True):
+        """Añade o reemplaza una reseña (debe tener 'id')"""
+        self.put_many([review], sync=sync)
+
+    def put_many(self, reviews: Iterable[Dict], sync: bool = True) -> int:
+        """
+        Añade varias reseñas con un único commit (group commit).
+        sync=False omite el fsync cuando la durabilidad ya la garantiza el WAL.
+        """
+        count = 0
+        with self._lock:
+            for review in reviews:
+                self._write_record(self.OP_PUT, str(review['id']), self._encode(review))
+                count += 1
+            if count:
+                self._commit(sync)
+        return count
+
+    def delete(self, review_id: str, sync: bool = True) -> bool:
+        """Marca una reseña como borrada con un registro tombstone"""
+        with self._lock:
+            if review_id not in self._offsets:
+                return False
+            self._write_record(self.OP_DELETE, review_id, b'')
+            self._commit(sync)
+            return True
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+    def _read_payload(self, segment: int, offset: int, length: int) -> bytes:
+        with self._lock:
+            data = self._maps.get(segment)
+            if data is None or offset + length > len(data):
+                # El segmento activo ha crecido desde que se mapeó
+                self._active_file.flush()
+                self._map_segment(segment)
+                data = self._maps[segment]
+            return data[offset:offset + length]
+
+    def get(self, review_id: str) -> Optional[Dict]:
+        """Carga una reseña por id con un único acceso al segmento"""
+        # Offset y lectura bajo el mismo lock: una compactación entre ambos
+        # cerraría y borraría el segmento al que apunta el offset
+        with self._lock:
+            location = self._offsets.get(str(review_id))
+            if location is None:
+                return None
+            payload = self._read_payload(*location)
+        return json.loads(payload)
+
+    def __contains__(self, review_id: str) -> bool:
+        return str(review_id) in self._offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def ids(self) -> List[str]:
+        """Ids de las reseñas vivas en orden de almacenamiento"""
+        with self._lock:
+            return [review_id for review_id, _ in sorted(self._offsets.items(), key=lambda item: item[1][:2])]
+
+    def scan(self) -> Iterator[Dict]:
+        """
+        Recorre secuencialmente todas las reseñas vivas, segmento a segmento, sin bloquear
+        las escrituras: los mapas que usa el recorrido no se cierran hasta que termina.
+        Una compactación durante el recorrido mueve las reseñas que quedan a segmentos
+        nuevos que el recorrido ya no ve.
+        """
+        with self._lock:
+            self._active_file.flush()
+            # Mapear los segmentos que aún no se han leído o han crecido desde que se mapearon
+            for segment, size in self._segment_sizes.items():
+                data = self._maps.get(segment)
+                if data is None or len(data) < size:
+                    self._map_segment(segment)
+            segments = [(segment, self._maps[segment]) for segment in sorted(self._maps)]
+            self._scans += 1
+        try:
+            for segment, data in segments:
+                for op, _, review_id, payload_offset, payload_len in self._iter_records(segment, data):
+                    if op == self.OP_PUT and self._offsets.get(review_id) == (segment, payload_offset, payload_len):
+                        yield json.loads(data[payload_offset:payload_offset + payload_len])
+        finally:
+            with self._lock:
+                self._scans -= 1
+                if not self._scans:
+                    self._release_retired()
+
+    def stats(self) -> Dict:
+        """Estadísticas de ocupación del almacén"""
+        with self._lock:
+            total_bytes = sum(self._segment_sizes.values())
+            return {
+                'reviews': len(self._offsets),
+                'segments': len(self._segment_sizes),
+                'total_bytes': total_bytes,
+                'dead_bytes': self._dead_bytes,
+                'dead_ratio': self._dead_bytes / total_bytes if total_bytes else 0.0
+            }
+
+    # ------------------------------------------------------------------
+    # Mantenimiento
+    # ------------------------------------------------------------------
+    def compact(self, transform: Optional[Callable[[Dict], Dict]] = None) -> Dict:
+        """
+        Reescribe las reseñas vivas en segmentos nuevos y elimina los antiguos,
+        descartando versiones reemplazadas y tombstones
+        Args:
+            transform: Función aplicada a cada reseña al reescribirla (p. ej. para
+                       quitar campos que ya no se guardan); sin ella se copian los bytes
+        Returns:
+            Dict con bytes antes y después de la compactación
+        """
+        with self._lock:
+            before = self.stats()
+            old_segments = sorted(self._segment_sizes)
+            live = [(review_id, self._read_payload(*location))
+                    for review_id, location in sorted(self._offsets.items(), key=lambda item: item[1][:2])]
+
+            # Escribir los registros vivos a partir de un número de segmento nuevo
+            self._offsets = {}
+            self._dead_bytes = 0
+            self._open_active(old_segments[-1] + 1 if old_segments else 1)
+            for review_id, payload in live:
+                if transform is not None:
+                    payload = self._encode(transform(json.loads(payload)))
+                self._write_record(self.OP_PUT, review_id, payload)
+            self._commit()
+
+            # Borrar los segmentos antiguos una vez que los nuevos son duraderos
+            for segment in old_segments:
+                self._unmap_segment(segment)
+                self._segment_sizes.pop(segment, None)
+                if self._scans:
+                    self._retired_paths.append(self._segment_path(segment))
+                else:
+                    self._segment_path(segment).unlink()
+            for segment in sorted(self._segment_sizes):
+                self._map_segment(segment)
+
+            after = self.stats()
+            return {'bytes_before': before['total_bytes'], 'bytes_after': after['total_bytes'],
+                    'reviews': after['reviews'], 'segments': after['segments']}
+
+    def import_legacy_files(self, data_dir: Path, batch_size: int = 500) -> int:
+        """
+        Importa las reseñas guardadas como un JSON por fichero (data/review_*.txt)
+        Returns:
+            Número de reseñas importadas
+        """
+        imported = 0
+        batch = []
+        for path in sorted(Path(data_dir).glob('*.txt')):
+            try:
+                with path.open('r', encoding='utf-8') as f:
+                    review = json.load(f)
+            except Exception as e:
+                print(f"Error importando {path.name}: {str(e)}")
+                continue
+            if not isinstance(review, dict) or 'id' not in review:
+                print(f"Error importando {path.name}: no tiene el formato esperado")
+                continue
+            batch.append(review)
+            if len(batch) >= batch_size:
+                imported += self.put_many(batch)
+                batch = []
+        imported += self.put_many(batch)
+        return imported
+
+    def close(self):
+        with self._lock:
+            if self._active_file is not None:
+                self._active_file.close()
+                self._active_file = None
+            for segment in list(self._maps):
+                self._unmap_segment(segment)
+            self._scans = 0
+            self._release_retired()
@@ -1,16 +1,17 @@
 import uvicorn
-import nltk
 import os
 import ssl
 
-# Configurar el directorio de datos de NLTK
+# Directorio de datos de NLTK (solo se usa si faltan las stopwords incluidas en data/)
 nltk_data_dir = os.path.join(os.path.dirname(__file__), 'nltk_data')
-os.makedirs(nltk_data_dir, exist_ok=True)
-nltk.data.path.append(nltk_data_dir)
 
-# Descargar recursos necesarios
+# Descargar recursos necesarios (solo con NLTK_DOWNLOAD=1: el arranque por defecto no usa la red)
 def download_nltk_data():
     try:
+        import nltk
+        os.makedirs(nltk_data_dir, exist_ok=True)
+        nltk.data.path.append(nltk_data_dir)
+
         # Manejar problemas de SSL
         try:
             _create_unverified_https_context = ssl._create_unverified_context
@@ -20,7 +21,7 @@ def download_nltk_data():
             ssl._create_default_https_context = _create_unverified_https_context
 
         # Descargar recursos
-        resources = ['punkt', 'stopwords', 'wordnet', 'omw-1.4']
+        resources = ['stopwords']
         for resource in resources:
             try:
                 nltk.download(resource, download_dir=nltk_data_dir)
@@ -32,7 +33,8 @@ def download_nltk_data():
 
 if __name__ == "__main__":
     # Descargar datos de NLTK
-    download_nltk_data()
+    if os.environ.get('NLTK_DOWNLOAD') == '1':
+        download_nltk_data()
     
     from text_service import app
     
@@ -42,4 +44,4 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8000,
         log_level="info"
-    ) 
\ No newline at end of file
+    )
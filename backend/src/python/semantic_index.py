@@ -0,0 +1,258 @@
+import math
+import threading
+import weakref
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# scipy y sklearn se importan al ajustar el primer modelo (no en el arranque del servicio)
+if TYPE_CHECKING:
+    from scipy.sparse import csr_matrix
+    from sklearn.decomposition import TruncatedSVD
+
+from index_segments import IndexGeneration, IndexSegment
+
+class SegmentEmbedding:
+    """Vectores densos (float32, contiguos y normalizados) de los documentos de un segmento"""
+    __slots__ = ('doc_ids', 'matrix', 'lists')
+
+    def __init__(self, doc_ids: List[str], matrix: np.ndarray, lists: Optional[List[np.ndarray]]):
+        self.doc_ids = doc_ids
+        self.matrix = matrix
+        self.lists = lists  # centroide -> filas asignadas (solo con IVF)
+
+class LatentModel:
+    """
+    Modelo LSA ajustado (vocabulario, IDF, TruncatedSVD y centroides IVF) y los vectores
+    densos de los segmentos calculados con él. No cambia una vez ajustado: al reajustar
+    se crea otro, así que una consulta usa siempre el mismo modelo de principio a fin.
+    """
+    def __init__(self, vocabulary: Dict[str, int], idf: np.ndarray, svd: 'TruncatedSVD', documents: int):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.svd = svd
+        self.documents = documents
+        self.centroids: Optional[np.ndarray] = None
+        self._embeddings = weakref.WeakKeyDictionary()  # segmento -> SegmentEmbedding
+        self._lock = threading.Lock()
+
+    def sparse(self, vectors: List[Dict[str, float]]) -> 'csr_matrix':
+        """Matriz documentos x términos del vocabulario ajustado, ponderada con su IDF"""
+        from scipy.sparse import csr_matrix
+        data, indices, indptr = [], [], [0]
+        for vector in vectors:
+            for stem, weight in vector.items():
+                column = self.vocabulary.get(stem)
+                if column is not None:
+                    indices.append(column)
+                    data.append(weight * self.idf[column])
+            indptr.append(len(indices))
+        return csr_matrix((data, indices, indptr), shape=(len(vectors), len(self.vocabulary)), dtype=np.float64)
+
+    def project(self, vectors: List[Dict[str, float]]) -> np.ndarray:
+        """Vectores densos normalizados (float32, contiguos) de una lista de vectores de términos"""
+        if not vectors:
+            return np.zeros((0, self.svd.n_components), dtype=np.float32)
+        dense = self.svd.transform(self.sparse(vectors))
+        norms = np.linalg.norm(dense, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return np.ascontiguousarray(dense / norms, dtype=np.float32)
+
+    def embedding(self, segment: IndexSegment) -> SegmentEmbedding:
+        """Vectores densos de un segmento (se calculan la primera vez que se recorre)"""
+        with self._lock:
+            embedding = self._embeddings.get(segment)
+        if embedding is None:
+            doc_ids = list(segment.vectors)
+            matrix = self.project([segment.vectors[doc_id] for doc_id in doc_ids])
+            lists = None
+            if self.centroids is not None and doc_ids:
+                assignment = np.argmax(matrix @ self.centroids.T, axis=1)
+                lists = [np.flatnonzero(assignment == centroid) for centroid in range(len(self.centroids))]
+            embedding = SegmentEmbedding(doc_ids, matrix, lists)
+            with self._lock:
+                self._embeddings[segment] = embedding
+        return embedding
+
+class SemanticIndex:
+    """
+    Búsqueda semántica latente (LSA) sobre los vectores de términos que cada documento
+    guarda en su segmento. El modelo (IDF y TruncatedSVD) se ajusta con la colección
+    de una generación; los vectores densos se calculan por segmento la primera vez que
+    una consulta lo recorre y se reutilizan mientras el segmento siga vivo, de modo que
+    el índice semántico sigue a las generaciones sin tocar el camino de escritura.
+    Con colecciones grandes los documentos se agrupan en listas por centroide (IVF) y
+    una consulta solo recorre las n_probe listas más cercanas; si no, fuerza bruta.
+    El ajuste (y el reajuste cuando la colección crece) se hace en un hilo en segundo
+    plano: mientras tanto las consultas usan el modelo anterior o, si aún no hay ninguno,
+    search devuelve None y el llamante sigue solo con la búsqueda léxica.
+    """
+    def __init__(self, n_components: int = 100, ivf_min_documents: int = 5000, n_probe: int = 8,
+                 refit_growth: float = 2.0):
+        """
+        Args:
+            n_components: Dimensiones del espacio latente (como máximo)
+            ivf_min_documents: Documentos a partir de los cuales se usa IVF en vez de fuerza bruta
+            n_probe: Listas IVF recorridas por consulta
+            refit_growth: Se reajusta el modelo cuando la colección crece este factor desde el ajuste
+        """
+        self.n_components = n_components
+        self.ivf_min_documents = ivf_min_documents
+        self.n_probe = n_probe
+        self.refit_growth = refit_growth
+        self.model: Optional[LatentModel] = None
+        self._fit_lock = threading.Lock()  # protege _fitting y _attempted
+        self._fitting = False  # hay un ajuste en curso en segundo plano
+        self._thread: Optional[threading.Thread] = None
+        self._attempted = -1  # documentos del último intento de ajuste sin modelo (colección pequeña o error)
+        self.error: Optional[str] = None  # error del último ajuste
+
+    def _needs_fit(self, model: Optional[LatentModel], generation: IndexGeneration) -> bool:
+        if model is None:
+            return generation.total_documents != self._attempted
+        return generation.total_documents > model.documents * self.refit_growth
+
+    def fit(self, generation: IndexGeneration) -> Optional[LatentModel]:
+        """
+        Ajusta IDF, SVD y (si procede) los centroides IVF con los documentos vivos de la
+        generación y lo publica con los vectores densos de sus segmentos ya calculados
+        Returns:
+            El modelo nuevo, o None si no hay documentos suficientes (se conserva el anterior)
+        """
+        from sklearn.cluster import KMeans
+        from sklearn.decomposition import TruncatedSVD
+        vectors = []
+        for segment, mask in zip(generation.segments, generation.masks):
+            vectors.extend(vector for doc_id, vector in segment.vectors.items() if doc_id not in mask)
+
+        doc_freq: Dict[str, int] = {}
+        for vector in vectors:
+            for stem in vector:
+                doc_freq[stem] = doc_freq.get(stem, 0) + 1
+        terms = sorted(doc_freq)
+        total = len(vectors)
+        n_components = min(self.n_components, total - 1, len(terms) - 1)
+        if n_components < 1:
+            with self._fit_lock:
+                self._attempted = generation.total_documents
+            print(f"No hay documentos suficientes para la búsqueda semántica ({total} documentos)")
+            return None
+
+        idf = np.array([math.log((1 + total) / (1 + doc_freq[stem])) + 1 for stem in terms])
+        svd = TruncatedSVD(n_components=n_components, random_state=0)
+        model = LatentModel({stem: column for column, stem in enumerate(terms)}, idf, svd, total)
+        svd.fit(model.sparse(vectors))
+        if total >= self.ivf_min_documents:
+            kmeans = KMeans(n_clusters=int(math.sqrt(total)), n_init=1, random_state=0)
+            kmeans.fit(model.project(vectors))
+            centroids = kmeans.cluster_centers_
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+            model.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        # Las primeras consultas con el modelo nuevo no calculan los vectores densos
+        for segment in generation.segments:
+            model.embedding(segment)
+        self.model = model
+        print(f"Modelo semántico ajustado: {total} documentos, {len(terms)} términos, "
+              f"{n_components} dimensiones, IVF: {model.centroids is not None}")
+        return model
+
+    def refresh(self, generation: IndexGeneration) -> bool:
+        """
+        Lanza el ajuste del modelo en segundo plano si no hay modelo o la colección creció
+        refit_growth veces desde el último (uno a la vez)
+        Returns:
+            True si se lanzó un ajuste
+        """
+        if not self._needs_fit(self.model, generation):
+            return False
+        with self._fit_lock:
+            if self._fitting:
+                return False
+            self._fitting = True
+
+        def run():
+            try:
+                self.fit(generation)
+                self.error = None
+            except Exception as e:
+                with self._fit_lock:
+                    self._attempted = generation.total_documents
+                self.error = str(e)
+                print(f"Error ajustando el modelo semántico: {str(e)}")
+            finally:
+                with self._fit_lock:
+                    self._fitting = False
+
+        self._thread = threading.Thread(target=run, name='semantic-fit', daemon=True)
+        self._thread.start()
+        return True
+
+    def wait(self, timeout: Optional[float] = None):
+        """Espera a que termine el ajuste en curso"""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def search(self, generation: IndexGeneration, vector: Dict[str, float], limit: int = 100,
+               collection: Optional[IndexGeneration] = None) -> Optional[List[Tuple[str, float]]]:
+        """
+        Documentos más cercanos (similitud coseno en el espacio latente) al vector de
+        términos de una consulta, en la generación fijada por la consulta (o en una partición suya)
+        Args:
+            collection: Generación con la que se ajusta el modelo si hace falta (por
+                        defecto generation; distinta cuando se busca en una partición)
+        Returns:
+            (doc_id, similitud) ordenados por similitud descendente, o None si todavía no
+            hay modelo (se está ajustando en segundo plano o la colección es muy pequeña)
+        """
+        model = self.model
+        self.refresh(collection or generation)
+        if model is None:
+            return None
+        query = model.project([vector])[0]
+        if not query.any():
+            return []
+        probes = None
+        if model.centroids is not None:
+            probes = np.argsort(-(model.centroids @ query))[:self.n_probe]
+
+        candidates: List[Tuple[str, float]] = []
+        for segment, mask in zip(generation.segments, generation.masks):
+            embedding = model.embedding(segment)
+            if probes is None or embedding.lists is None:
+                rows = None
+                scores = embedding.matrix @ query
+            else:
+                rows = np.concatenate([embedding.lists[probe] for probe in probes])
+                scores = embedding.matrix[rows] @ query
+            candidates_count = len(scores)
+            if generation.categories is not None:
+                # En una partición se descartan antes de elegir los documentos de otras categorías
+                doc_ids = embedding.doc_ids if rows is None else [embedding.doc_ids[row] for row in rows]
+                outside = np.fromiter((not generation.contains(segment, doc_id) for doc_id in doc_ids),
+                                      dtype=bool, count=len(doc_ids))
+                scores = np.where(outside, -np.inf, scores)
+                candidates_count -= int(outside.sum())
+            # Se piden limit + enmascarados para no perder resultados al descartar estos
+            top = min(candidates_count, limit + len(mask))
+            if top == 0:
+                continue
+            best = np.argpartition(-scores, top - 1)[:top]
+            for position in best:
+                doc_id = embedding.doc_ids[position if rows is None else rows[position]]
+                if doc_id not in mask:
+                    candidates.append((doc_id, float(scores[position])))
+        candidates.sort(key=lambda item: (-item[1], item[0]))
+        return candidates[:limit]
+
+    def stats(self) -> Dict:
+        model = self.model
+        return {
+            'fitted': model is not None,
+            'fitting': self._fitting,
+            'error': self.error,
+            'documents': model.documents if model else 0,
+            'terms': len(model.vocabulary) if model else 0,
+            'dimensions': model.svd.n_components if model else 0,
+            'ivf_lists': 0 if model is None or model.centroids is None else len(model.centroids)
+        }
@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+class ServiceLifecycle:
+    """
+    Ciclo de vida del servicio alrededor del único ReviewFileHandler que posee el índice.
+    start() recupera el índice (checkpoint + cola del WAL o reconstrucción) en un hilo en
+    segundo plano y después lo calienta con las consultas guardadas, de modo que importar
+    el servicio no espera a la indexación. El servicio está vivo desde que arranca y
+    listo solo cuando la generación del índice está cargada y caliente:
+    starting -> loading -> warming -> ready (o failed si la carga falla).
+    """
+    STARTING = 'starting'
+    LOADING = 'loading'
+    WARMING = 'warming'
+    READY = 'ready'
+    FAILED = 'failed'
+
+    def __init__(self, review_handler, warm_queries: Optional[Callable[[], List[Tuple[str, str]]]] = None,
+                 timings: Optional[Dict[str, float]] = None, began: Optional[float] = None):
+        """
+        Args:
+            review_handler: ReviewFileHandler creado sin recuperar el índice
+            warm_queries: Devuelve las consultas (texto, tipo de búsqueda) con las que calentar
+                          las cachés; None para no calentar
+            timings: Desglose del arranque que se completa con las fases de la carga
+            began: Instante (perf_counter) en que empezó el arranque del proceso
+        """
+        self.review_handler = review_handler
+        self.warm_queries = warm_queries
+        self.timings = timings if timings is not None else OrderedDict()
+        self.began = time.perf_counter() if began is None else began
+        self.state = self.STARTING
+        self.error: Optional[str] = None
+        self.warmed_queries = 0
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def start(self) -> threading.Thread:
+        """Lanza la carga del índice en segundo plano (una sola vez)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='index-lifecycle', daemon=True)
+                self._thread.start()
+            return self._thread
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que el índice esté listo; False si no lo está al vencer timeout o si falló"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def _run(self):
+        try:
+            self.state = self.LOADING
+            self.review_handler.load_index()
+            self.timings.update(self.review_handler.startup_timings)
+            started = time.perf_counter()
+            self.state = self.WARMING
+            self.warm_up()
+            self.timings['warm_up'] = time.perf_counter() - started
+            self.timings['ready'] = time.perf_counter() - self.began
+            self.state = self.READY
+            self._ready.set()
+            print(f"Índice listo: {self.review_handler.text_processor.total_documents} documentos, "
+                  f"WAL: {self.review_handler.wal.stats()}")
+            print("Arranque: " + ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in self.timings.items()))
+        except Exception as e:
+            self.state = self.FAILED
+            self.error = str(e)
+            print(f"Error cargando el índice: {str(e)}")
+
+    def warm_up(self):
+        """
+        Crea el stemmer y las estructuras derivadas de la generación (diccionario de
+        términos, índice de borrados) y ejecuta las consultas guardadas para que todo
+        esté construido cuando llegue la primera consulta real
+        """
+        self.review_handler.text_processor.warm_up()
+        self.review_handler.text_processor.warm_derived()
+        if self.warm_queries is None:
+            return
+        for query, search_type in self.warm_queries():
+            try:
+                self.review_handler.search_reviews(query, search_type, fuzzy=search_type != 'boolean',
+                                                   snippets=search_type != 'boolean')
+                self.warmed_queries += 1
+            except Exception as e:
+                print(f"Error calentando la consulta '{query}': {str(e)}")
+
+    def status(self) -> Dict:
+        text_processor = self.review_handler.text_processor
+        return {
+            'state': self.state,
+            'ready': self.ready,
+            'error': self.error,
+            'documents': text_processor.total_documents if self.ready else None,
+            'generation': text_processor.generation.number if self.ready else None,
+            'warmed_queries': self.warmed_queries,
+            'uptime': time.perf_counter() - self.began
+        }
@@ -0,0 +1,84 @@
+import heapq
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+
+class TermDictionary:
+    """
+    Diccionario ordenado de términos para autocompletado por prefijo.
+    Las claves (normalizadas) se guardan ordenadas, de modo que las que empiezan por
+    un prefijo forman un rango contiguo que se localiza con búsqueda binaria. Para los
+    prefijos con muchas completaciones (rangos de más de heavy_threshold términos) el
+    top-k se precalcula al construir el diccionario; el resto de rangos son pequeños y
+    se ordenan al vuelo. Así una consulta no depende del tamaño del vocabulario.
+    """
+    def __init__(self, entries: Iterable[Tuple[str, Dict]], top_k: int = 10, heavy_threshold: int = 64):
+        """
+        Args:
+            entries: (clave normalizada, sugerencia) con al menos 'score' en la sugerencia;
+                     si una clave se repite se queda la de mayor score (en empate, la última)
+            top_k: Completaciones precalculadas por prefijo frecuente
+            heavy_threshold: Tamaño de rango a partir del cual se precalcula el top-k
+        """
+        best: Dict[str, Dict] = {}
+        for key, suggestion in entries:
+            current = best.get(key)
+            if current is None or suggestion['score'] >= current['score']:
+                best[key] = suggestion
+        self.keys: List[str] = sorted(best)
+        self.suggestions: List[Dict] = [best[key] for key in self.keys]
+        self.scores: List[float] = [suggestion['score'] for suggestion in self.suggestions]
+        self.top_k = top_k
+        self.heavy_threshold = heavy_threshold
+        self._top: Dict[str, List[int]] = {}  # prefijo frecuente -> posiciones del top-k
+        if len(self.keys) > heavy_threshold:
+            self._build_top('', 0, len(self.keys))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _range(self, prefix: str, lo: int = 0, hi: int = None) -> Tuple[int, int]:
+        """Rango [lo, hi) de las claves que empiezan por prefix"""
+        hi = len(self.keys) if hi is None else hi
+        start = bisect_left(self.keys, prefix, lo, hi)
+        return start, bisect_left(self.keys, prefix + '\uffff', start, hi)
+
+    def _best(self, positions: Iterable[int], limit: int) -> List[int]:
+        return heapq.nlargest(limit, positions, key=lambda position: (self.scores[position], -position))
+
+    def _build_top(self, prefix: str, lo: int, hi: int) -> List[int]:
+        """
+        Precalcula el top-k de un prefijo frecuente a partir de sus hijos: los hijos
+        frecuentes aportan su top-k ya calculado y los pequeños se recorren enteros,
+        por lo que cada término se visita una sola vez fuera de los prefijos frecuentes
+        """
+        depth = len(prefix)
+        candidates = []
+        position = lo
+        # La clave igual al prefijo (si existe) va la primera del rango
+        if position < hi and len(self.keys[position]) == depth:
+            candidates.append(position)
+            position += 1
+        while position < hi:
+            child = prefix + self.keys[position][depth]
+            _, child_hi = self._range(child, position, hi)
+            if child_hi - position > self.heavy_threshold:
+                candidates.extend(self._build_top(child, position, child_hi))
+            else:
+                candidates.extend(range(position, child_hi))
+            position = child_hi
+        top = self._best(candidates, self.top_k)
+        self._top[prefix] = top
+        return top
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Dict]:
+        """Completaciones de un prefijo (ya normalizado) ordenadas por score descendente"""
+        if limit <= 0:
+            return []
+        top = self._top.get(prefix)
+        if top is not None and limit <= self.top_k:
+            return [self.suggestions[position] for position in top[:limit]]
+        lo, hi = self._range(prefix)
+        return [self.suggestions[position] for position in self._best(range(lo, hi), limit)]
+
+    def stats(self) -> Dict:
+        return {'terms': len(self.keys), 'precomputed_prefixes': len(self._top)}
@@ -0,0 +1,96 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Los módulos del servicio se importan por nombre (como hace text_service.py)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from review_file_handler import ReviewFileHandler
+from text_processor import TextProcessor
+
+REVIEWS = [
+    {'id': 'r1', 'producto': 'Auriculares Sony', 'categoria': 'Audio', 'puntuacion': 5,
+     'resena': 'Los auriculares tienen una batería excelente y un sonido muy claro'},
+    {'id': 'r2', 'producto': 'Auriculares JBL', 'categoria': 'Audio', 'puntuacion': 4,
+     'resena': 'Buen sonido, aunque la batería de los auriculares dura poco'},
+    {'id': 'r3', 'producto': 'Altavoz Bose', 'categoria': 'Audio', 'puntuacion': 3,
+     'resena': 'El altavoz suena fuerte pero la conexión bluetooth falla a veces'},
+    {'id': 'r4', 'producto': 'Cafetera Nespresso', 'categoria': 'Hogar', 'puntuacion': 5,
+     'resena': 'La cafetera prepara un café delicioso en pocos segundos'},
+    {'id': 'r5', 'producto': 'Cafetera Krups', 'categoria': 'Hogar', 'puntuacion': 2,
+     'resena': 'La cafetera pierde agua y el café sale frío'},
+    {'id': 'r6', 'producto': 'Aspiradora Rowenta', 'categoria': 'Hogar', 'puntuacion': 4,
+     'resena': 'La aspiradora es potente y silenciosa, la batería aguanta toda la casa'},
+    {'id': 'r7', 'producto': 'Camiseta Nike', 'categoria': 'Ropa', 'puntuacion': 4,
+     'resena': 'La camiseta es cómoda y la talla es correcta'},
+    {'id': 'r8', 'producto': 'Zapatillas Adidas', 'categoria': 'Ropa', 'puntuacion': 1,
+     'resena': 'Las zapatillas se rompieron al mes, muy mala calidad'},
+    {'id': 'r9', 'producto': 'Chaqueta North Face', 'categoria': 'Ropa', 'puntuacion': 5,
+     'resena': 'Chaqueta calentita, impermeable y de muy buena calidad'},
+    {'id': 'r10', 'producto': 'Auriculares Xiaomi', 'categoria': 'Audio', 'puntuacion': 3,
+     'resena': 'Auriculares baratos con sonido aceptable y batería normal'},
+]
+
+def review_copy(review: dict, **changes) -> dict:
+    """Copia de una reseña del corpus (save_review añade campos a la que recibe)"""
+    copy = dict(review)
+    copy.update(changes)
+    return copy
+
+def index_reviews(processor: TextProcessor, reviews=REVIEWS):
+    """Indexa las reseñas una a una (un segmento delta por reseña, como las altas de la API)"""
+    for review in reviews:
+        processor.index_document(review['id'], ReviewFileHandler.index_text(review), review['categoria'],
+                                 ReviewFileHandler.review_rating(review))
+
+def bulk_processor(reviews=REVIEWS) -> TextProcessor:
+    """Índice de las reseñas construido de una vez (un único segmento, como una reconstrucción)"""
+    processor = TextProcessor()
+    processor.index_analyses([(review['id'], processor.analyze_document(ReviewFileHandler.index_text(review)))
+                              for review in reviews],
+                             ReviewFileHandler.index_categories(reviews), ReviewFileHandler.index_ratings(reviews))
+    return processor
+
+@pytest.fixture
+def processor() -> TextProcessor:
+    """TextProcessor con el corpus indexado"""
+    processor = TextProcessor()
+    index_reviews(processor)
+    return processor
+
+@pytest.fixture
+def handler(tmp_path):
+    """ReviewFileHandler con almacén y WAL en un directorio temporal y el corpus guardado"""
+    handler = ReviewFileHandler(data_dir=tmp_path)
+    for review in REVIEWS:
+        handler.save_review(review_copy(review), duplicates='allow')
+    yield handler
+    handler.wal.close()
+    handler.store.close()
+
+@pytest.fixture(scope='session')
+def client(tmp_path_factory):
+    """
+    Cliente de la API (text_service) con el almacén en un directorio temporal, el índice
+    cargado y el corpus guardado. Lo comparten todas las pruebas de la API: las que
+    escriben usan ids propios
+    """
+    from fastapi.testclient import TestClient
+
+    patch = pytest.MonkeyPatch()
+    patch.setenv('DATA_DIR', str(tmp_path_factory.mktemp('service')))
+    patch.setenv('WARM_UP', '0')
+    import text_service
+    with TestClient(text_service.app) as client:
+        assert text_service.lifecycle.wait_ready(30)
+        for review in REVIEWS:
+            text_service.review_handler.save_review(review_copy(review), duplicates='allow')
+        yield client
+    patch.undo()
+
+@pytest.fixture
+def service(client):
+    """Módulo text_service del cliente (estado global del servicio)"""
+    import text_service
+    return text_service
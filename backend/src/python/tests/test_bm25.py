@@ -0,0 +1,57 @@
+import math
+
+import pytest
+
+from bm25 import BM25Scorer
+from index_segments import BASE
+
+def brute_force(generation, term, k1, b, delta=0.0):
+    """BM25 de un término recorriendo las postings vivas de la generación"""
+    postings = generation.postings(term, BASE)
+    total = generation.total_documents
+    avgdl = generation.total_tokens / total
+    idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+    scores = {}
+    for doc_id, positions in postings.items():
+        position = generation.locate(doc_id)
+        tokens = generation.segments[position].token_counts[doc_id]
+        tf = len(positions)
+        scores[doc_id] = idf * ((tf * (k1 + 1)) / (tf + k1 * (1 - b + b * tokens / avgdl)) + delta)
+    return scores
+
+@pytest.mark.parametrize('k1, b, delta', [(1.2, 0.75, 0.0), (2.0, 0.0, 0.0), (1.2, 1.0, 1.0)])
+def test_scores_match_formula(processor, k1, b, delta):
+    generation = processor.generation
+    for term in ('auricular', 'bateri', 'caf'):
+        scores = BM25Scorer(k1, b, delta).score(generation, {term: 1.0}, use_synonyms=False)
+        expected = brute_force(generation, term, k1, b, delta)
+        assert expected and scores.keys() == expected.keys()
+        for doc_id, score in expected.items():
+            assert scores[doc_id] == pytest.approx(score)
+
+def test_query_weights_scale_terms(processor):
+    scorer = BM25Scorer()
+    generation = processor.generation
+    single = scorer.score(generation, {'bateri': 1.0}, use_synonyms=False)
+    double = scorer.score(generation, {'bateri': 2.0}, use_synonyms=False)
+    assert double == pytest.approx({doc_id: 2 * score for doc_id, score in single.items()})
+    assert scorer.score(generation, {'bateri': 0.0}, use_synonyms=False) == {}
+
+def test_masked_documents_are_not_scored(processor):
+    processor.remove_document('r1')
+    scores = BM25Scorer().score(processor.generation, {'auricular': 1.0}, use_synonyms=False)
+    assert 'r1' not in scores
+    assert scores == pytest.approx(brute_force(processor.generation, 'auricular', 1.2, 0.75))
+
+def test_with_params_copies_the_scorer():
+    scorer = BM25Scorer()
+    tuned = scorer.with_params(b=0.3)
+    assert tuned.params() == {'k1': 1.2, 'b': 0.3, 'delta': 0.0}
+    assert scorer.params() == {'k1': 1.2, 'b': 0.75, 'delta': 0.0}
+
+def test_bm25_search_ranks_by_term_frequency(processor):
+    processor.index_document('r11', 'Cafetera. Cafetera, cafetera y más cafetera', 'Hogar', 3)
+    scores = processor.bm25_search('cafetera')
+    ranking = sorted(scores, key=scores.get, reverse=True)
+    assert ranking[0] == 'r11'
+    assert set(ranking) == {'r4', 'r5', 'r11'}
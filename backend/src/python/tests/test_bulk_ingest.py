@@ -0,0 +1,91 @@
+import json
+
+from bulk_ingest import BulkIngestor
+from conftest import REVIEWS, review_copy
+from review_file_handler import ReviewFileHandler
+
+TOSTADORA = {'id': 'r11', 'producto': 'Tostadora Taurus', 'categoria': 'Hogar', 'puntuacion': 4,
+             'resena': 'La tostadora tuesta el pan de forma uniforme'}
+
+def test_batch_is_indexed_and_stored(handler):
+    ingestor = BulkIngestor(handler, workers=1)
+    statuses = ingestor.ingest_batch([(1, dict(TOSTADORA)), (2, review_copy(REVIEWS[0], resena='Pantalla rota'))],
+                                     duplicates='allow')
+    assert [(status['line'], status['id'], status['status']) for status in statuses] == \
+           [(1, 'r11', 'indexed'), (2, 'r1', 'indexed')]
+    assert handler.load_review('r11')['producto'] == 'Tostadora Taurus'
+    assert 'r11' in handler.text_processor.tf_idf_search('tostadora')
+    assert 'r1' in handler.text_processor.tf_idf_search('pantalla')
+
+def test_failed_store_write_is_undone(handler, tmp_path, monkeypatch):
+    put_many = handler.store.put_many
+    failures = []
+
+    def put_first_and_fail(reviews, sync=True):
+        # Guarda parte del lote y falla (p. ej. disco lleno); solo la primera vez
+        if failures:
+            return put_many(reviews, sync=sync)
+        failures.append(True)
+        put_many(list(reviews)[:1], sync=sync)
+        raise OSError('disco lleno')
+
+    monkeypatch.setattr(handler.store, 'put_many', put_first_and_fail)
+    original = handler.load_review('r1')
+    statuses = BulkIngestor(handler, workers=1).ingest_batch(
+        [(1, review_copy(REVIEWS[0], resena='Pantalla rota')), (2, dict(TOSTADORA))], duplicates='allow')
+    assert [status['status'] for status in statuses] == ['error', 'error']
+    assert 'disco lleno' in statuses[0]['error']
+    assert handler.load_review('r1') == original
+    assert 'r11' not in handler.store
+    assert handler.text_processor.tf_idf_search('tostadora pantalla') == {}
+
+    # Tras una caída sin checkpoint, reproducir el WAL no aplica el lote fallido
+    handler.wal.close()
+    handler.store.close()
+    recovered = ReviewFileHandler(data_dir=tmp_path)
+    try:
+        assert recovered.load_review('r1')['resena'] == REVIEWS[0]['resena']
+        assert 'r11' not in recovered.store
+        assert recovered.text_processor.tf_idf_search('tostadora pantalla') == {}
+        assert recovered.text_processor.total_documents == len(REVIEWS)
+    finally:
+        recovered.wal.close()
+        recovered.store.close()
+
+def ndjson(*lines) -> bytes:
+    return b'\n'.join(line if isinstance(line, bytes) else json.dumps(line).encode('utf-8') for line in lines)
+
+def api_review(review_id, resena, **changes):
+    return {'id': review_id, 'producto': 'Robot aspirador Roomba', 'categoria': 'Hogar', 'puntuacion': 4,
+            'resena': resena, 'website': {'nombre': 'Amazon'}, **changes}
+
+def test_endpoint_reports_a_status_per_line(client, service):
+    text = 'El robot aspirador limpia toda la casa sin atascarse y vuelve solo a la base de carga'
+    body = ndjson(api_review('bulk-1', text),
+                  b'',
+                  b'{"id": "roto"',
+                  b'[1, 2]',
+                  api_review('bulk-2', 'Sin estrellas', puntuacion=9),
+                  api_review('bulk-3', text.upper()),
+                  api_review('bulk-4', 'Tostadora que tuesta el pan de forma uniforme y rápida'))
+    response = client.post('/bulk_ingest?duplicates=skip', content=body)
+    assert response.status_code == 200
+    summary = response.json()
+    statuses = {status['line']: status for status in summary['results']}
+    assert {line: status['status'] for line, status in statuses.items()} == \
+           {1: 'indexed', 3: 'invalid', 4: 'invalid', 5: 'invalid', 6: 'duplicate', 7: 'indexed'}
+    assert 'objeto JSON' in statuses[4]['error']
+    assert statuses[6]['duplicate_of'] == 'bulk-1'
+    assert (summary['total'], summary['indexed'], summary['duplicates'], summary['failed']) == (6, 2, 1, 3)
+    assert service.review_handler.load_review('bulk-4')['resena'].startswith('Tostadora')
+
+def test_endpoint_reports_store_errors(client, service, monkeypatch):
+    def failing_put_many(reviews, sync=True):
+        raise OSError('disco lleno')
+
+    monkeypatch.setattr(service.review_handler.store, 'put_many', failing_put_many)
+    summary = client.post('/bulk_ingest', content=ndjson(api_review('bulk-error', 'Plancha de vapor potente'))).json()
+    monkeypatch.undo()
+    assert [(status['status'], status['id']) for status in summary['results']] == [('error', 'bulk-error')]
+    assert summary['failed'] == 1
+    assert 'bulk-error' not in service.review_handler.store
@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+from conftest import REVIEWS, bulk_processor
+from index_segments import IndexSegment
+from review_file_handler import ReviewFileHandler
+from text_processor import TextProcessor
+
+QUERIES = ['auriculares batería', 'cafetera café', 'calidad']
+
+def test_compact_reclaims_masked_documents():
+    processor = bulk_processor()
+    processor.remove_documents(['r1', 'r4'])
+    processor.index_document('r2', 'Auriculares con cancelación de ruido', 'Audio', 4)
+    assert sum(len(mask) for mask in processor.generation.masks) == 3
+    expected = {query: processor.tf_idf_search(query) for query in QUERIES}
+
+    result = processor.compact()
+    generation = processor.generation
+    assert len(generation.segments) == 1 and not any(generation.masks)
+    assert result['after']['stored_documents'] == len(REVIEWS) - 2
+    assert result['reclaimed']['documents'] == 3
+    assert result['after']['bytes'] < result['before']['bytes']
+    for query in QUERIES:
+        assert processor.tf_idf_search(query) == pytest.approx(expected[query])
+
+def test_compact_keeps_writes_made_while_merging(processor, monkeypatch):
+    merge = IndexSegment.merge
+    injected = []
+
+    def merge_with_writes(segments, masks):
+        merged = merge(segments, masks)
+        if len(segments) > 1 and not injected:
+            injected.append(True)
+            # Escrituras publicadas mientras compact() fusiona fuera del lock de escritura
+            processor.index_document('r11', 'Tostadora que tuesta bien el pan', 'Hogar', 4)
+            processor.remove_document('r5')
+            processor.index_document('r6', 'Aspiradora ruidosa', 'Hogar', 2)
+        return merged
+
+    monkeypatch.setattr(IndexSegment, 'merge', staticmethod(merge_with_writes))
+    processor.compact()
+    monkeypatch.setattr(IndexSegment, 'merge', merge)
+    assert injected
+
+    reference = TextProcessor()
+    for review in REVIEWS:
+        if review['id'] not in ('r5', 'r6'):
+            reference.index_document(review['id'], ReviewFileHandler.index_text(review), review['categoria'],
+                                     review['puntuacion'])
+    reference.index_document('r11', 'Tostadora que tuesta bien el pan', 'Hogar', 4)
+    reference.index_document('r6', 'Aspiradora ruidosa', 'Hogar', 2)
+    generation = processor.generation
+    assert generation.total_documents == reference.total_documents
+    assert generation.total_length == reference.generation.total_length
+    for query in QUERIES + ['tostadora', 'aspiradora']:
+        assert processor.tf_idf_search(query) == pytest.approx(reference.tf_idf_search(query))
+
+def test_compact_index_reconciles_and_checkpoints(handler):
+    handler.delete_review('r3')
+    handler.text_processor.index_document('fantasma', 'Documento que no está en el almacén', 'Audio', 3)
+    result = handler.compact_index()
+    assert result['synonyms'] == 'current'
+    assert result['reconciled']['removed'] == 1
+    assert handler.text_processor.generation.locate('fantasma') is None
+    assert result['index']['after']['stored_documents'] == len(REVIEWS) - 1
+    assert handler.wal.checkpoint_lsn == handler.wal.last_lsn
+
+def test_rebuild_and_compaction_exclude_each_other(handler):
+    refused = []
+
+    def compact_from_another_thread(processed, failed, total):
+        def compact():
+            try:
+                handler.compact_index()
+            except RuntimeError as e:
+                refused.append(str(e))
+        thread = threading.Thread(target=compact)
+        thread.start()
+        thread.join()
+
+    handler.rebuild_index(progress=compact_from_another_thread, batch_size=len(REVIEWS))
+    assert refused and '(rebuild)' in refused[0]
+    assert handler.maintenance_operation is None
@@ -0,0 +1,120 @@
+import math
+import random
+
+import pytest
+
+from conftest import REVIEWS
+from evaluator import Evaluator
+
+NONRELEVANT_PATTERNS = ['mala batería', 'poca duración', 'dura poco', 'batería corta', 'apenas dura']
+
+def reference_relevant(evaluator, results, query_terms):
+    """Criterio original: subcadenas en el texto y ventana de ±5 palabras recorrida palabra a palabra"""
+    relevant = set()
+    expanded_terms = evaluator.expand_query_terms(query_terms) if query_terms else set()
+    for doc in results:
+        review_text = doc.get('resena', '').lower()
+        rating = float(doc.get('puntuacion', 0))
+        matching_terms = sum(1 for term in expanded_terms if term.lower() in review_text)
+        has_positive = has_negative = False
+        words = review_text.split()
+        for i, word in enumerate(words):
+            if word in expanded_terms:
+                context = words[max(0, i - 5):min(len(words), i + 6)]
+                has_positive = has_positive or any(pos in context for pos in evaluator.positive_words)
+                has_negative = has_negative or any(neg in context for neg in evaluator.negative_words)
+        if (rating >= 3 or has_positive or matching_terms >= 2) and not has_negative:
+            relevant.add(doc['id'])
+    return relevant
+
+def reference_nonrelevant(results, relevant):
+    return {doc['id'] for doc in results
+            if doc['id'] not in relevant and 'resena' in doc
+            and any(pattern in doc['resena'].lower() for pattern in NONRELEVANT_PATTERNS)}
+
+def random_reviews(evaluator, count, seed):
+    generator = random.Random(seed)
+    vocabulary = (' '.join(review['resena'] for review in REVIEWS).split()
+                  + sorted(evaluator.positive_words) + sorted(evaluator.negative_words)
+                  + ['batería', 'Batería,', 'baterías', 'sonido', 'audio', 'duración', 'dura', 'poco', 'mala',
+                     'corta', 'apenas', 'BUENA', 'calidad.', 'vale', 'la', 'pena'])
+    return [{'id': f"d{i}", 'puntuacion': generator.randint(1, 5),
+             'resena': ' '.join(generator.choice(vocabulary) for _ in range(generator.randint(0, 30)))}
+            for i in range(count)]
+
+@pytest.fixture(scope='module')
+def evaluator():
+    return Evaluator()
+
+@pytest.mark.parametrize('query_terms', [['batería'], ['sonido', 'calidad'], ['duración', 'batería', 'dura'],
+                                         ['Batería'], [], None])
+def test_matcher_judges_like_the_original_criteria(evaluator, query_terms):
+    results = random_reviews(evaluator, 400, seed=len(query_terms or ())) + [dict(review) for review in REVIEWS]
+    relevant = evaluator.get_relevant_docs_boolean(results, query_terms)
+    assert relevant == reference_relevant(evaluator, results, query_terms)
+    assert evaluator.get_nonrelevant_docs_boolean(results, relevant) == reference_nonrelevant(results, relevant)
+
+def test_judgment_of_a_single_review(evaluator):
+    expanded = evaluator.expand_query_terms(['batería'])
+    matcher = evaluator._get_matcher(expanded)
+    judgment = evaluator.judge_document('Una batería excelente y duradera, aunque el cable es malo y se rompe',
+                                        expanded, matcher)
+    # "malo" está a más de 5 palabras de "batería"
+    assert judgment['has_positive'] and not judgment['has_negative']
+    assert evaluator.is_nonrelevant('La batería dura poco')
+    assert not evaluator.is_nonrelevant('La batería dura mucho')
+
+def random_runs(count, seed):
+    generator = random.Random(seed)
+    runs = {}
+    for query in range(count):
+        size = generator.randint(0, 40)
+        # Scores redondeados para que haya empates
+        runs[f"q{query}"] = {f"d{doc}": round(generator.random() * 0.5, 2) for doc in generator.sample(range(100), size)}
+    return runs
+
+def test_batch_metrics_match_evaluate_ranked_search():
+    evaluator = Evaluator(similarity_threshold=0.15)
+    runs = random_runs(50, seed=3)
+    query_terms = {'q0': ['batería'], 'q1': ['sonido']}
+    expected = evaluator.evaluate_ranked_search(runs, query_terms)
+    batch = evaluator.evaluate_ranked_batch(runs, k=5, query_terms=query_terms)
+    assert batch['per_query'].keys() == expected['per_query'].keys()
+    for query_id, metrics in expected['per_query'].items():
+        for name, value in metrics.items():
+            if name == 'expanded_terms':
+                assert sorted(batch['per_query'][query_id][name]) == sorted(value)
+            else:
+                assert batch['per_query'][query_id][name] == pytest.approx(value), (query_id, name)
+    for name in ('map', 'precision', 'recall', 'f1'):
+        assert batch['overall'][name] == pytest.approx(expected['overall'][name])
+
+def test_batch_metrics_known_values():
+    evaluator = Evaluator()
+    nan = float('nan')
+    scores = [[0.9, 0.8, 0.7, nan], [0.2, 0.5, nan, nan], [nan, nan, nan, nan]]
+    relevance = [[0, 1, 2, 0], [0, 1, 0, 0], [0, 0, 0, 0]]
+    batch = evaluator.batch_metrics(scores, relevance, k=2, num_relevant=[3, 1, 0])
+    per_query = batch['per_query']
+    assert per_query['precision_at_k'] == pytest.approx([0.5, 0.5, 0.0])
+    assert per_query['recall_at_k'] == pytest.approx([1 / 3, 1.0, 0.0])
+    assert per_query['reciprocal_rank'] == pytest.approx([0.5, 1.0, 0.0])
+    assert per_query['average_precision'] == pytest.approx([(1 / 2 + 2 / 3) / 3, 1.0, 0.0])
+    # nDCG@2 con ganancia 2^grado - 1: ranking (0, 1) frente al ideal (2, 1)
+    discount = 1 / math.log2(3)
+    assert per_query['ndcg_at_k'] == pytest.approx([discount / (3 + discount), 1.0, 0.0])
+    assert per_query['retrieved_count'].tolist() == [3, 2, 0]
+    assert batch['overall']['mrr'] == pytest.approx(0.5)
+
+def test_batch_metrics_with_empty_runs():
+    evaluator = Evaluator()
+    batch = evaluator.evaluate_ranked_batch({'vacia': {}, 'una': {'d1': 0.3}}, k=10)
+    assert batch['per_query']['vacia']['retrieved_count'] == 0
+    assert batch['per_query']['vacia']['average_precision'] == 0.0
+    assert batch['per_query']['una']['precision_at_k'] == pytest.approx(0.1)
+    assert evaluator.evaluate_ranked_batch({})['overall']['map'] == 0.0
+
+@pytest.mark.parametrize('k', [0, -3])
+def test_batch_metrics_reject_k_below_one(k):
+    with pytest.raises(ValueError):
+        Evaluator().batch_metrics([[0.5]], [[1]], k=k)
@@ -0,0 +1,38 @@
+import pytest
+
+from fuzzy_index import DeletionIndex, edit_distance
+
+@pytest.mark.parametrize('a, b, distance', [
+    ('bateria', 'bateria', 0), ('bateira', 'bateria', 1), ('btaeria', 'bateria', 1),
+    ('baterya', 'bateria', 1), ('bteira', 'bateria', 2), ('xyz', 'bateria', None),
+])
+def test_edit_distance(a, b, distance):
+    assert edit_distance(a, b, 2) == distance
+
+def test_deletion_index_prefers_distance_then_frequency():
+    index = DeletionIndex({'sonido': 5, 'sonda': 1, 'sonada': 9, 'bateria': 3})
+    assert index.lookup('sonido') == [('sonido', 0, 5)]
+    assert [word for word, _, _ in index.lookup('sonid')] == ['sonido', 'sonada', 'sonda']
+    assert index.lookup('sonid', max_distance=1) == [('sonido', 1, 5)]
+    assert index.lookup('batreia') == [('bateria', 1, 3)]
+    assert index.lookup('zzzz') == []
+
+def test_deletion_index_matches_brute_force():
+    words = {f"{prefix}{suffix}": len(prefix) for prefix in ('cas', 'caf', 'cam', 'bat')
+             for suffix in ('a', 'eta', 'era', 'ilo')}
+    index = DeletionIndex(words)
+    for term in ('cafta', 'casseta', 'batetta', 'camil', 'xafera'):
+        expected = sorted(((word, edit_distance(term, word, 2), frequency) for word, frequency in words.items()
+                           if edit_distance(term, word, 2) is not None),
+                          key=lambda match: (match[1], -match[2], match[0]))
+        assert index.lookup(term, limit=len(words)) == expected
+
+def test_correct_query_keeps_operators(processor):
+    corrected, corrections = processor.correct_query('auricualres AND (bateira OR sonido)')
+    assert corrections == {'auricualres': 'auriculares', 'bateira': 'bateria'}
+    assert corrected == 'auriculares AND ( bateria OR sonido )'
+    assert processor.correct_query('auriculares') == ('auriculares', {})
+
+def test_fuzzy_search_finds_misspelled_terms(processor):
+    assert processor.tf_idf_search('cafetrea', fuzzy=True).keys() == processor.tf_idf_search('cafetera').keys()
+    assert processor.tf_idf_search('cafetrea') == {}
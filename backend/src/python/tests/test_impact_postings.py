@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from conftest import REVIEWS
+from impact_postings import ImpactIndex
+from index_segments import BASE
+from text_processor import TextProcessor
+
+QUERIES = ['auriculares batería', 'cafetera café', 'calidad', 'sonido bluetooth', 'batería aspiradora silenciosa']
+
+@pytest.fixture(scope='module')
+def large():
+    """Índice con varios segmentos y documentos enmascarados para los recorridos por impacto"""
+    generator = random.Random(7)
+    processor = TextProcessor()
+    words = ' '.join(review['resena'] for review in REVIEWS).split()
+    for i in range(300):
+        review = REVIEWS[i % len(REVIEWS)]
+        text = ' '.join(generator.choice(words) for _ in range(generator.randint(3, 40)))
+        processor.index_document(f"d{i}", text, review['categoria'], generator.randint(1, 5))
+    processor.remove_documents(f"d{i}" for i in range(0, 300, 7))
+    return processor
+
+def test_levels_bound_the_factor():
+    index = ImpactIndex(lambda segment, doc_id: 1.0)
+    for factor in (1.0, 0.9, 0.5, 0.123, 1e-3, 1e-9):
+        level = index.level(factor)
+        assert factor <= index.bound(level)
+        assert level == 255 or factor > index.bound(level + 1)
+    assert index.level(3.0) == 0 and index.bound(0) == float('inf')
+
+def test_postings_are_sorted_by_impact(large):
+    checked = 0
+    for segment in large.generation.segments:
+        impacts = large.impacts.postings(segment, BASE, 'bateri')
+        if impacts is None:
+            continue
+        checked += 1
+        assert list(impacts.levels) == sorted(impacts.levels)
+        assert sorted(impacts.doc_ids) == sorted(segment.postings[BASE]['bateri'])
+        assert sum(end - start for _, start, end in impacts.runs) == len(impacts.doc_ids)
+    assert checked
+
+@pytest.mark.parametrize('rated', [False, True])
+@pytest.mark.parametrize('query', QUERIES)
+def test_early_termination_matches_exhaustive_search(large, query, rated):
+    exhaustive = list(large.tf_idf_search(query, rated=rated).items())
+    assert exhaustive
+    for limit in (1, 5, 20):
+        top = list(large.tf_idf_search(query, limit=limit, rated=rated).items())
+        assert [doc_id for doc_id, _ in top] == [doc_id for doc_id, _ in exhaustive[:limit]]
+        assert [score for _, score in top] == pytest.approx([score for _, score in exhaustive[:limit]])
+    threshold = exhaustive[len(exhaustive) // 2][1]
+    above = large.tf_idf_search(query, min_score=threshold, rated=rated)
+    assert above == pytest.approx({doc_id: score for doc_id, score in exhaustive if score >= threshold})
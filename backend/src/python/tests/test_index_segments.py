@@ -0,0 +1,60 @@
+import math
+
+import pytest
+
+from conftest import REVIEWS, bulk_processor, index_reviews
+from text_processor import TextProcessor
+
+QUERIES = ['auriculares batería', 'cafetera café', 'calidad', 'sonido bluetooth', 'zapatillas rotas']
+
+def assert_same_scores(actual, expected):
+    assert actual.keys() == expected.keys()
+    for doc_id, score in expected.items():
+        assert actual[doc_id] == pytest.approx(score)
+
+def test_each_write_publishes_a_generation(processor):
+    generation = processor.generation
+    processor.index_document('r11', 'Tostadora que tuesta bien el pan', 'Hogar', 4)
+    assert processor.generation.number == generation.number + 1
+    assert processor.total_documents == len(REVIEWS) + 1
+    # La generación fijada por una consulta no ve las escrituras posteriores
+    assert generation.locate('r11') is None
+    assert generation.total_documents == len(REVIEWS)
+
+def test_replaced_and_removed_documents_are_masked(processor):
+    processor.index_document('r1', 'Tostadora que tuesta bien el pan', 'Hogar', 4)
+    assert processor.remove_document('r4')
+    assert not processor.remove_document('r4')
+    generation = processor.generation
+    assert generation.total_documents == len(REVIEWS) - 1
+    assert 'r1' not in processor.tf_idf_search('auriculares')
+    assert 'r1' in processor.tf_idf_search('tostadora')
+    assert 'r4' not in processor.tf_idf_search('cafetera')
+    assert generation.total_length == sum(length for _, length in generation.iter_lengths())
+
+def test_incremental_index_matches_bulk_index(processor):
+    bulk = bulk_processor()
+    assert processor.generation.total_documents == bulk.generation.total_documents
+    assert processor.generation.total_length == bulk.generation.total_length
+    for query in QUERIES:
+        assert_same_scores(processor.tf_idf_search(query), bulk.tf_idf_search(query))
+        assert_same_scores(processor.bm25_search(query), bulk.bm25_search(query))
+
+def test_merge_policy_bounds_segments():
+    processor = TextProcessor()
+    reviews = [dict(review, id=f"{review['id']}-{copy}") for copy in range(20) for review in REVIEWS]
+    index_reviews(processor, reviews)
+    segments = processor.generation.segments
+    assert len(segments) <= max(2, math.ceil(math.log(len(reviews), processor.merge_factor)) + 1)
+    # Cada segmento es más de merge_factor veces mayor que el siguiente
+    for larger, smaller in zip(segments, segments[1:]):
+        assert len(larger) > processor.merge_factor * len(smaller)
+    assert sum(len(segment) for segment in segments) == len(reviews)
+
+def test_mostly_masked_segment_is_rewritten():
+    processor = TextProcessor()
+    index_reviews(processor)
+    processor.remove_documents([review['id'] for review in REVIEWS[:7]])
+    generation = processor.generation
+    assert sum(len(segment) for segment in generation.segments) == len(REVIEWS) - 7
+    assert not any(generation.masks)
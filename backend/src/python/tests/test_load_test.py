@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from load_test import LoadTest, label_for, log_queries, percentiles
+
+def test_log_queries_accepts_bodies_and_requests(tmp_path):
+    log = tmp_path / 'consultas.jsonl'
+    log.write_text('\n'.join([
+        json.dumps({'query': 'auriculares', 'search_type': 'bm25'}),
+        '',
+        json.dumps({'path': '/suggest?q=auri', 'method': 'get'}),
+        json.dumps({'path': '/search', 'body': {'query': 'cafetera'}}),
+    ]) + '\n', encoding='utf-8')
+    queries = log_queries(log)
+    assert [(query['method'], query['path'], query['label']) for query in queries] == [
+        ('POST', '/search', 'search:bm25'),
+        ('GET', '/suggest?q=auri', 'GET /suggest'),
+        ('POST', '/search', 'search:tf_idf'),
+    ]
+    assert queries[0]['body'] == {'query': 'auriculares', 'search_type': 'bm25'}
+    assert queries[1]['body'] is None
+
+def test_percentiles_use_nearest_rank():
+    values = [i / 1000 for i in range(1, 101)]
+    assert percentiles(values) == {'mean': 50.5, 'p50': 50.0, 'p90': 90.0, 'p95': 95.0, 'p99': 99.0,
+                                   'max': 100.0}
+    assert percentiles([])['p50'] is None
+
+def test_load_test_needs_queries_and_a_budget():
+    with pytest.raises(ValueError):
+        LoadTest([])
+    with pytest.raises(ValueError):
+        LoadTest([{'method': 'GET', 'path': '/health', 'body': None, 'label': 'GET /health'}], duration=None)
+
+@pytest.mark.parametrize('rate', [None, 200.0])
+def test_replay_against_the_service(service, tmp_path, rate):
+    log = tmp_path / 'consultas.jsonl'
+    log.write_text('\n'.join(json.dumps(body) for body in [
+        {'query': 'auriculares batería', 'search_type': 'tf_idf'},
+        {'query': 'cafetera', 'search_type': 'bm25'},
+        {'query': 'auriculares AND sonido', 'search_type': 'boolean'},
+        {'query': '', 'search_type': 'no-existe'},
+    ]), encoding='utf-8')
+    test = LoadTest(log_queries(log), concurrency=2, rate=rate, duration=None, max_requests=24, warmup=2, seed=3)
+
+    async def replay():
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://load-test') as client:
+            return await test.run(client)
+
+    report = asyncio.run(replay())
+    assert report['mode'] == ('closed' if rate is None else 'open')
+    assert report['requests'] == 24 == sum(group['requests'] for group in report['by_label'].values())
+    assert set(report['by_label']) <= {label_for('POST', '/search', {'search_type': search_type})
+                                       for search_type in ('tf_idf', 'bm25', 'boolean', 'no-existe')}
+    # Solo la consulta inválida falla, y con un error HTTP, no de transporte
+    invalid = report['by_label'].get('search:no-existe', {'errors': 0})
+    assert report['errors'] == invalid['errors']
+    assert set(report['error_types']) <= {f"HTTP {code}" for code in (400, 422)}
+    assert report['latency_ms']['p50'] <= report['latency_ms']['p99'] <= report['latency_ms']['max']
+    assert ('service_ms' in report) == (rate is not None)
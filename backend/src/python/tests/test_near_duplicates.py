@@ -0,0 +1,50 @@
+from conftest import REVIEWS, review_copy
+from near_duplicates import LSHIndex, MinHasher
+
+TEXT = 'los auriculares tienen una batería excelente y un sonido muy claro para escuchar música en el tren'
+
+def test_signatures_are_deterministic_and_estimate_jaccard():
+    hasher = MinHasher()
+    tokens = TEXT.split()
+    assert hasher.signature(tokens) == MinHasher().signature(tokens)
+    assert hasher.signature([]) is None
+    similar = tokens[:-1] + ['metro']
+    exact = len(hasher.shingles(tokens) & hasher.shingles(similar)) / len(hasher.shingles(tokens) | hasher.shingles(similar))
+    estimate = MinHasher.similarity(hasher.signature(tokens), hasher.signature(similar))
+    assert abs(estimate - exact) < 0.15
+    assert MinHasher.similarity(hasher.signature(tokens), hasher.signature('otra cosa muy distinta'.split())) < 0.1
+
+def test_lsh_candidates_share_a_band():
+    hasher = MinHasher()
+    lsh = LSHIndex(bands=16, rows=8)
+    lsh.add('a', hasher.signature(TEXT.split()))
+    lsh.add('b', hasher.signature('una reseña que no se parece en nada a la otra'.split()))
+    assert lsh.candidates(hasher.signature(TEXT.split())) == {'a'}
+    assert [sorted(bucket) for bucket in lsh.buckets()] == []
+    lsh.add('c', hasher.signature(TEXT.split()))
+    assert sorted(map(sorted, lsh.buckets()))[0] == ['a', 'c']
+
+def test_find_duplicates_ignores_masked_documents(processor):
+    text = 'Auriculares Sony. ' + REVIEWS[0]['resena']
+    signature = processor.text_signature(text)
+    assert [doc_id for doc_id, _ in processor.find_duplicates(signature)] == ['r1']
+    assert processor.find_duplicates(signature, exclude='r1') == []
+    processor.remove_document('r1')
+    assert processor.find_duplicates(signature) == []
+
+def test_duplicate_clusters(processor):
+    processor.index_document('r1-copia', 'AURICULARES SONY: ' + REVIEWS[0]['resena'].upper() + '!!', 'Audio', 5)
+    processor.index_document('r1-copia2', 'Auriculares Sony. ' + REVIEWS[0]['resena'], 'Audio', 4)
+    clusters = processor.duplicate_clusters()
+    assert len(clusters) == 1
+    assert clusters[0]['ids'] == ['r1', 'r1-copia', 'r1-copia2']
+    assert clusters[0]['min_similarity'] >= processor.duplicates.threshold
+
+def test_save_review_duplicate_policies(handler):
+    duplicate = review_copy(REVIEWS[0], id=None)
+    assert handler.save_review(dict(duplicate), duplicates='skip') == 'r1'
+    linked_id = handler.save_review(dict(duplicate), duplicates='link')
+    assert linked_id != 'r1'
+    assert handler.load_review(linked_id)['duplicate_of'] == 'r1'
+    allowed_id = handler.save_review(dict(duplicate), duplicates='allow')
+    assert 'duplicate_of' not in handler.load_review(allowed_id)
@@ -0,0 +1,58 @@
+import pytest
+
+from conftest import REVIEWS
+from index_segments import BASE, IndexSegment
+
+QUERIES = ['auriculares batería', 'cafetera café', 'calidad', 'sonido bluetooth', 'zapatillas rotas']
+
+def assert_same_scores(actual, expected):
+    assert actual.keys() == expected.keys()
+    for doc_id, score in expected.items():
+        assert actual[doc_id] == pytest.approx(score)
+
+def test_partition_is_a_filtered_view_with_collection_statistics(processor):
+    partition = processor.generation.partition(['Audio'])
+    audio = {review['id'] for review in REVIEWS if review['categoria'] == 'Audio'}
+    assert partition.total_documents == len(audio)
+    assert set(partition.postings('auricular', BASE)) <= audio
+    assert partition.collection.total_documents == len(REVIEWS)
+    assert set(processor.generation.partitions()) == {'Audio', 'Hogar', 'Ropa'}
+    # Los scores de una partición son los del índice completo limitados a sus documentos
+    for query in QUERIES:
+        full = processor.tf_idf_search(query)
+        assert_same_scores(processor.tf_idf_search(query, generation=partition),
+                           {doc_id: score for doc_id, score in full.items() if doc_id in audio})
+        full = processor.bm25_search(query)
+        assert_same_scores(processor.bm25_search(query, generation=partition),
+                           {doc_id: score for doc_id, score in full.items() if doc_id in audio})
+
+def test_partition_follows_masks(processor):
+    processor.remove_document('r1')
+    partition = processor.generation.partition(['Audio'])
+    assert partition.total_documents == 3
+    assert 'r1' not in processor.tf_idf_search('auriculares', generation=partition)
+
+def test_route_and_select_partitions(processor):
+    processor.route_min_documents = 2
+    assert processor.select_partitions('auriculares con batería', route=True) == ['Audio']
+    assert processor.select_partitions('calidad', categories=['hogar', 'ROPA']) == ['Hogar', 'Ropa']
+    assert processor.select_partitions('calidad') is None
+
+def test_category_split_cache_is_bounded(processor, monkeypatch):
+    monkeypatch.setattr(IndexSegment, 'CATEGORY_POSTINGS_CACHE_SIZE', 3)
+    segment = processor.generation.segments[0]
+    terms = [term for term in segment.postings[BASE]][:5]
+    assert len(terms) == 5
+    first = segment.category_postings(BASE, terms[0])
+    for term in terms[1:3]:
+        segment.category_postings(BASE, term)
+    # El término usado más recientemente se conserva y el menos reciente se descarta
+    assert segment.category_postings(BASE, terms[0]) is first
+    for term in terms[3:]:
+        segment.category_postings(BASE, term)
+    assert list(segment._category_postings) == [(BASE, terms[0]), (BASE, terms[3]), (BASE, terms[4])]
+    split = segment.category_postings(BASE, terms[1])
+    assert split == {category: {doc_id: positions for doc_id, positions in segment.postings[BASE][terms[1]].items()
+                                if segment.categories[doc_id] == category}
+                     for category in {segment.categories[doc_id] for doc_id in segment.postings[BASE][terms[1]]}}
+    assert len(segment._category_postings) == 3
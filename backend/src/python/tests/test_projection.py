@@ -0,0 +1,34 @@
+from conftest import REVIEWS, review_copy
+from review_file_handler import ReviewFileHandler
+
+def test_search_returns_only_the_requested_fields(client):
+    response = client.post('/search', json={'query': 'auriculares batería', 'fields': ['producto', 'score']})
+    results = response.json()['results']
+    assert results and all(result.keys() == {'id', 'producto', 'score'} for result in results)
+
+    with_snippets = client.post('/search', json={'query': 'auriculares', 'fields': ['snippets', 'no_existe']})
+    results = with_snippets.json()['results']
+    assert results and all(result.keys() == {'id', 'snippets'} for result in results)
+
+    full = client.post('/search', json={'query': 'auriculares'}).json()['results']
+    assert full[0].keys() >= {'id', 'producto', 'categoria', 'resena', 'puntuacion', 'score', 'snippets'}
+
+def test_derived_fields_are_not_stored(handler):
+    review = review_copy(REVIEWS[0], id='derivados', analisis_texto={'tokens': ['auricular']}, score=0.7,
+                         snippets=['<em>auriculares</em>'])
+    handler.save_review(review, duplicates='allow')
+    stored = handler.store.get('derivados')
+    assert not set(ReviewFileHandler.DERIVED_FIELDS) & stored.keys()
+    assert stored['resena'] == REVIEWS[0]['resena'] and 'metadata' in stored
+
+    # Los resultados de una búsqueda con fragmentos no vuelven al almacén
+    results = handler.search_reviews('auriculares', snippets=True)
+    assert results and all('snippets' in result and 'score' in result for result in results)
+    assert 'snippets' not in handler.store.get('r1') and 'score' not in handler.store.get('r1')
+
+def test_legacy_records_are_trimmed_on_load(handler):
+    handler.store.put(review_copy(REVIEWS[1], analisis_texto={'tokens': ['sonido']}))
+    assert 'analisis_texto' in handler.store.get('r2')
+    assert 'analisis_texto' not in handler.load_review('r2')
+    plain = {'id': 'x', 'resena': 'texto'}
+    assert ReviewFileHandler.stored_review(plain) is plain
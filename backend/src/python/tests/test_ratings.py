@@ -0,0 +1,59 @@
+import math
+
+import pytest
+
+from conftest import REVIEWS, review_copy
+from review_file_handler import ReviewFileHandler
+
+def test_rating_factor(processor):
+    assert processor.rating_factor(5) == pytest.approx(1.0)
+    assert processor.rating_factor(4) == pytest.approx(0.64)
+    # Las puntuaciones bajas tienen una penalización extra
+    assert processor.rating_factor(2) == pytest.approx(0.4 ** 2 * 0.3)
+    assert processor.rating_factor(None) == processor.rating_factor(processor.default_rating)
+
+def test_ratings_are_an_index_column(processor):
+    generation = processor.generation
+    assert {review['id']: generation.rating(review['id']) for review in REVIEWS} == \
+           {review['id']: float(review['puntuacion']) for review in REVIEWS}
+    assert generation.rating('no-existe') is None
+    processor.index_document('sin-puntuacion', 'Tostadora que tuesta bien el pan', 'Hogar', None)
+    processor.index_document('r1', 'Auriculares con la batería agotada', 'Audio', 2)
+    generation = processor.generation
+    assert generation.rating('sin-puntuacion') is None and generation.rating('r1') == 2.0
+    segment = generation.segments[generation.locate('sin-puntuacion')]
+    assert math.isnan(segment.ratings[segment.ordinals()['sin-puntuacion']])
+    assert ReviewFileHandler.review_rating({'puntuacion': 'cinco'}) is None
+
+@pytest.mark.parametrize('search_type', ['tf_idf', 'bm25', 'hybrid'])
+def test_ranked_search_folds_the_rating_into_the_score(processor, search_type):
+    engines = {'tf_idf': processor.tf_idf_search, 'bm25': processor.bm25_search, 'hybrid': processor.hybrid_search}
+    plain = engines[search_type]('auriculares calidad')
+    expected = sorted(((doc_id, score * processor.rating_factor(processor.generation.rating(doc_id)))
+                       for doc_id, score in plain.items()), key=lambda item: -item[1])
+    for limit in (None, 3):
+        ranked = processor.ranked_search('auriculares calidad', search_type, min_score=0.0, limit=limit)
+        assert [score for _, score in ranked] == pytest.approx([score for _, score in expected[:limit]])
+    processor.semantic.wait()
+
+def test_ratings_survive_merges_and_checkpoints(handler, tmp_path):
+    handler.save_review(review_copy(REVIEWS[0], puntuacion=1), duplicates='allow')
+    handler.compact_index()
+    assert len(handler.text_processor.generation.segments) == 1
+    assert handler.text_processor.generation.rating('r1') == 1.0
+    handler.checkpoint()
+    handler.wal.close()
+    handler.store.close()
+
+    restored = ReviewFileHandler(data_dir=tmp_path)
+    try:
+        generation = restored.text_processor.generation
+        assert generation.rating('r1') == 1.0 and generation.rating('r4') == 5.0
+        results = restored.search_reviews('auriculares', 'tf_idf', min_score=0.0)
+        scores = restored.text_processor.tf_idf_search('auriculares')
+        for result in results:
+            assert result['score'] == pytest.approx(
+                scores[result['id']] * restored.text_processor.rating_factor(result['puntuacion']))
+    finally:
+        restored.wal.close()
+        restored.store.close()
@@ -0,0 +1,41 @@
+import pytest
+
+from conftest import REVIEWS, review_copy
+
+QUERY = 'auriculares batería cafetera tostadora'
+
+def test_rebuild_swaps_in_an_equivalent_index(handler):
+    old = handler.text_processor
+    expected = old.tf_idf_search(QUERY)
+    new = handler.rebuild_index(batch_size=3)
+    assert handler.text_processor is new and new is not old
+    assert new.total_documents == len(REVIEWS)
+    assert new.tf_idf_search(QUERY) == pytest.approx(expected)
+    # Las consultas que fijaron el índice anterior siguen con él
+    assert old.total_documents == len(REVIEWS)
+
+def test_rebuild_catches_up_with_concurrent_writes(handler):
+    def write_during_rebuild(processed, failed, total):
+        if processed == 3:
+            handler.save_review({'id': 'r11', 'producto': 'Tostadora Taurus', 'categoria': 'Hogar', 'puntuacion': 4,
+                                 'resena': 'La tostadora tuesta el pan de forma uniforme'}, duplicates='allow')
+            handler.save_review(review_copy(REVIEWS[0], resena='Pantalla rota'), duplicates='allow')
+            handler.delete_review('r4')
+
+    new = handler.rebuild_index(progress=write_during_rebuild, batch_size=3)
+    assert handler.text_processor is new
+    assert 'r11' in new.tf_idf_search('tostadora')
+    assert 'r1' in new.tf_idf_search('pantalla') and 'r1' not in new.tf_idf_search('batería')
+    assert new.generation.locate('r4') is None
+    assert new.total_documents == len(REVIEWS)
+
+def test_rebuild_defers_checkpoints(handler):
+    lsns = []
+
+    def checkpoint_during_rebuild(processed, failed, total):
+        handler.checkpoint()
+        lsns.append(handler.wal.checkpoint_lsn)
+
+    before = handler.wal.checkpoint_lsn
+    handler.rebuild_index(progress=checkpoint_during_rebuild, batch_size=5)
+    assert lsns and all(lsn == before for lsn in lsns)
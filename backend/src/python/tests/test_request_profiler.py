@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+from request_profiler import RequestProfiler
+
+class TextProcessor:
+    """Componente de prueba: sus funciones se agregan bajo TextProcessor"""
+    def busy(self, seconds: float):
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            pass
+
+def test_session_profiles_the_next_requests():
+    profiler = RequestProfiler()
+    with pytest.raises(ValueError):
+        profiler.start()
+    status = profiler.start(requests=1, interval=0.001)
+    assert status['state'] == RequestProfiler.RUNNING and profiler.active
+    with pytest.raises(RuntimeError):
+        profiler.start(requests=1)
+    assert profiler.request_started('/health') is None  # ruta excluida
+    token = profiler.request_started('/search')
+    TextProcessor().busy(0.1)
+    profiler.request_finished(token)
+    # Con las N peticiones atendidas la sesión termina sola y conserva los resultados
+    assert profiler.state == RequestProfiler.DONE and not profiler.active
+    assert profiler.request_started('/search') is None
+    report = profiler.report()
+    assert report['profile']['requests_profiled'] == report['profile']['requests_finished'] == 1
+    assert report['profile']['samples'] > 0
+    assert report['paths']['/search']['samples'] == report['profile']['samples']
+    assert report['top_self'][0]['function'].endswith('TextProcessor.busy')
+    assert report['components']['TextProcessor']['samples'] > 0
+    assert any(line.split(';')[-1].startswith(report['top_self'][0]['function'])
+               for line in profiler.collapsed().splitlines())
+
+def test_stop_ends_a_timed_session():
+    profiler = RequestProfiler()
+    profiler.start(seconds=60, paths=['/search'])
+    assert profiler.request_started('/suggest') is None  # fuera de los prefijos pedidos
+    token = profiler.request_started('/search/explain')
+    status = profiler.stop()
+    assert status['state'] == RequestProfiler.DONE and status['mode'] == 'seconds'
+    assert not profiler._thread.is_alive()
+    profiler.request_finished(token)
+    assert profiler.status()['requests_finished'] == 1
+
+def test_profile_endpoints(client, service, monkeypatch):
+    monkeypatch.setattr(service, 'ADMIN_TOKEN', 'secreto')
+    headers = {'X-Admin-Token': 'secreto'}
+    assert client.post('/admin/profile', json={'requests': 2}).status_code == 403
+    assert client.post('/admin/profile', json={'requests': 2, 'seconds': 1}, headers=headers).status_code == 400
+    started = client.post('/admin/profile', json={'requests': 2, 'interval_ms': 1}, headers=headers).json()
+    try:
+        assert started['status'] == 'started' and started['profile']['state'] == 'running'
+        assert client.post('/admin/profile', json={'requests': 1}, headers=headers).status_code == 409
+        for query in ('auriculares batería', 'cafetera'):
+            assert client.post('/search', json={'query': query}).status_code == 200
+        report = client.get('/admin/profile', headers=headers).json()
+        assert report['profile']['state'] == 'done'
+        assert report['profile']['requests_profiled'] == report['paths']['/search']['requests'] == 2
+        assert client.get('/admin/profile/collapsed', headers=headers).status_code == 200
+    finally:
+        stopped = client.delete('/admin/profile', headers=headers).json()
+    assert stopped['status'] == 'stopped' and stopped['profile']['requests_finished'] == 2
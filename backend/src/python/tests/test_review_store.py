@@ -0,0 +1,97 @@
+import threading
+import time
+
+from review_store import ReviewStore
+
+def test_put_get_delete_survive_reopen(tmp_path):
+    store = ReviewStore(tmp_path)
+    store.put({'id': 'a', 'resena': 'uno'})
+    store.put({'id': 'b', 'resena': 'dos'})
+    store.put({'id': 'a', 'resena': 'uno bis'})
+    assert store.delete('b')
+    assert not store.delete('b')
+    store.close()
+
+    reopened = ReviewStore(tmp_path)
+    assert reopened.get('a') == {'id': 'a', 'resena': 'uno bis'}
+    assert reopened.get('b') is None
+    assert reopened.ids() == ['a']
+    reopened.close()
+
+def test_torn_record_is_truncated_on_open(tmp_path):
+    store = ReviewStore(tmp_path)
+    store.put({'id': 'a', 'resena': 'uno'})
+    store.close()
+    segment = next(tmp_path.glob('segment_*.seg'))
+    size = segment.stat().st_size
+    with segment.open('ab') as f:
+        f.write(ReviewStore.MAGIC + b'\x01\x00')  # cabecera incompleta de una escritura interrumpida
+
+    reopened = ReviewStore(tmp_path)
+    assert segment.stat().st_size == size
+    reopened.put({'id': 'b', 'resena': 'dos'})
+    assert [review['id'] for review in reopened.scan()] == ['a', 'b']
+    reopened.close()
+
+def test_segments_roll_over_and_scan_in_order(tmp_path):
+    store = ReviewStore(tmp_path, max_segment_bytes=200)
+    store.put_many({'id': str(i), 'resena': 'x' * 50} for i in range(10))
+    assert store.stats()['segments'] > 1
+    assert [review['id'] for review in store.scan()] == [str(i) for i in range(10)]
+    store.close()
+
+def test_compact_drops_dead_records(tmp_path):
+    store = ReviewStore(tmp_path, max_segment_bytes=200)
+    for version in range(3):
+        store.put_many({'id': str(i), 'resena': f'v{version}'} for i in range(5))
+    store.delete('4')
+    store.put({'id': '0', 'resena': 'v2', 'snippets': ['<em>v2</em>']})
+    assert store.stats()['dead_bytes'] > 0
+
+    result = store.compact(transform=lambda review: {key: value for key, value in review.items() if key != 'snippets'})
+    assert result['bytes_after'] < result['bytes_before']
+    assert store.stats()['dead_bytes'] == 0
+    assert [review['resena'] for review in store.scan()] == ['v2'] * 4
+    assert store.get('0') == {'id': '0', 'resena': 'v2'}
+    store.close()
+
+    reopened = ReviewStore(tmp_path)
+    assert sorted(reopened.ids()) == ['0', '1', '2', '3']
+    reopened.close()
+
+def test_scan_survives_concurrent_compaction(tmp_path):
+    store = ReviewStore(tmp_path, max_segment_bytes=200)
+    store.put_many({'id': str(i), 'resena': 'x' * 50} for i in range(10))
+    scan = store.scan()
+    first = next(scan)
+    store.compact()
+    rest = list(scan)
+    # Las reseñas movidas por la compactación no se repiten en el recorrido en curso
+    assert first['id'] == '0'
+    assert len({review['id'] for review in rest}) == len(rest)
+    assert len(list(tmp_path.glob('segment_*.seg'))) == store.stats()['segments']
+    store.close()
+
+def test_get_is_not_broken_by_a_concurrent_compaction(tmp_path, monkeypatch):
+    store = ReviewStore(tmp_path, max_segment_bytes=200)
+    store.put_many({'id': str(i), 'resena': 'x' * 50} for i in range(10))
+    store.delete('9')
+    read_payload = store._read_payload
+    compactions = []
+
+    def read_after_compaction(segment, offset, length):
+        # Compactación desde otro hilo entre la búsqueda del offset y la lectura
+        if not compactions:
+            thread = threading.Thread(target=lambda: compactions.append(store.compact()))
+            thread.start()
+            thread.join(timeout=0.2)
+        return read_payload(segment, offset, length)
+
+    monkeypatch.setattr(store, '_read_payload', read_after_compaction)
+    assert store.get('0') == {'id': '0', 'resena': 'x' * 50}
+    monkeypatch.setattr(store, '_read_payload', read_payload)
+    deadline = time.monotonic() + 10
+    while not compactions and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert compactions and store.get('0') == {'id': '0', 'resena': 'x' * 50}
+    store.close()
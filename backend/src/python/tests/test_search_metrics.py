@@ -0,0 +1,45 @@
+def search(client, **request):
+    response = client.post('/search', json={'query': 'auriculares batería', **request})
+    assert response.status_code == 200
+    return response.json()
+
+def test_metrics_are_opt_in(client):
+    body = search(client)
+    assert body['results'] and body['metrics_id'] is None
+    assert body['metrics'] is None and body['score_statistics'] is None
+
+def test_metrics_job_is_computed_after_the_response(client, service):
+    body = search(client, include_metrics=True)
+    metrics_id = body['metrics_id']
+    assert metrics_id and body['metrics'] is None
+    job = client.get(f'/search/metrics/{metrics_id}').json()
+    assert job['status'] == 'done'
+    assert job['metrics']['overall'].keys() >= {'map', 'precision', 'recall', 'f1'}
+    assert job['score_statistics']['total_matches'] == len(body['results'])
+
+    boolean = search(client, query='auriculares AND batería', search_type='boolean', include_metrics=True)
+    job = client.get(f"/search/metrics/{boolean['metrics_id']}").json()
+    assert job['status'] == 'done' and job['metrics']['total_results'] == len(boolean['results'])
+    assert job['score_statistics'] is None
+
+def test_failed_job_reports_the_error(client, service, monkeypatch):
+    def broken_metrics(request, results):
+        raise RuntimeError('evaluador no disponible')
+
+    monkeypatch.setattr(service, 'compute_search_metrics', broken_metrics)
+    metrics_id = search(client, include_metrics=True)['metrics_id']
+    assert client.get(f'/search/metrics/{metrics_id}').json() == \
+           {'metrics_id': metrics_id, 'status': 'error', 'detail': 'evaluador no disponible'}
+
+def test_oldest_jobs_are_evicted(client, service, monkeypatch):
+    monkeypatch.setattr(service, 'MAX_METRICS_JOBS', 2)
+    ids = [search(client, include_metrics=True)['metrics_id'] for _ in range(3)]
+    assert client.get(f'/search/metrics/{ids[0]}').status_code == 404
+    assert [client.get(f'/search/metrics/{metrics_id}').json()['status'] for metrics_id in ids[1:]] == ['done', 'done']
+    assert len(service.metrics_jobs) == 2
+    # Un trabajo que termina después de ser desalojado no vuelve a aparecer
+    service.run_metrics_job(ids[0], service.SearchRequest(query='auriculares'), [])
+    assert ids[0] not in service.metrics_jobs
+
+def test_unknown_metrics_id(client):
+    assert client.get('/search/metrics/no-existe').status_code == 404
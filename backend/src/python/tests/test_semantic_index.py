@@ -0,0 +1,55 @@
+from conftest import REVIEWS
+from index_segments import IndexGeneration
+from semantic_index import SemanticIndex
+from text_processor import TextProcessor
+
+def test_first_query_falls_back_to_lexical_search(processor):
+    assert processor.semantic.model is None
+    assert processor.semantic_search('auriculares') == processor.tf_idf_search('auriculares')
+    # La consulta lanzó el ajuste en segundo plano
+    assert processor.semantic._thread is not None
+    processor.semantic.wait()
+    assert processor.semantic.stats()['fitted'] and processor.semantic.error is None
+    results = processor.semantic_search('auriculares')
+    assert results and set(results) <= {review['id'] for review in REVIEWS}
+
+def test_hybrid_search_without_a_model_is_lexical(processor):
+    ranking = list(processor.hybrid_search('cafetera'))
+    assert set(ranking) == set(processor.tf_idf_search('cafetera'))
+    processor.semantic.wait()
+
+def test_tiny_collection_does_not_fail():
+    processor = TextProcessor()
+    processor.index_document('a', 'Auriculares con buena batería', 'Audio', 4)
+    assert processor.semantic_search('auriculares') == processor.tf_idf_search('auriculares')
+    processor.semantic.wait()
+    assert processor.semantic.model is None and processor.semantic.error is None
+    # No se vuelve a intentar el ajuste mientras la colección no cambie
+    assert not processor.semantic.refresh(processor.generation)
+    assert processor.semantic.fit(IndexGeneration()) is None
+
+def test_refit_after_growth_keeps_serving_the_previous_model(processor):
+    semantic = processor.semantic
+    semantic.refresh(processor.generation)
+    semantic.wait()
+    model = semantic.model
+    assert not semantic.refresh(processor.generation)
+    for copy in range(2):
+        for review in REVIEWS:
+            processor.index_document(f"{review['id']}-{copy}", review['resena'], review['categoria'], 3)
+    assert semantic.refresh(processor.generation)
+    assert semantic.model is model or semantic.model.documents == processor.total_documents
+    semantic.wait()
+    assert semantic.model is not model and semantic.model.documents == processor.total_documents
+
+def test_fit_errors_are_reported(processor, monkeypatch):
+    semantic = SemanticIndex()
+
+    def broken_fit(generation):
+        raise RuntimeError('sin memoria')
+
+    monkeypatch.setattr(semantic, 'fit', broken_fit)
+    assert semantic.search(processor.generation, {'auricular': 1.0}) is None
+    semantic.wait()
+    assert semantic.error == 'sin memoria' and not semantic.stats()['fitting']
+    assert not semantic.refresh(processor.generation)
@@ -0,0 +1,69 @@
+import pytest
+
+from conftest import REVIEWS, review_copy
+from review_file_handler import ReviewFileHandler
+from service_lifecycle import ServiceLifecycle
+
+@pytest.fixture
+def broken_lifecycle(tmp_path, monkeypatch):
+    """Ciclo de vida cuya carga del índice ha fallado"""
+    handler = ReviewFileHandler(data_dir=tmp_path, recover_index=False)
+
+    def broken_load():
+        raise OSError('checkpoint ilegible')
+
+    monkeypatch.setattr(handler, 'load_index', broken_load)
+    lifecycle = ServiceLifecycle(handler)
+    lifecycle.start()
+    yield lifecycle
+    handler.wal.close()
+    handler.store.close()
+
+def test_index_is_loaded_and_warmed_in_the_background(tmp_path):
+    handler = ReviewFileHandler(data_dir=tmp_path)
+    for review in REVIEWS:
+        handler.save_review(review_copy(review), duplicates='allow')
+    handler.checkpoint()
+    handler.wal.close()
+    handler.store.close()
+
+    handler = ReviewFileHandler(data_dir=tmp_path, recover_index=False)
+    assert handler.text_processor.total_documents == 0
+    queries = [('auriculares', 'tf_idf'), ('auriculares AND batería', 'boolean')]
+    lifecycle = ServiceLifecycle(handler, warm_queries=lambda: queries)
+    assert lifecycle.state == ServiceLifecycle.STARTING and not lifecycle.ready
+    lifecycle.start()
+    assert lifecycle.wait_ready(30)
+    status = lifecycle.status()
+    assert status['state'] == ServiceLifecycle.READY and status['documents'] == len(REVIEWS)
+    assert status['warmed_queries'] == 2
+    assert {'checkpoint_load', 'warm_up', 'ready'} <= lifecycle.timings.keys()
+    handler.wal.close()
+    handler.store.close()
+
+def test_failed_load_is_reported(broken_lifecycle):
+    assert not broken_lifecycle.wait_ready(30)
+    assert broken_lifecycle.state == ServiceLifecycle.FAILED and broken_lifecycle.error == 'checkpoint ilegible'
+    assert broken_lifecycle.status()['documents'] is None
+
+def test_health_endpoints_when_ready(client):
+    assert client.get('/health/live').json() == {'status': 'alive', 'state': 'ready'}
+    ready = client.get('/health/ready')
+    assert ready.status_code == 200 and ready.json()['lifecycle']['documents'] >= len(REVIEWS)
+
+def test_requests_wait_for_the_index(client, service, monkeypatch):
+    monkeypatch.setattr(service, 'lifecycle', ServiceLifecycle(service.review_handler))
+    assert client.get('/health/live').json() == {'status': 'alive', 'state': 'starting'}
+    assert client.get('/health/ready').status_code == 503
+    assert client.get('/index/startup').status_code == 200
+    response = client.post('/search', json={'query': 'auriculares'})
+    assert response.status_code == 503 and response.headers['Retry-After'] == '1'
+
+def test_failed_load_is_not_live(client, service, broken_lifecycle, monkeypatch):
+    broken_lifecycle.wait_ready(30)
+    monkeypatch.setattr(service, 'lifecycle', broken_lifecycle)
+    live = client.get('/health/live')
+    assert live.status_code == 503
+    assert live.json() == {'status': 'failed', 'state': 'failed', 'error': 'checkpoint ilegible'}
+    assert client.get('/health/ready').status_code == 503
+    assert client.post('/search', json={'query': 'auriculares'}).status_code == 503
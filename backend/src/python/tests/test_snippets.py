@@ -0,0 +1,45 @@
+from conftest import REVIEWS
+from review_file_handler import ReviewFileHandler
+
+def indexed_text(doc_id: str) -> str:
+    return ReviewFileHandler.index_text(next(review for review in REVIEWS if review['id'] == doc_id))
+
+def test_matches_are_highlighted_by_stem_and_synonym(processor):
+    terms = processor.highlight_terms('batería auricular')
+    fragments = processor.snippets('r1', indexed_text('r1'), terms)
+    assert fragments == ['<em>Auriculares</em> Sony. Los <em>auriculares</em> tienen una <em>batería</em> '
+                         'excelente y un sonido muy claro']
+    # Sin sinónimos solo se resalta lo que genera la propia consulta
+    assert processor.snippets('r2', indexed_text('r2'), processor.highlight_terms('cascos', use_synonyms=False),
+                              use_synonyms=False) == []
+    assert '<em>auriculares</em>' in processor.snippets('r2', indexed_text('r2'),
+                                                        processor.highlight_terms('cascos', use_synonyms=True),
+                                                        use_synonyms=True)[0]
+
+def test_negated_words_are_not_highlighted(processor):
+    terms = processor.highlight_terms('auriculares AND NOT batería')
+    fragment = processor.snippets('r1', indexed_text('r1'), terms)[0]
+    assert '<em>batería</em>' not in fragment and '<em>auriculares</em>' in fragment
+
+def test_fragments_are_bounded_and_token_aligned(processor):
+    text = ' '.join(['relleno'] * 60 + ['cafetera'] + ['relleno'] * 60 + ['cafetera', 'rica'] + ['relleno'] * 60)
+    processor.index_document('largo', text, 'Hogar', 4)
+    processor.snippet_size = 40
+    fragments = processor.snippets('largo', text, processor.highlight_terms('cafetera'))
+    assert len(fragments) == processor.snippet_fragments
+    for fragment in fragments:
+        assert '<em>cafetera</em>' in fragment
+        plain = fragment.replace('<em>', '').replace('</em>', '')
+        assert plain in text and plain.split()[0] == 'relleno' and plain.split()[-1] in ('relleno', 'rica')
+        assert len(plain) <= processor.snippet_size + len('relleno') * 2
+
+def test_text_is_html_escaped(processor):
+    text = 'Cafetera <b>genial</b> & "barata": <script>alert(1)</script> muy recomendable'
+    processor.index_document('html', text, 'Hogar', 4)
+    fragment = processor.snippets('html', text, processor.highlight_terms('cafetera genial'))[0]
+    assert fragment == ('<em>Cafetera</em> &lt;b&gt;<em>genial</em>&lt;/b&gt; &amp; &quot;barata&quot;: '
+                        '&lt;script&gt;alert(1)&lt;/script&gt; muy recomendable')
+
+def test_stale_text_gives_no_snippets(processor):
+    assert processor.snippets('r1', 'texto más corto', processor.highlight_terms('auriculares')) == []
+    assert processor.snippets('no-existe', 'texto', processor.highlight_terms('texto')) == []
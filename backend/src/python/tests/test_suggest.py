@@ -0,0 +1,30 @@
+import time
+
+from term_dictionary import TermDictionary
+
+def test_term_dictionary_completes_by_score():
+    entries = [(f"term{i:03d}", {'term': f"term{i:03d}", 'score': i % 7}) for i in range(200)]
+    entries += [('termino', {'term': 'termino', 'score': 100}), ('otro', {'term': 'otro', 'score': 50})]
+    dictionary = TermDictionary(entries, top_k=5, heavy_threshold=16)
+    assert dictionary.stats()['precomputed_prefixes'] > 0
+    for prefix, limit in (('term', 5), ('term0', 3), ('term1', 10), ('o', 5), ('x', 5)):
+        expected = sorted((suggestion for key, suggestion in entries if key.startswith(prefix)),
+                          key=lambda suggestion: (-suggestion['score'], suggestion['term']))[:limit]
+        assert dictionary.complete(prefix, limit) == expected
+    assert dictionary.complete('term', 0) == []
+
+def test_suggest_completes_the_last_word(processor):
+    suggestions = processor.suggest('buena cafe')
+    assert suggestions and all(suggestion['text'].startswith('buena cafe') for suggestion in suggestions)
+    assert processor.suggest('auri')[0]['term'].startswith('auricular')
+    assert processor.suggest('auriculares ') == []
+
+def test_suggest_refreshes_in_the_background(processor):
+    assert processor.suggest('tost') == []
+    processor.index_document('r11', 'Tostadora que tuesta bien el pan', 'Hogar', 4)
+    # La generación nueva sigue sirviendo el diccionario anterior mientras se reconstruye
+    assert processor.suggest('tost') == []
+    deadline = time.monotonic() + 10
+    while not processor.suggest('tost') and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [suggestion['term'] for suggestion in processor.suggest('tost')] == ['tostadora']
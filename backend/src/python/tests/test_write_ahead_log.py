@@ -0,0 +1,94 @@
+import pytest
+
+from conftest import REVIEWS, review_copy
+from review_file_handler import ReviewFileHandler
+from write_ahead_log import WriteAheadLog
+
+def test_replay_after_reopen_continues_lsn(tmp_path):
+    wal = WriteAheadLog(tmp_path)
+    assert wal.append(WriteAheadLog.OP_PUT, 'a', {'id': 'a'}) == 1
+    assert wal.append_many([(WriteAheadLog.OP_PUT, 'b', {'id': 'b'}), (WriteAheadLog.OP_DELETE, 'a', None)]) == 3
+    wal.close()
+
+    reopened = WriteAheadLog(tmp_path)
+    assert [(lsn, mutation['op'], mutation['id']) for lsn, mutation in reopened.replay()] == \
+           [(1, 'put', 'a'), (2, 'put', 'b'), (3, 'delete', 'a')]
+    assert reopened.append(WriteAheadLog.OP_DELETE, 'b') == 4
+    reopened.close()
+
+def test_torn_tail_is_discarded(tmp_path):
+    wal = WriteAheadLog(tmp_path)
+    wal.append(WriteAheadLog.OP_PUT, 'a', {'id': 'a'})
+    wal.close()
+    with (tmp_path / 'wal.log').open('ab') as f:
+        f.write(WriteAheadLog.HEADER.pack(WriteAheadLog.MAGIC, 2, 100, 0) + b'{"op":')
+
+    reopened = WriteAheadLog(tmp_path)
+    assert reopened.last_lsn == 1
+    assert reopened.append(WriteAheadLog.OP_PUT, 'b', {'id': 'b'}) == 2
+    assert [mutation['id'] for _, mutation in reopened.replay()] == ['a', 'b']
+    reopened.close()
+
+def test_checkpoint_empties_log_and_keeps_newer_mutations(tmp_path):
+    wal = WriteAheadLog(tmp_path)
+    wal.append(WriteAheadLog.OP_PUT, 'a', {'id': 'a'})
+    wal.save_checkpoint({'documents': ['a']}, wal.last_lsn)
+    wal.append(WriteAheadLog.OP_PUT, 'b', {'id': 'b'})
+    wal.close()
+
+    reopened = WriteAheadLog(tmp_path)
+    assert reopened.load_checkpoint() == {'documents': ['a']}
+    assert reopened.checkpoint_lsn == 1
+    assert [(lsn, mutation['id']) for lsn, mutation in reopened.replay()] == [(2, 'b')]
+    reopened.close()
+
+def test_damaged_checkpoint_is_ignored(tmp_path):
+    wal = WriteAheadLog(tmp_path)
+    wal.append(WriteAheadLog.OP_PUT, 'a', {'id': 'a'})
+    wal.save_checkpoint({'documents': ['a']}, wal.last_lsn)
+    wal.close()
+    next(tmp_path.glob('index_*.ckpt')).write_bytes(b'no es un pickle')
+
+    reopened = WriteAheadLog(tmp_path)
+    assert reopened.load_checkpoint() is None
+    assert reopened.checkpoint_lsn == 0
+    reopened.close()
+
+def test_handler_recovers_checkpoint_and_wal_tail(handler, tmp_path):
+    # Mutaciones posteriores al checkpoint del arranque: solo están en el WAL
+    handler.save_review(review_copy(REVIEWS[0], resena='Los auriculares se rompieron enseguida'), duplicates='allow')
+    handler.delete_review('r4')
+    handler.save_review({'id': 'r11', 'producto': 'Tostadora Taurus', 'categoria': 'Hogar', 'puntuacion': 4,
+                         'resena': 'La tostadora tuesta el pan de forma uniforme'}, duplicates='allow')
+    expected = handler.text_processor.tf_idf_search('auriculares tostadora cafetera')
+    # Sin checkpoint al parar (caída del proceso)
+    handler.wal.close()
+    handler.store.close()
+
+    recovered = ReviewFileHandler(data_dir=tmp_path)
+    try:
+        assert recovered.wal.checkpoint_lsn < recovered.wal.last_lsn
+        assert recovered.text_processor.total_documents == len(REVIEWS)
+        assert recovered.text_processor.generation.locate('r4') is None
+        assert recovered.load_review('r1')['resena'] == 'Los auriculares se rompieron enseguida'
+        assert recovered.text_processor.tf_idf_search('auriculares tostadora cafetera') == expected
+    finally:
+        recovered.wal.close()
+        recovered.store.close()
+
+@pytest.mark.parametrize('method, path', [('post', '/index/checkpoint'), ('get', '/index/wal'), ('get', '/store/stats')])
+def test_endpoints_require_the_admin_token(client, service, monkeypatch, method, path):
+    monkeypatch.setattr(service, 'ADMIN_TOKEN', None)
+    assert client.request(method, path).status_code == 503
+    monkeypatch.setattr(service, 'ADMIN_TOKEN', 'secreto')
+    assert client.request(method, path).status_code == 403
+    assert client.request(method, path, headers={'X-Admin-Token': 'otro'}).status_code == 403
+    assert client.request(method, path, headers={'X-Admin-Token': 'secreto'}).status_code == 200
+
+def test_checkpoint_endpoint_empties_the_log(client, service, monkeypatch):
+    monkeypatch.setattr(service, 'ADMIN_TOKEN', 'secreto')
+    service.review_handler.save_review({'id': 'wal-1', 'producto': 'Tostadora', 'categoria': 'Hogar',
+                                        'puntuacion': 4, 'resena': 'Tuesta bien el pan'}, duplicates='allow')
+    assert service.review_handler.wal.records_since_checkpoint > 0
+    wal = client.post('/index/checkpoint', headers={'X-Admin-Token': 'secreto'}).json()['wal']
+    assert wal['records_since_checkpoint'] == 0 and wal['checkpoint_lsn'] == wal['last_lsn']
@@ -1,23 +1,93 @@
-import nltk
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import SnowballStemmer
-from typing import List, Dict, Set
+from typing import List, Dict, Set, FrozenSet, Optional, Tuple, Callable, Iterable
 import math
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
 import re
 import json
+import hashlib
+import html
+import threading
 from pathlib import Path
+from index_segments import (BASE, SYNONYMS, IndexSegment, SegmentBuilder, IndexGeneration,
+                            PostingsView, DocumentLengthsView)
+from bm25 import BM25Scorer
+from term_dictionary import TermDictionary
+from fuzzy_index import DeletionIndex
+from semantic_index import SemanticIndex
+from near_duplicates import NearDuplicateDetector
+from impact_postings import ImpactIndex
 
 class TextProcessor:
+    # Versión del formato de la generación guardada en los checkpoints
+    INDEX_FORMAT = 7
+    # Caracteres especiales españoles y su forma normalizada
+    SPANISH_CHARACTERS = str.maketrans({
+        'á': 'a', 'é': 'e', 'í': 'i', 'ó': 'o', 'ú': 'u',
+        'ü': 'u', 'ñ': 'n', 'à': 'a', 'è': 'e', 'ì': 'i',
+        'ò': 'o', 'ù': 'u'
+    })
+    # Tokens tal como los genera _tokenize (rachas de letras tras normalizar)
+    TOKEN_PATTERN = re.compile(r'[a-z]+')
+
     def __init__(self):
-        self.stemmer = SnowballStemmer('spanish')
-        self.stop_words = set(stopwords.words('spanish'))
-        self.inverted_index = defaultdict(dict)  # term -> {doc_id -> positions}
-        self.document_lengths = {}  # doc_id -> length
-        self.total_documents = 0
+        self._stemmer = None  # Snowball, se crea en el primer stem (importar NLTK cuesta más de un segundo)
+        self._stem_cache: Dict[str, str] = {}  # palabra -> stem (el vocabulario se repite mucho)
+        self._stem_cache_size = 500000
+        self._token_terms_cache: Dict[str, Tuple[frozenset, frozenset, frozenset]] = {}  # token -> términos que indexa
+        self.stop_words = self._load_stop_words()
+        # Índice por generaciones: segmentos inmutables que los lectores fijan por consulta
+        # y que los escritores amplían publicando segmentos delta (ver index_segments.py)
+        self.generation = IndexGeneration()
+        self._write_lock = threading.Lock()
+        self._compact_lock = threading.Lock()  # una sola compactación a la vez
+        self._compacting: FrozenSet[int] = frozenset()  # ids de los segmentos que se están compactando
+        self.max_segments = 16  # Límite de segmentos por generación
+        self.merge_factor = 4  # Se fusiona un segmento con el siguiente si no es merge_factor veces mayor
+        self.bm25 = BM25Scorer()  # Parámetros por defecto de BM25 (cada consulta puede cambiarlos)
+        # Estructuras derivadas del vocabulario (autocompletado, corrección): nombre -> (generación, estructura)
+        self._derived: Dict[str, Tuple[int, object]] = {}
+        self._derived_lock = threading.RLock()  # reentrante: unas estructuras se construyen a partir de otras
+        self._refresh_lock = threading.Lock()  # protege _derived, _refreshing y _derived_epoch
+        self._refreshing: Set[str] = set()  # estructuras que se están reconstruyendo en segundo plano
+        self._derived_epoch = 0  # cambia al cargar un checkpoint (descarta reconstrucciones en curso)
+        self.suggest_top_k = 20  # Completaciones precalculadas por prefijo frecuente
+        self.fuzzy_max_distance = 2  # Distancia de edición máxima al corregir términos
+        # "Más como este": stems guardados por documento, términos de la consulta y df máximo (fracción de N)
+        self.vector_terms = 64
+        self.similar_query_terms = 25
+        self.similar_max_df_ratio = 0.5
+        # Búsqueda semántica (LSA) y fusión híbrida con tf_idf
+        self.semantic = SemanticIndex()
+        self.semantic_top_k = 100  # Vecinos devueltos por la búsqueda semántica
+        self.rrf_k = 60  # Constante de Reciprocal Rank Fusion
+        self.duplicates = NearDuplicateDetector()  # Firmas MinHash + LSH de casi duplicados
+        # Postings de tf_idf ordenadas por impacto (normalización por longitud, longitud^-1.5)
+        # y, para el ranking de /search, con el factor de la puntuación de la reseña
+        self.impacts = ImpactIndex(lambda segment, doc_id: segment.lengths[doc_id] ** -1.5)
+        self.rated_impacts = ImpactIndex(lambda segment, doc_id: segment.lengths[doc_id] ** -1.5 *
+                                         self.rating_factor(segment.rating(doc_id)))
+        self.default_rating = 3.0  # Puntuación de las reseñas que no la tienen
+        # Fragmentos resaltados: caracteres por fragmento, fragmentos y coincidencias máximas por resultado
+        self.snippet_size = 160
+        self.snippet_fragments = 2
+        self.snippet_max_matches = 64
+        self.highlight_tags = ('<em>', '</em>')
+        # Enrutado por categoría: un término va ligado a una categoría si aparece en al menos
+        # route_min_documents documentos y route_min_share de ellos son de esa categoría
+        self.route_min_share = 0.9
+        self.route_min_documents = 3
         self.sinonimos = self._load_sinonimos()
-        self.use_synonyms = True  # Flag to control synonym expansion
+        # Huella del diccionario de sinónimos y la del diccionario con el que se analizaron
+        # los documentos del índice (None si no se sabe: checkpoint sin huella)
+        self.synonyms_fingerprint = self._fingerprint(self.sinonimos)
+        self.index_synonyms: Optional[str] = self.synonyms_fingerprint
+        self.use_synonyms = True  # Valor por defecto cuando la consulta no indica el modo
+        
+        # Tablas de búsqueda de sinónimos: forma -> [(concepto, sinónimos)]
+        self._synonyms_by_normalized = self._build_synonym_lookup(self.normalize_text)
+        self._synonyms_by_lower = self._build_synonym_lookup(str.lower)
         
         # Configuración de pesos para términos
         self.term_importance = {
@@ -141,6 +211,48 @@ class TextProcessor:
             'no satisfecho': 0.2
         }
         
+    @staticmethod
+    def _load_stop_words() -> Set[str]:
+        """
+        Stopwords en español: la lista incluida en data/stopwords/spanish (la de NLTK) o,
+        si no está, el corpus de NLTK, de modo que el arranque no necesita la red
+        """
+        stopwords_path = Path(__file__).parent / "data" / "stopwords" / "spanish"
+        try:
+            with open(stopwords_path, 'r', encoding='utf-8') as f:
+                return {line.strip() for line in f if line.strip()}
+        except FileNotFoundError:
+            print("Archivo stopwords/spanish no encontrado, usando el corpus de NLTK")
+            import nltk
+            from nltk.corpus import stopwords
+            nltk.data.path.append(str(Path(__file__).parent / 'nltk_data'))
+            return set(stopwords.words('spanish'))
+
+    @property
+    def stemmer(self):
+        """Stemmer Snowball en español (se importa y crea la primera vez que se usa)"""
+        if self._stemmer is None:
+            from nltk.stem.snowball import SpanishStemmer
+            self._stemmer = SpanishStemmer()
+        return self._stemmer
+
+    def warm_up(self):
+        """Crea el stemmer por adelantado (p. ej. en segundo plano tras arrancar el servicio)"""
+        self.stemmer
+
+    @staticmethod
+    def _fingerprint(sinonimos: Dict[str, List[str]]) -> str:
+        return hashlib.sha1(json.dumps(sinonimos, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def synonyms_stale(self) -> Optional[bool]:
+        """
+        True si el índice tiene documentos analizados con otro diccionario de sinónimos
+        (su capa de sinónimos no es la que genera el actual), None si no se sabe
+        """
+        if self.index_synonyms is None:
+            return None
+        return self.index_synonyms != self.synonyms_fingerprint
+
     def _load_sinonimos(self) -> Dict[str, List[str]]:
         """Carga el diccionario de sinónimos desde el archivo JSON"""
         try:
@@ -157,24 +269,76 @@ class TextProcessor:
             print("Archivo sinonimos.json no encontrado, usando diccionario vacío")
             return {}
 
+    def _build_synonym_lookup(self, key_func: Callable[[str], str]) -> Dict[str, List[Tuple[str, List[str]]]]:
+        """Indexa los conceptos del diccionario por cada una de sus formas (concepto y sinónimos)"""
+        lookup = defaultdict(list)
+        for concepto, sinonimos_list in self.sinonimos.items():
+            for form in [concepto] + list(sinonimos_list):
+                entries = lookup[key_func(form)]
+                if not entries or entries[-1][0] != concepto:
+                    entries.append((concepto, sinonimos_list))
+        return dict(lookup)
+
+    @property
+    def inverted_index(self) -> PostingsView:
+        """term -> {doc_id -> positions} (capa base, sin sinónimos) de la generación actual"""
+        return PostingsView(self.generation, BASE)
+
+    @property
+    def synonym_index(self) -> PostingsView:
+        """term -> {doc_id -> positions} (capa de expansión por sinónimos) de la generación actual"""
+        return PostingsView(self.generation, SYNONYMS)
+
+    @property
+    def document_lengths(self) -> DocumentLengthsView:
+        """doc_id -> length de la generación actual"""
+        return DocumentLengthsView(self.generation)
+
+    @property
+    def total_documents(self) -> int:
+        return self.generation.total_documents
+
+    def stem(self, word: str) -> str:
+        """Stem de una palabra con caché (el stemmer Snowball es el paso más costoso del análisis)"""
+        stem = self._stem_cache.get(word)
+        if stem is None:
+            stem = self.stemmer.stem(word)
+            if len(self._stem_cache) >= self._stem_cache_size:
+                self._stem_cache.clear()
+            self._stem_cache[word] = stem
+        return stem
+
+    def _resolve_synonyms(self, use_synonyms: Optional[bool]) -> bool:
+        """Devuelve el modo de sinónimos de la consulta o el valor por defecto"""
+        return self.use_synonyms if use_synonyms is None else use_synonyms
+
+    def get_postings(self, term: str, use_synonyms: Optional[bool] = None,
+                     generation: Optional[IndexGeneration] = None) -> Dict[str, List[int]]:
+        """
+        Devuelve las postings de un término combinando la capa base y, si se pide,
+        la capa de expansión por sinónimos. No modifica el índice.
+        generation permite leer de una generación fijada al inicio de la consulta.
+        """
+        generation = generation or self.generation
+        base = generation.postings(term, BASE)
+        if not self._resolve_synonyms(use_synonyms):
+            return base or {}
+        expansion = generation.postings(term, SYNONYMS)
+        if not expansion:
+            return base or {}
+        if not base:
+            return expansion
+        merged = dict(expansion)
+        merged.update(base)
+        return merged
+
     def normalize_text(self, text: str) -> str:
         """Normaliza el texto aplicando reglas específicas para español"""
-        # Convertir a minúsculas
-        text = text.lower()
-        
-        # Normalizar caracteres especiales españoles
-        replacements = {
-            'á': 'a', 'é': 'e', 'í': 'i', 'ó': 'o', 'ú': 'u',
-            'ü': 'u', 'ñ': 'n', 'à': 'a', 'è': 'e', 'ì': 'i',
-            'ò': 'o', 'ù': 'u'
-        }
-        for old, new in replacements.items():
-            text = text.replace(old, new)
-            
-        return text
+        # Convertir a minúsculas y normalizar caracteres especiales españoles (una sola pasada)
+        return text.lower().translate(self.SPANISH_CHARACTERS)
 
-    def tokenize(self, text: str) -> List[str]:
-        """Tokeniza el texto usando una aproximación robusta para español"""
+    def _tokenize(self, text: str) -> List[str]:
+        """Tokeniza el texto sin trazas (usado también por la ingesta masiva)"""
         # Normalizar texto
         text = self.normalize_text(text)
         
@@ -190,55 +354,189 @@ class TextProcessor:
             token = token.strip()
             if token and len(token) > 1:  # Ignorar tokens de un solo carácter
                 tokens.append(token)
-        
+        return tokens
+
+    def tokenize(self, text: str) -> List[str]:
+        """Tokeniza el texto usando una aproximación robusta para español"""
+        tokens = self._tokenize(text)
         print(f"Tokens generados: {tokens[:10]}...")
         return tokens
-        
-    def process_text(self, text: str, doc_id: str = None) -> Dict:
-        """Procesa el texto y actualiza el índice invertido si se proporciona doc_id"""
-        print(f"\nProcesando texto para doc_id: {doc_id}")
-        print(f"Texto original: {text}")
-        
-        # Tokenización y normalización inicial
-        tokens = self.tokenize(text)
-        print(f"Tokens totales ({len(tokens)}): {tokens}")
-        
-        # Filtrado de stopwords y normalización
-        tokens = [self.normalize_text(token) for token in tokens if token not in self.stop_words and token != 'NUM']
-        print(f"Tokens después de eliminar stopwords ({len(tokens)}): {tokens}")
-        
-        # Expandir con sinónimos y aplicar stemming
+
+    def _token_offsets(self, text: str) -> array:
+        """
+        Posiciones de carácter [inicio, fin) en text de los tokens que quedan tras
+        _filter_tokens, en el mismo orden que las posiciones de las postings
+        """
+        normalized = self.normalize_text(text)
+        if len(normalized) != len(text):
+            # Algún carácter cambia de longitud al pasarlo a minúsculas: normalizar uno a uno
+            normalized = ''.join(self.normalize_text(char)[:1] or ' ' for char in text)
+        offsets = array('I')
+        for match in self.TOKEN_PATTERN.finditer(normalized):
+            token = match.group()
+            if len(token) > 1 and token not in self.stop_words:
+                offsets.extend(match.span())
+        return offsets
+
+    def _filter_tokens(self, tokens: List[str]) -> List[str]:
+        """Elimina stopwords y el token numérico"""
+        return [self.normalize_text(token) for token in tokens if token not in self.stop_words and token != 'NUM']
+
+    def _expand_tokens(self, tokens: List[str], expand: bool) -> List[str]:
+        """Intercala tras cada token sus sinónimos y concepto principal si expand es True"""
         expanded_tokens = []
-        stemmed_tokens = []
-        stem_map = {}
-        
-        # Procesar cada token
         for token in tokens:
             # Añadir el token original
             expanded_tokens.append(token)
             
-            # Buscar sinónimos solo si use_synonyms es True
-            if self.use_synonyms:
+            # Buscar sinónimos solo si la expansión está activa
+            if expand:
                 # Buscar sinónimos (usando token normalizado)
                 normalized_token = self.normalize_text(token)
-                for concepto, sinonimos_list in self.sinonimos.items():
-                    # Normalizar concepto y sinónimos para comparación
-                    normalized_concepto = self.normalize_text(concepto)
-                    normalized_sinonimos = [self.normalize_text(s) for s in sinonimos_list]
-                    
-                    if normalized_token in normalized_sinonimos or normalized_token == normalized_concepto:
-                        # Añadir sinónimos y concepto principal
-                        expanded_tokens.extend([s for s in sinonimos_list if self.normalize_text(s) != normalized_token])
-                        if normalized_concepto != normalized_token:
-                            expanded_tokens.append(concepto)
-        
-        # Aplicar stemming a tokens expandidos
-        for token in expanded_tokens:
-            stem = self.stemmer.stem(token)
+                for concepto, sinonimos_list in self._synonyms_by_normalized.get(normalized_token, []):
+                    # Añadir sinónimos y concepto principal
+                    expanded_tokens.extend([s for s in sinonimos_list if self.normalize_text(s) != normalized_token])
+                    if self.normalize_text(concepto) != normalized_token:
+                        expanded_tokens.append(concepto)
+        return expanded_tokens
+
+    def _stem_tokens(self, tokens: List[str]) -> Tuple[List[str], Dict[str, Set[str]]]:
+        """Aplica stemming y devuelve los stems y el mapeo stem -> palabras originales"""
+        stemmed_tokens = []
+        stem_map = {}
+        for token in tokens:
+            stem = self.stem(token)
             stemmed_tokens.append(stem)
             if stem not in stem_map:
                 stem_map[stem] = set()
             stem_map[stem].add(token)
+        return stemmed_tokens, stem_map
+
+    def analyze_document(self, text: str) -> Dict:
+        """
+        Analiza un documento para indexarlo sin modificar el índice ni imprimir trazas.
+        Solo calcula lo que necesita el índice (no las listas expandidas ni el tf_vector
+        de process_text). El resultado es serializable, de modo que puede calcularse
+        en otro proceso y aplicarse después con index_analysis.
+        """
+        raw_tokens = self._tokenize(text)
+        tokens = self._filter_tokens(raw_tokens)
+        term_positions, base_terms, term_count = self._index_postings(tokens)
+        return {
+            "token_count": len(tokens),
+            "term_count": term_count,
+            "term_positions": term_positions,
+            "base_terms": base_terms,
+            "vector": self._document_vector(tokens),
+            "signature": self.duplicates.hasher.signature(raw_tokens),
+            "offsets": self._token_offsets(text)
+        }
+
+    def _document_vector(self, tokens: List[str]) -> Dict[str, float]:
+        """
+        Vector de términos del documento para "más como este": stem -> frecuencia por
+        peso de consulta (term_importance y penalty_terms), limitado a los vector_terms
+        stems de más peso. El IDF se aplica al consultar, con la colección del momento.
+        """
+        stemmed_tokens, stem_map = self._stem_tokens(tokens)
+        counts = defaultdict(int)
+        for stem in stemmed_tokens:
+            counts[stem] += 1
+        vector = {stem: count * self._query_term_weight(stem, stem_map[stem]) for stem, count in counts.items()}
+        if len(vector) > self.vector_terms:
+            top = heapq.nlargest(self.vector_terms, vector.items(), key=lambda item: (item[1], item[0]))
+            vector = dict(top)
+        return vector
+
+    def _token_terms(self, token: str) -> Tuple[frozenset, frozenset, frozenset]:
+        """
+        Términos que indexa un token (con caché): todos los de su expansión, la parte
+        que pertenece a la capa base y los tokens expandidos con sus stems. La unión
+        sobre los tokens de un documento es exactamente el conjunto de términos que se
+        indexaban por documento (y la del tercero, set(expanded + stemmed) de process_text).
+        """
+        cached = self._token_terms_cache.get(token)
+        if cached is None:
+            expanded = self._expand_tokens([token], True)
+            all_terms = list(set(expanded + [self.stem(term) for term in expanded]))
+            cached = (frozenset(self._collect_index_terms(all_terms, expand=True)),
+                      frozenset(self._collect_index_terms([token, self.stem(token)], expand=False)),
+                      frozenset(all_terms))
+            if len(self._token_terms_cache) >= self._stem_cache_size:
+                self._token_terms_cache.clear()
+            self._token_terms_cache[token] = cached
+        return cached
+
+    def _index_postings(self, tokens: List[str]) -> Tuple[Dict[str, List[int]], Set[str], int]:
+        """
+        Postings de un documento: término -> posiciones de los tokens que lo generan
+        (por sí mismos, por su stem o por sinónimos), conjunto de términos de la capa base
+        y número de términos distintos de la expansión con stems (el que suma a la longitud)
+        """
+        term_positions = defaultdict(list)
+        base_terms = set()
+        expansion = set()
+        for position, token in enumerate(tokens):
+            all_terms, token_base, token_expansion = self._token_terms(token)
+            for term in all_terms:
+                term_positions[term].append(position)
+            base_terms |= token_base
+            expansion |= token_expansion
+        return dict(term_positions), base_terms, len(expansion)
+
+    def index_analysis(self, doc_id: str, analysis: Dict, category: Optional[str] = None,
+                       rating: Optional[float] = None):
+        """Aplica al índice un análisis de analyze_document (sin trazas)"""
+        self.index_analyses([(doc_id, analysis)], {doc_id: category}, {doc_id: rating})
+
+    def index_document(self, doc_id: str, text: str, category: Optional[str] = None, rating: Optional[float] = None):
+        """Indexa (o reemplaza) un documento por la ruta de solo índice, sin el análisis de process_text"""
+        self.index_analysis(doc_id, self.analyze_document(text), category, rating)
+
+    def index_analyses(self, analyses: List[Tuple[str, Dict]], categories: Optional[Dict[str, str]] = None,
+                       ratings: Optional[Dict[str, Optional[float]]] = None):
+        """
+        Aplica un lote de análisis al índice publicando un único segmento delta
+        Args:
+            categories: doc_id -> categoría (partición del índice) de los documentos del lote
+            ratings: doc_id -> puntuación de los documentos del lote (columna del segmento)
+        """
+        categories = categories or {}
+        ratings = ratings or {}
+        builder = SegmentBuilder()
+        for doc_id, analysis in analyses:
+            # Misma longitud que process_text: tokens originales más términos indexados
+            builder.add(doc_id, analysis["token_count"] + analysis["term_count"],
+                        analysis["term_positions"], analysis["base_terms"], analysis["token_count"],
+                        analysis["vector"], analysis["signature"], analysis["offsets"], categories.get(doc_id),
+                        ratings.get(doc_id))
+        self._publish(builder.build())
+
+    def process_text(self, text: str, doc_id: str = None, use_synonyms: Optional[bool] = None,
+                     generation: Optional[IndexGeneration] = None) -> Dict:
+        """
+        Procesa el texto y actualiza el índice invertido si se proporciona doc_id.
+        Al indexar siempre se construyen ambas capas (base y sinónimos); use_synonyms
+        solo controla la expansión del texto cuando se procesa una consulta.
+        generation fija la generación usada para la longitud media en una consulta.
+        """
+        expand = True if doc_id else self._resolve_synonyms(use_synonyms)
+        print(f"\nProcesando texto para doc_id: {doc_id}")
+        print(f"Texto original: {text}")
+        
+        # Tokenización y normalización inicial
+        tokens = self.tokenize(text)
+        print(f"Tokens totales ({len(tokens)}): {tokens}")
+        # Firma MinHash del texto completo (con stopwords) para detectar casi duplicados
+        signature = self.duplicates.hasher.signature(tokens) if doc_id else None
+        
+        # Filtrado de stopwords y normalización
+        tokens = self._filter_tokens(tokens)
+        print(f"Tokens después de eliminar stopwords ({len(tokens)}): {tokens}")
+        
+        # Expandir con sinónimos y aplicar stemming a tokens expandidos
+        expanded_tokens = self._expand_tokens(tokens, expand)
+        stemmed_tokens, stem_map = self._stem_tokens(expanded_tokens)
         
         print(f"Términos después de stemming y expansión ({len(stemmed_tokens)}): {stemmed_tokens}")
         print("Mapeo de stems a palabras originales:")
@@ -246,16 +544,17 @@ class TextProcessor:
             print(f"  {stem}: {originals}")
         
         # Si tenemos un doc_id, actualizamos el índice invertido
+        # (una reseña actualizada reemplaza a su versión anterior en el índice)
         if doc_id:
-            # Actualizar longitud del documento
-            self.document_lengths[doc_id] = len(tokens)  # Longitud original sin expansión
-            self.total_documents = len(self.document_lengths)
-            
-            # Indexar tanto los tokens originales como los stems
-            all_terms = list(set(expanded_tokens + stemmed_tokens))
-            self._update_inverted_index(all_terms, doc_id)
+            # Indexar tanto los tokens originales como los stems; los términos que
+            # solo aparecen por la expansión van a la capa de sinónimos
+            term_positions, base_terms, _ = self._index_postings(tokens)
+            # Longitud: tokens originales sin expansión más los términos indexados
+            doc_length = len(tokens) + len(set(expanded_tokens + stemmed_tokens))
+            self._update_inverted_index(term_positions, doc_id, base_terms, doc_length, len(tokens),
+                                        self._document_vector(tokens), signature, self._token_offsets(text))
             print(f"Índice invertido actualizado para doc_id: {doc_id}")
-            print(f"Tamaño actual del índice: {len(self.inverted_index)} términos")
+            print(f"Segmentos del índice: {self.generation.stats()['segments']}")
             print(f"Longitud del documento: {self.document_lengths[doc_id]}")
             print(f"Total documentos indexados: {self.total_documents}")
         
@@ -264,70 +563,270 @@ class TextProcessor:
             "expanded": expanded_tokens,
             "stemmed": stemmed_tokens,
             "stem_map": stem_map,
-            "tf_vector": self._calculate_tf(stemmed_tokens)
+            "tf_vector": self._calculate_tf(stemmed_tokens,
+                                            None if generation is None else generation.collection.average_length())
         }
     
-    def _update_inverted_index(self, tokens: List[str], doc_id: str):
-        """Actualiza el índice invertido con las posiciones de los términos"""
-        # Actualizar longitud del documento (acumular si ya existe)
-        if doc_id in self.document_lengths:
-            self.document_lengths[doc_id] += len(tokens)
-        else:
-            self.document_lengths[doc_id] = len(tokens)
-        
-        # Conjunto para almacenar todos los términos a indexar
+    def _collect_index_terms(self, tokens: List[str], expand: bool) -> Set[str]:
+        """Obtiene los términos a indexar (token y stem), opcionalmente expandidos con sinónimos"""
         terms_to_index = set()
         
-        # Procesar cada token
-        for pos, token in enumerate(tokens):
+        for token in tokens:
             # Añadir el token original
             terms_to_index.add(token.lower())
             
             # Añadir el stem
-            stem = self.stemmer.stem(token.lower())
-            terms_to_index.add(stem)
+            terms_to_index.add(self.stem(token.lower()))
+            
+            if not expand:
+                continue
             
             # Añadir sinónimos y sus stems
-            for concepto, sinonimos in self.sinonimos.items():
-                if token.lower() in [s.lower() for s in sinonimos] or token.lower() == concepto.lower():
-                    # Añadir el concepto y su stem
-                    terms_to_index.add(concepto.lower())
-                    terms_to_index.add(self.stemmer.stem(concepto))
-                    # Añadir todos los sinónimos y sus stems
-                    for sinonimo in sinonimos:
-                        terms_to_index.add(sinonimo.lower())
-                        terms_to_index.add(self.stemmer.stem(sinonimo))
-        
-        # Indexar todos los términos
-        for term in terms_to_index:
-            if term not in self.inverted_index:
-                self.inverted_index[term] = {}
-            if doc_id not in self.inverted_index[term]:
-                self.inverted_index[term][doc_id] = []
-            if 0 not in self.inverted_index[term][doc_id]:  # Solo añadir la posición si no existe
-                self.inverted_index[term][doc_id].append(0)
-        
-        # Actualizar total de documentos
-        self.total_documents = len(self.document_lengths)
+            for concepto, sinonimos in self._synonyms_by_lower.get(token.lower(), []):
+                # Añadir el concepto y su stem
+                terms_to_index.add(concepto.lower())
+                terms_to_index.add(self.stem(concepto))
+                # Añadir todos los sinónimos y sus stems
+                for sinonimo in sinonimos:
+                    terms_to_index.add(sinonimo.lower())
+                    terms_to_index.add(self.stem(sinonimo))
+        
+        return terms_to_index
+    
+    def _publish(self, segment: Optional[IndexSegment] = None, removed: Iterable[str] = ()) -> IndexGeneration:
+        """
+        Publica una generación nueva con un segmento delta y/o documentos borrados.
+        Las versiones anteriores de los documentos del delta se enmascaran en la misma
+        generación, así que ninguna consulta ve un documento ausente o duplicado.
+        Solo los escritores toman el lock; los lectores usan la generación que fijaron.
+        """
+        with self._write_lock:
+            current = self.generation
+            segments = list(current.segments)
+            masks = list(current.masks)
+            total_documents = current.total_documents
+            total_length = current.total_length
+            total_tokens = current.total_tokens
+            
+            # Enmascarar la versión viva de cada documento reemplazado o borrado
+            new_documents = segment.lengths if segment is not None else {}
+            dead = defaultdict(set)
+            for doc_id in set(removed) | set(new_documents):
+                position = current.locate(doc_id)
+                if position is not None:
+                    dead[position].add(doc_id)
+                    total_documents -= 1
+                    total_length -= segments[position].lengths[doc_id]
+                    total_tokens -= segments[position].token_counts[doc_id]
+            for position, doc_ids in dead.items():
+                masks[position] = masks[position] | frozenset(doc_ids)
+            
+            if new_documents:
+                segments.append(segment)
+                masks.append(frozenset())
+                total_documents += len(new_documents)
+                total_length += sum(new_documents.values())
+                total_tokens += sum(segment.token_counts.values())
+            
+            segments, masks = self._merge_segments(segments, masks)
+            self.generation = IndexGeneration(current.number + 1, segments, masks, total_documents,
+                                              total_length, total_tokens)
+            return self.generation
+    
+    def _merge_segments(self, segments: List[IndexSegment], masks: List[frozenset]) -> Tuple[List[IndexSegment], List[frozenset]]:
+        """
+        Política de fusión: se reescriben los segmentos con más de la mitad de documentos
+        enmascarados y se fusionan los últimos segmentos mientras el penúltimo no sea
+        merge_factor veces mayor que el último (o haya más de max_segments). Así el
+        número de segmentos crece de forma logarítmica y el coste de fusión se amortiza.
+        Los segmentos que está compactando compact() no se reescriben ni se fusionan.
+        """
+        compacting = self._compacting
+        for position, (segment, mask) in enumerate(zip(segments, masks)):
+            if mask and len(mask) * 2 > len(segment) and id(segment) not in compacting:
+                segments[position] = IndexSegment.merge([segment], [mask])
+                masks[position] = frozenset()
+        segments_masks = [(segment, mask) for segment, mask in zip(segments, masks) if len(segment) > len(mask)]
+        segments = [segment for segment, _ in segments_masks]
+        masks = [mask for _, mask in segments_masks]
+        
+        def live(position: int) -> int:
+            return len(segments[position]) - len(masks[position])
+        
+        while len(segments) > 1 and id(segments[-2]) not in compacting and \
+                (len(segments) > self.max_segments or live(-2) <= self.merge_factor * live(-1)):
+            merged = IndexSegment.merge(segments[-2:], masks[-2:])
+            segments[-2:] = [merged]
+            masks[-2:] = [frozenset()]
+        return segments, masks
+    
+    def remove_document(self, doc_id: str) -> bool:
+        """Elimina un documento del índice (se enmascara en su segmento)"""
+        if self.generation.locate(doc_id) is None:
+            return False
+        self._publish(removed=[doc_id])
+        return True
+    
+    def remove_documents(self, doc_ids: Iterable[str]) -> int:
+        """Elimina varios documentos del índice en una sola generación; devuelve cuántos había"""
+        removed = [doc_id for doc_id in set(doc_ids) if self.generation.locate(doc_id) is not None]
+        if removed:
+            self._publish(removed=removed)
+        return len(removed)
+    
+    def clear_index(self):
+        """Vacía el índice publicando una generación sin segmentos"""
+        with self._write_lock:
+            self.generation = IndexGeneration(self.generation.number + 1)
+            self.index_synonyms = self.synonyms_fingerprint
+    
+    def index_footprint(self, generation: Optional[IndexGeneration] = None) -> Dict:
+        """
+        Tamaño de una generación del índice (la activa por defecto): segmentos, documentos
+        vivos y guardados (los enmascarados siguen ocupando sus segmentos), términos
+        distintos y postings por capa, y bytes estimados de la generación serializada (lo
+        que ocupa aproximadamente en un checkpoint), sumando la estimación de cada segmento
+        """
+        if generation is None:
+            generation = self.generation
+        terms = {BASE: set(), SYNONYMS: set()}
+        postings = {BASE: 0, SYNONYMS: 0}
+        estimated = 0
+        for segment in generation.segments:
+            size = segment.size()
+            for layer, layer_postings in segment.postings.items():
+                terms[layer].update(layer_postings)
+                postings[layer] += size['postings'][layer]
+            estimated += size['bytes']
+        return {
+            'generation': generation.number,
+            'segments': len(generation.segments),
+            'documents': generation.total_documents,
+            'stored_documents': sum(len(segment) for segment in generation.segments),
+            'masked_documents': sum(len(mask) for mask in generation.masks),
+            'terms': {layer: len(layer_terms) for layer, layer_terms in terms.items()},
+            'postings': postings,
+            'bytes': estimated
+        }
+    
+    def compact(self) -> Dict:
+        """
+        Reescribe el índice sin documentos enmascarados: fusiona todos los segmentos en
+        uno, así que desaparecen las postings de documentos borrados o reemplazados y los
+        términos sin documentos vivos. La fusión se hace fuera del lock de escritura sobre
+        la generación del momento (las escrituras siguen publicando segmentos delta, que
+        no se fusionan con los que se compactan); el lock solo se toma para sustituir
+        esos segmentos por el fusionado, enmascarando en él lo borrado o reemplazado
+        mientras tanto. Las consultas en curso siguen con la generación que fijaron.
+        Returns:
+            Tamaño antes y después (index_footprint) y lo recuperado
+        """
+        with self._compact_lock:
+            with self._write_lock:
+                before = self.generation
+                compact = len(before.segments) > 1 or any(before.masks)
+                if compact:
+                    self._compacting = frozenset(id(segment) for segment in before.segments)
+            after = before
+            if compact:
+                try:
+                    merged = IndexSegment.merge(list(before.segments), list(before.masks))
+                    after = self._swap_compacted(before, merged)
+                finally:
+                    self._compacting = frozenset()
+        before, after = self.index_footprint(before), self.index_footprint(after)
+        reclaimed = {
+            'documents': before['stored_documents'] - after['stored_documents'],
+            'terms': {layer: before['terms'][layer] - after['terms'][layer] for layer in before['terms']},
+            'postings': {layer: before['postings'][layer] - after['postings'][layer] for layer in before['postings']},
+            'bytes': before['bytes'] - after['bytes']
+        }
+        print(f"Índice compactado: {before['segments']} -> {after['segments']} segmentos, "
+              f"{before['bytes']} -> {after['bytes']} bytes")
+        return {'before': before, 'after': after, 'reclaimed': reclaimed}
+    
+    def _swap_compacted(self, before: IndexGeneration, merged: IndexSegment) -> IndexGeneration:
+        """
+        Publica la generación compactada: el segmento fusionado (a partir de before)
+        sustituye a los segmentos de before que sigan en la generación actual y los
+        segmentos delta publicados después se conservan. Lo que se borró o reemplazó
+        durante la fusión se enmascara en el segmento fusionado.
+        """
+        with self._write_lock:
+            current = self.generation
+            positions = {id(segment): position for position, segment in enumerate(current.segments)}
+            dead = set()
+            for segment, mask in zip(before.segments, before.masks):
+                position = positions.get(id(segment))
+                if position is None:  # Se descartó entero (todos sus documentos están enmascarados)
+                    dead.update(segment.lengths)
+                else:
+                    dead.update(current.masks[position] - mask)
+            compacted = {id(segment) for segment in before.segments}
+            segments = [merged] + [segment for segment in current.segments if id(segment) not in compacted]
+            masks = [frozenset(dead.intersection(merged.lengths))] + \
+                    [mask for segment, mask in zip(current.segments, current.masks) if id(segment) not in compacted]
+            self._compacting = frozenset()
+            segments, masks = self._merge_segments(segments, masks)
+            self.generation = IndexGeneration(current.number + 1, segments, masks, current.total_documents,
+                                              current.total_length, current.total_tokens)
+            return self.generation
+    
+    def export_state(self) -> Dict:
+        """Estado del índice para guardarlo en un checkpoint (la generación es inmutable)"""
+        return {'format': self.INDEX_FORMAT, 'generation': self.generation, 'synonyms': self.index_synonyms}
+    
+    def load_state(self, state: Dict):
+        """
+        Restaura el índice desde un checkpoint de export_state
+        Raises:
+            ValueError: si el checkpoint tiene otro formato (hay que reconstruir el índice)
+        """
+        if state.get('format') != self.INDEX_FORMAT:
+            raise ValueError(f"formato de índice {state.get('format')} no compatible con {self.INDEX_FORMAT}")
+        with self._write_lock:
+            self.generation = state['generation']
+            self.index_synonyms = state.get('synonyms')
+            with self._refresh_lock:
+                self._derived.clear()  # Los números de generación del checkpoint no continúan los actuales
+                self._derived_epoch += 1
+    
+    def _update_inverted_index(self, term_positions: Dict[str, List[int]], doc_id: str, base_terms: Set[str],
+                               doc_length: int, token_count: int, vector: Optional[Dict[str, float]] = None,
+                               signature: Optional[bytes] = None, offsets: Optional[array] = None):
+        """
+        Actualiza el índice invertido con las posiciones de los términos publicando
+        un segmento delta con el documento (con su vector de términos, su firma MinHash
+        y las posiciones de carácter de sus tokens).
+        Los términos de base_terms van a la capa base (inverted_index) y el resto,
+        que solo aparecen por sinónimos, a synonym_index.
+        """
+        builder = SegmentBuilder()
+        added = builder.add(doc_id, doc_length, term_positions, base_terms, token_count, vector, signature, offsets)
+        generation = self._publish(builder.build())
         
         # Imprimir estado actual del índice para este documento
-        doc_terms = sorted([term for term, docs in self.inverted_index.items() if doc_id in docs])
         print(f"\nEstado del índice para doc_id {doc_id}:")
-        print(f"- Términos indexados: {doc_terms}")
-        print(f"- Total términos en índice: {len(self.inverted_index)}")
-        print(f"- Total documentos indexados: {self.total_documents}")
+        print(f"- Términos indexados: {sorted(added[BASE])}")
+        print(f"- Términos por sinónimos: {sorted(added[SYNONYMS])}")
+        print(f"- Generación del índice: {generation.stats()}")
+        print(f"- Total documentos indexados: {generation.total_documents}")
         
         # Imprimir términos específicos para debug
         debug_terms = ['auriculares', 'auricular', 'bateria', 'batería', 'duracion', 'duración']
         print("\nEstado de términos específicos en el índice:")
         for term in debug_terms:
-            if term in self.inverted_index:
-                print(f"- {term}: {self.inverted_index[term]}")
+            postings = self.get_postings(term, use_synonyms=True)
+            if postings:
+                print(f"- {term}: {postings}")
             else:
                 print(f"- {term}: No indexado")
     
-    def _calculate_tf(self, tokens: List[str]) -> Dict[str, float]:
-        """Calcula la frecuencia de términos normalizada usando BM25-inspired weighting"""
+    def _calculate_tf(self, tokens: List[str], avg_len: Optional[float] = None) -> Dict[str, float]:
+        """
+        Calcula la frecuencia de términos normalizada usando BM25-inspired weighting.
+        avg_len permite reutilizar la longitud media ya calculada (p. ej. en un lote).
+        """
         tf_dict = defaultdict(float)
         if not tokens:
             return tf_dict
@@ -341,9 +840,8 @@ class TextProcessor:
         b = 0.75  # Parámetro de normalización de longitud
         
         # Calcular longitud promedio del documento de forma segura
-        total_length = sum(self.document_lengths.values())
-        num_docs = len(self.document_lengths)
-        avg_len = total_length / num_docs if num_docs > 0 else 1.0
+        if avg_len is None:
+            avg_len = self.average_document_length()
         
         # Longitud del documento actual (o 1 si no hay tokens)
         doc_len = len(tokens) if tokens else 1.0
@@ -353,16 +851,27 @@ class TextProcessor:
         return {term: (freq * (k1 + 1)) / (freq + k1 * (1 - b + b * (doc_len / avg_len)) + 1)
                 for term, freq in tf_dict.items()}
     
-    def calculate_idf(self, term: str) -> float:
-        """Calcula el IDF de un término con boost por importancia"""
-        if term not in self.inverted_index:
+    def average_document_length(self, generation: Optional[IndexGeneration] = None) -> float:
+        """Longitud media de los documentos indexados (1.0 si no hay documentos)"""
+        return (generation or self.generation).average_length()
+    
+    def calculate_idf(self, term: str, use_synonyms: Optional[bool] = None,
+                      generation: Optional[IndexGeneration] = None) -> float:
+        """
+        Calcula el IDF de un término con boost por importancia (con las estadísticas de la
+        colección completa aunque la consulta se busque en una partición)
+        """
+        generation = (generation or self.generation).collection
+        # Obtener el número de documentos que contienen el término en el modo pedido
+        # (un documento tiene cada término en una sola capa, así que se suman sin fusionar postings)
+        doc_freq = generation.document_frequency(term, BASE)
+        if self._resolve_synonyms(use_synonyms):
+            doc_freq += generation.document_frequency(term, SYNONYMS)
+        if doc_freq == 0:
             return 0.0
         
-        # Obtener el número de documentos que contienen el término
-        doc_freq = len(self.inverted_index[term])
-        
         # Calcular IDF base
-        idf = math.log(1 + (self.total_documents / (1 + doc_freq)))
+        idf = math.log(1 + (generation.total_documents / (1 + doc_freq)))
         
         # Aplicar boost por importancia del término
         term_boost = self.term_importance.get(term.lower(), 1.0)
@@ -373,9 +882,18 @@ class TextProcessor:
         # El IDF final es el producto del IDF base, el boost y la penalización
         return idf * term_boost * term_penalty
 
-    def boolean_search(self, query: str, operator: str = 'AND') -> Set[str]:
-        """Realiza una búsqueda booleana con operadores AND, OR, NOT"""
+    def boolean_search(self, query: str, operator: str = 'AND', use_synonyms: Optional[bool] = None,
+                       fuzzy: bool = False, generation: Optional[IndexGeneration] = None) -> Set[str]:
+        """
+        Realiza una búsqueda booleana con operadores AND, OR, NOT.
+        Con fuzzy los términos que no están en el índice se sustituyen por su corrección.
+        generation limita la búsqueda a una partición (por defecto, el índice completo).
+        """
         print(f"\nRealizando búsqueda booleana: {query}")
+        use_synonyms = self._resolve_synonyms(use_synonyms)
+        generation = generation or self.generation  # Toda la consulta ve la misma generación del índice
+        if fuzzy:
+            query, _ = self.correct_query(query, generation)
         
         # Normalizar espacios alrededor de operadores y paréntesis
         query = query.replace('(', ' ( ').replace(')', ' ) ')
@@ -410,7 +928,7 @@ class TextProcessor:
                     for term in subterms:
                         term = term.strip()
                         if term:
-                            term_result = self._search_single_term(term)
+                            term_result = self._search_single_term(term, use_synonyms, generation)
                             print(f"Resultado OR para '{term}': {term_result}")
                             subresult |= term_result
                     
@@ -421,7 +939,7 @@ class TextProcessor:
                     result_parts.append(parts[i].upper())
                     i += 1
                 else:
-                    result = self._search_single_term(parts[i])
+                    result = self._search_single_term(parts[i], use_synonyms, generation)
                     print(f"Resultado para término '{parts[i]}': {result}")
                     result_parts.append(result)
                     i += 1
@@ -450,14 +968,14 @@ class TextProcessor:
             return set()
         
         # Procesar el primer término
-        final_result = self._search_single_term(parts[0])
+        final_result = self._search_single_term(parts[0], use_synonyms, generation)
         
         # Procesar el resto de términos con sus operadores
         i = 1
         while i < len(parts):
             if parts[i].upper() in ['AND', 'OR', 'NOT'] and i + 1 < len(parts):
                 op = parts[i].upper()
-                next_result = self._search_single_term(parts[i + 1])
+                next_result = self._search_single_term(parts[i + 1], use_synonyms, generation)
                 if op == 'AND':
                     final_result &= next_result
                 elif op == 'OR':
@@ -471,9 +989,11 @@ class TextProcessor:
         print(f"Resultado final: {final_result}")
         return final_result
 
-    def _search_single_term(self, term: str) -> Set[str]:
-        """Busca un término individual en el índice"""
+    def _search_single_term(self, term: str, use_synonyms: Optional[bool] = None,
+                            generation: Optional[IndexGeneration] = None) -> Set[str]:
+        """Busca un término individual en el índice (en la generación fijada por la consulta)"""
         print(f"\nBuscando término individual: {term}")
+        use_synonyms = self._resolve_synonyms(use_synonyms)
         
         # Normalizar el término
         normalized_term = self.normalize_text(term.lower())
@@ -482,71 +1002,60 @@ class TextProcessor:
         # Buscar coincidencias directas y variantes
         results = set()
         
-        # 1. Buscar el término exacto y su forma normalizada
-        if term in self.inverted_index:
-            docs = set(self.inverted_index[term].keys())
-            print(f"Documentos encontrados para término exacto '{term}': {docs}")
-            results |= docs
+        def lookup(candidate: str, label: str):
+            postings = self.get_postings(candidate, use_synonyms, generation)
+            if postings:
+                docs = set(postings.keys())
+                print(f"Documentos encontrados para {label} '{candidate}': {docs}")
+                results.update(docs)
         
-        if normalized_term in self.inverted_index:
-            docs = set(self.inverted_index[normalized_term].keys())
-            print(f"Documentos encontrados para término normalizado '{normalized_term}': {docs}")
-            results |= docs
+        # 1. Buscar el término exacto y su forma normalizada
+        lookup(term, "término exacto")
+        lookup(normalized_term, "término normalizado")
         
         # 2. Buscar el stem del término
-        stem = self.stemmer.stem(normalized_term)
-        if stem in self.inverted_index:
-            docs = set(self.inverted_index[stem].keys())
-            print(f"Documentos encontrados para stem '{stem}': {docs}")
-            results |= docs
-        
-        # 3. Buscar en sinónimos
-        for concepto, sinonimos in self.sinonimos.items():
-            # Normalizar concepto y sinónimos para comparación
-            normalized_concepto = self.normalize_text(concepto)
-            normalized_sinonimos = [self.normalize_text(s) for s in sinonimos]
-            
-            if normalized_term in normalized_sinonimos or normalized_term == normalized_concepto:
+        lookup(self.stem(normalized_term), "stem")
+        
+        # 3. Buscar en sinónimos (solo si la consulta usa expansión)
+        if use_synonyms:
+            for concepto, sinonimos in self._synonyms_by_normalized.get(normalized_term, []):
                 # Buscar por el concepto y su forma normalizada
-                if concepto in self.inverted_index:
-                    docs = set(self.inverted_index[concepto].keys())
-                    print(f"Documentos encontrados para concepto '{concepto}': {docs}")
-                    results |= docs
+                lookup(concepto, "concepto")
+                lookup(self.normalize_text(concepto), "concepto normalizado")
                 
-                if normalized_concepto in self.inverted_index:
-                    docs = set(self.inverted_index[normalized_concepto].keys())
-                    print(f"Documentos encontrados para concepto normalizado '{normalized_concepto}': {docs}")
-                    results |= docs
-                
-                # Buscar por cada sinónimo y su forma normalizada
+                # Buscar por cada sinónimo, su forma normalizada y su stem
                 for sinonimo in sinonimos:
-                    if sinonimo in self.inverted_index:
-                        docs = set(self.inverted_index[sinonimo].keys())
-                        print(f"Documentos encontrados para sinónimo '{sinonimo}': {docs}")
-                        results |= docs
-                    
                     normalized_sinonimo = self.normalize_text(sinonimo)
-                    if normalized_sinonimo in self.inverted_index:
-                        docs = set(self.inverted_index[normalized_sinonimo].keys())
-                        print(f"Documentos encontrados para sinónimo normalizado '{normalized_sinonimo}': {docs}")
-                        results |= docs
-                    
-                    # Buscar también el stem de cada sinónimo
-                    stem_sinonimo = self.stemmer.stem(normalized_sinonimo)
-                    if stem_sinonimo in self.inverted_index:
-                        docs = set(self.inverted_index[stem_sinonimo].keys())
-                        print(f"Documentos encontrados para stem de sinónimo '{stem_sinonimo}': {docs}")
-                        results |= docs
+                    lookup(sinonimo, "sinónimo")
+                    lookup(normalized_sinonimo, "sinónimo normalizado")
+                    lookup(self.stem(normalized_sinonimo), "stem de sinónimo")
         
         print(f"Resultado final para '{term}': {results}")
         return results
     
-    def tf_idf_search(self, query: str) -> Dict[str, float]:
-        """Realiza una búsqueda por similitud usando TF-IDF con pesos mejorados"""
+    def tf_idf_search(self, query: str, use_synonyms: Optional[bool] = None, fuzzy: bool = False,
+                      generation: Optional[IndexGeneration] = None, limit: Optional[int] = None,
+                      min_score: Optional[float] = None, rated: bool = False) -> Dict[str, float]:
+        """
+        Realiza una búsqueda por similitud usando TF-IDF con pesos mejorados.
+        use_synonyms elige, solo para esta consulta, si se combina la capa de
+        sinónimos del índice y si se expande la propia consulta.
+        fuzzy corrige antes los términos que no están en el índice.
+        generation limita la búsqueda a una partición (el IDF y la longitud media son los
+        de la colección completa, así que los scores no dependen de la partición).
+        Recorre las postings ordenadas por impacto (ver impact_postings.py): el IDF y el
+        boost de cada término se calculan una vez por consulta y no por documento, y con
+        limit o min_score el recorrido para en cuanto el resultado está decidido.
+        rated multiplica el score por el factor de la puntuación de la reseña (rating_factor).
+        """
         print(f"\nRealizando búsqueda TF-IDF para: {query}")
+        use_synonyms = self._resolve_synonyms(use_synonyms)
+        generation = generation or self.generation  # Toda la consulta ve la misma generación del índice
+        if fuzzy:
+            query, _ = self.correct_query(query, generation)
         
         # Procesar la consulta
-        query_terms = self.process_text(query)
+        query_terms = self.process_text(query, use_synonyms=use_synonyms, generation=generation)
         query_vector = query_terms['tf_vector']
         
         # Buscar términos compuestos en la consulta normalizada
@@ -557,30 +1066,555 @@ class TextProcessor:
                 compound_boost *= boost
                 print(f"Aplicando boost de término compuesto '{compound}': {boost}")
         
-        # Calcular similitud para cada documento
-        scores = {}
-        for doc_id in self.document_lengths:
-            score = 0.0
-            doc_length = self.document_lengths[doc_id]
-            
-            # Calcular similitud coseno con boost por términos importantes
-            for term, query_tf in query_vector.items():
-                if doc_id in self.inverted_index.get(term, {}):
-                    # Calcular TF-IDF para el documento con boost por importancia
-                    doc_tf = len(self.inverted_index[term][doc_id]) / doc_length
-                    idf = self.calculate_idf(term)
-                    term_boost = self.term_importance.get(term.lower(), 1.0)
-                    term_score = query_tf * doc_tf * idf * term_boost
-                    score += term_score
-                    
-                    print(f"Término '{term}': TF={doc_tf:.4f}, IDF={idf:.4f}, Boost={term_boost:.1f}, Score={term_score:.4f}")
-            
-            # Normalizar por longitud del documento y aplicar boost de términos compuestos
-            if score > 0:
-                # Normalizar score por longitud y aplicar compound boost
-                final_score = (score / math.sqrt(doc_length)) * compound_boost
-                scores[doc_id] = final_score
-                print(f"Doc {doc_id}: Base Score={score:.4f}, Final={final_score:.4f}")
-        
-        # Ordenar por score descendente
-        return dict(sorted(scores.items(), key=lambda x: x[1], reverse=True)) 
\ No newline at end of file
+        # Peso de cada término de la consulta: TF de la consulta, IDF (con importancia y
+        # penalización) y boost por importancia, calculados una sola vez
+        terms = list(query_vector)
+        query_tfs = [query_vector[term] for term in terms]
+        idfs = [self.calculate_idf(term, use_synonyms, generation) for term in terms]
+        boosts = [self.term_importance.get(term.lower(), 1.0) for term in terms]
+        weights = [query_tf * idf * term_boost * compound_boost
+                   for query_tf, idf, term_boost in zip(query_tfs, idfs, boosts)]
+        
+        def score(segment: IndexSegment, doc_id: str, matched: List[int]) -> float:
+            # Similitud coseno con boost por términos importantes
+            # (TF binaria: las frecuencias reales de las postings las usa bm25_search)
+            doc_length = segment.lengths[doc_id]
+            doc_tf = 1 / doc_length
+            total = 0.0
+            for index in matched:
+                total += query_tfs[index] * doc_tf * idfs[index] * boosts[index]
+            # Normalizar score por longitud y aplicar compound boost
+            final_score = (total / math.sqrt(doc_length)) * compound_boost
+            if rated:
+                final_score *= self.rating_factor(segment.rating(doc_id))
+            return final_score
+        
+        layers = (BASE, SYNONYMS) if use_synonyms else (BASE,)
+        impacts = self.rated_impacts if rated else self.impacts
+        ranked = impacts.search(generation, terms, weights, layers, score, limit, min_score)
+        print(f"Documentos con score TF-IDF: {len(ranked)}")
+        
+        # Ordenados por score descendente
+        if min_score is None:
+            ranked = [(doc_id, doc_score) for doc_id, doc_score in ranked if doc_score > 0]
+        return dict(ranked)
+
+    def rating_factor(self, rating: Optional[float]) -> float:
+        """Factor del ranking por la puntuación de la reseña (default_rating si no la tiene)"""
+        rating = self.default_rating if rating is None else rating
+        # Aplicar factor de rating de forma más agresiva
+        rating_factor = (rating / 5.0) ** 2  # Factor exponencial
+        # Penalizar más fuertemente las reviews negativas
+        if rating < 3.0:
+            rating_factor *= 0.3  # Penalización extra para ratings bajos
+        return rating_factor
+
+    def ranked_search(self, query: str, search_type: str = 'tf_idf', min_score: float = 0.0,
+                      limit: Optional[int] = None, use_synonyms: Optional[bool] = None,
+                      bm25_params: Optional[Dict] = None, fuzzy: bool = False,
+                      generation: Optional[IndexGeneration] = None) -> List[Tuple[str, float]]:
+        """
+        Búsqueda por similitud con la puntuación de la reseña dentro del score: score del
+        motor x rating_factor de la puntuación guardada en el índice. min_score y limit se
+        aplican aquí, sin leer las reseñas del almacén: tf_idf los usa para parar el
+        recorrido por impacto y el resto de motores, al reordenar sus resultados.
+        Returns:
+            (doc_id, score final) ordenados por score descendente
+        """
+        generation = generation or self.generation
+        if search_type == 'tf_idf':
+            return list(self.tf_idf_search(query, use_synonyms, fuzzy, generation, limit, min_score,
+                                           rated=True).items())
+        if search_type == 'bm25':
+            scores = self.bm25_search(query, use_synonyms=use_synonyms, fuzzy=fuzzy, generation=generation,
+                                      **(bm25_params or {}))
+        elif search_type == 'semantic':
+            scores = self.semantic_search(query, fuzzy=fuzzy, generation=generation)
+        elif search_type == 'hybrid':
+            scores = self.hybrid_search(query, use_synonyms=use_synonyms, fuzzy=fuzzy, generation=generation)
+        else:
+            raise ValueError(f"Tipo de búsqueda no soportado: {search_type}")
+        ranked = []
+        for doc_id, base_score in scores.items():
+            final_score = base_score * self.rating_factor(generation.rating(doc_id))
+            if final_score >= min_score:  # Solo incluir resultados que superen el umbral
+                ranked.append((doc_id, final_score))
+        ranked.sort(key=lambda x: x[1], reverse=True)
+        return ranked if limit is None else ranked[:limit]
+
+    def _query_term_weight(self, term: str, originals: Set[str]) -> float:
+        """Peso de consulta de un stem: importancia y penalización de sus formas originales"""
+        forms = {term} | set(originals)
+        boost = max((self.term_importance[form] for form in forms if form in self.term_importance), default=1.0)
+        penalty = min((self.penalty_terms[form] for form in forms if form in self.penalty_terms), default=1.0)
+        return boost * penalty
+
+    def _concept_documents(self, concepto: str, generation: IndexGeneration) -> Set[str]:
+        """Documentos que contienen un concepto del diccionario por sí mismo o por sus sinónimos"""
+        normalized = self.normalize_text(concepto)
+        documents = set()
+        for term in {concepto.lower(), self.stem(concepto), normalized, self.stem(normalized)}:
+            documents.update(self.get_postings(term, True, generation))
+        return documents
+
+    def _derived_structure(self, name: str, build: Callable[[IndexGeneration], object],
+                           generation: Optional[IndexGeneration] = None, wait: bool = False):
+        """
+        Estructura derivada del vocabulario, construida una vez por generación del índice.
+        Solo la primera se construye en el hilo que la pide (el calentamiento del servicio
+        y la reconstrucción del índice la dejan hecha). Cuando una generación nueva la deja
+        desactualizada se sigue sirviendo la anterior mientras se reconstruye en segundo
+        plano (una reconstrucción a la vez por estructura); con wait se espera a la de la
+        generación actual (p. ej. al construir otra estructura a partir de ella).
+        """
+        number = (generation or self.generation).number
+        cached = self._derived.get(name)
+        if cached is not None and cached[0] >= number:
+            return cached[1]
+        if cached is not None and not wait:
+            self._refresh_derived(name, build)
+            return cached[1]
+        with self._derived_lock:
+            cached = self._derived.get(name)
+            if cached is None or cached[0] < number:
+                epoch = self._derived_epoch
+                current = self.generation
+                cached = (current.number, build(current))
+                self._store_derived(name, cached, epoch)
+        return cached[1]
+
+    def _store_derived(self, name: str, built: Tuple[int, object], epoch: int):
+        """Guarda una estructura construida salvo que ya haya una más reciente o se haya cargado un checkpoint"""
+        with self._refresh_lock:
+            cached = self._derived.get(name)
+            if epoch == self._derived_epoch and (cached is None or cached[0] < built[0]):
+                self._derived[name] = built
+
+    def _refresh_derived(self, name: str, build: Callable[[IndexGeneration], object]):
+        """Reconstruye una estructura derivada en un hilo en segundo plano (si no se está reconstruyendo ya)"""
+        with self._refresh_lock:
+            if name in self._refreshing:
+                return
+            self._refreshing.add(name)
+            epoch = self._derived_epoch
+
+        def run():
+            try:
+                current = self.generation
+                self._store_derived(name, (current.number, build(current)), epoch)
+            except Exception as e:
+                print(f"Error reconstruyendo la estructura derivada '{name}': {str(e)}")
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(name)
+
+        threading.Thread(target=run, name=f'derived-{name}', daemon=True).start()
+
+    def warm_derived(self):
+        """Construye las estructuras derivadas del vocabulario (autocompletado y corrección)"""
+        self.term_dictionary()
+        self.fuzzy_index()
+
+    def _vocabulary_words(self, generation: Optional[IndexGeneration] = None, wait: bool = False) -> Dict[str, int]:
+        """
+        Palabras de la capa base con su frecuencia documental, sin los stems que no
+        son palabras del texto (como 'preci' de 'precio')
+        """
+        def build(generation: IndexGeneration) -> Dict[str, int]:
+            frequencies = generation.document_frequencies(BASE)
+            stems = {term: self.stem(term) for term in frequencies}
+            stem_only = {stem for term, stem in stems.items() if stem != term}
+            return {term: doc_freq for term, doc_freq in frequencies.items()
+                    if not (stems[term] == term and term in stem_only)}
+        return self._derived_structure('words', build, generation, wait)
+
+    def _dictionary_entries(self, generation: IndexGeneration) -> Iterable[Tuple[str, Dict]]:
+        """
+        Entradas del diccionario de autocompletado: las palabras de la capa base y los
+        conceptos y sinónimos de sinonimos.json. El score es la frecuencia documental
+        por el peso de consulta del término (term_importance y penalty_terms);
+        'frequency' es el número de documentos que devuelve una búsqueda con sinónimos
+        del término.
+        """
+        frequencies = self._vocabulary_words(generation, wait=True)
+        for term, doc_freq in frequencies.items():
+            yield term, {'term': term, 'type': 'termino', 'frequency': doc_freq,
+                         'score': doc_freq * self._query_term_weight(self.stem(term), {term})}
+        
+        # Los conceptos puntúan por todos los documentos que alcanzan con la expansión;
+        # sus sinónimos, solo por los documentos que los contienen literalmente
+        for concepto, sinonimos_list in self.sinonimos.items():
+            doc_freq = len(self._concept_documents(concepto, generation))
+            if not doc_freq:
+                continue
+            for form in [concepto] + list(sinonimos_list):
+                normalized = self.normalize_text(form)
+                weight = self._query_term_weight(self.stem(normalized), {normalized})
+                own_freq = doc_freq if form == concepto else frequencies.get(normalized, 0)
+                yield normalized, {'term': form, 'type': 'concepto' if form == concepto else 'sinonimo',
+                                   'concepto': concepto, 'frequency': doc_freq, 'score': own_freq * weight}
+
+    def term_dictionary(self) -> TermDictionary:
+        """Diccionario de autocompletado de la generación actual (se construye una vez por generación)"""
+        return self._derived_structure(
+            'dictionary', lambda generation: TermDictionary(self._dictionary_entries(generation),
+                                                            top_k=self.suggest_top_k))
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict]:
+        """
+        Completaciones de la última palabra de prefix ordenadas por frecuencia documental
+        e importancia. 'text' repite las palabras anteriores del prefijo con la completación.
+        """
+        words = self.normalize_text(prefix).split()
+        if not words or prefix[-1:].isspace():
+            return []
+        head = ' '.join(words[:-1])
+        suggestions = []
+        for suggestion in self.term_dictionary().complete(words[-1], limit):
+            suggestion = dict(suggestion)
+            suggestion['text'] = f"{head} {suggestion['term']}" if head else suggestion['term']
+            suggestions.append(suggestion)
+        return suggestions
+
+    def more_like_this(self, doc_id: str, limit: int = 10) -> Optional[List[Tuple[str, float]]]:
+        """
+        Documentos más parecidos a uno indexado, sin volver a analizar su texto.
+        La consulta son los similar_query_terms stems de más peso del vector guardado
+        del documento (peso x IDF); se descartan los que solo aparecen en él y los
+        demasiado frecuentes (df > similar_max_df_ratio x N), y solo se recorren las
+        postings de la capa base de los que quedan. El score es el producto escalar
+        con pesos tf x peso x IDF normalizado por la norma de la consulta y la del
+        vector guardado del candidato.
+        Returns:
+            (doc_id, score) ordenados por score o None si el documento no está indexado
+        """
+        generation = self.generation  # Toda la consulta ve la misma generación del índice
+        vector = generation.document_vector(doc_id)
+        if vector is None:
+            return None
+        total_documents = generation.total_documents
+        max_doc_freq = max(1, int(total_documents * self.similar_max_df_ratio))
+        
+        idf = {}
+        for stem in vector:
+            doc_freq = generation.document_frequency(stem, BASE)
+            if 1 < doc_freq <= max_doc_freq:
+                idf[stem] = BM25Scorer.idf(doc_freq, total_documents)
+        query = heapq.nlargest(self.similar_query_terms, ((stem, vector[stem] * idf[stem]) for stem in idf),
+                               key=lambda item: (item[1], item[0]))
+        if not query:
+            return []
+        query_norm = math.sqrt(sum(weight * weight for _, weight in query))
+        
+        scores = defaultdict(float)
+        for stem, weight in query:
+            postings = generation.postings(stem, BASE)
+            # Peso del stem por ocurrencia (el del vector dividido entre su frecuencia en el documento)
+            term_weight = vector[stem] / len(postings[doc_id]) if doc_id in postings else 1.0
+            for candidate, positions in postings.items():
+                if candidate != doc_id:
+                    scores[candidate] += weight * len(positions) * term_weight * idf[stem]
+        
+        # Normalizar por la norma del vector guardado de cada candidato (fijada al indexarlo)
+        results = []
+        for candidate, score in scores.items():
+            candidate_vector = generation.document_vector(candidate) or {}
+            norm = math.sqrt(sum(value * value for value in candidate_vector.values())) or 1.0
+            results.append((candidate, score / (query_norm * norm)))
+        return heapq.nlargest(limit, results, key=lambda item: (item[1], item[0]))
+
+    def semantic_search(self, query: str, fuzzy: bool = False, generation: Optional[IndexGeneration] = None,
+                        lexical_fallback: bool = True) -> Optional[Dict[str, float]]:
+        """
+        Búsqueda semántica latente: la consulta se convierte en un vector de términos
+        como los documentos y se buscan sus vecinos en el espacio LSA (ver semantic_index.py).
+        Encuentra reseñas relacionadas aunque no compartan términos ni sinónimos listados.
+        Mientras el modelo se ajusta por primera vez (en segundo plano) o si la colección
+        es demasiado pequeña para ajustarlo, se usa tf_idf (o None sin lexical_fallback).
+        Returns:
+            doc_id -> similitud coseno (solo positivas) de los semantic_top_k más cercanos
+        """
+        print(f"\nRealizando búsqueda semántica para: {query}")
+        generation = generation or self.generation  # Toda la consulta ve la misma generación del índice
+        if fuzzy:
+            query, _ = self.correct_query(query, generation)
+        tokens = self._filter_tokens(self._tokenize(query))
+        if not tokens or generation.total_documents == 0:
+            return {}
+        # El modelo se ajusta siempre con el índice completo aunque se busque en una partición
+        results = self.semantic.search(generation, self._document_vector(tokens), self.semantic_top_k,
+                                       collection=generation.collection)
+        if results is None:
+            print("Modelo semántico no disponible: búsqueda léxica")
+            return self.tf_idf_search(query, generation=generation) if lexical_fallback else None
+        return {doc_id: score for doc_id, score in results if score > 0}
+
+    def hybrid_search(self, query: str, use_synonyms: Optional[bool] = None, fuzzy: bool = False,
+                      generation: Optional[IndexGeneration] = None) -> Dict[str, float]:
+        """
+        Fusión de tf_idf y la búsqueda semántica por Reciprocal Rank Fusion:
+        score = suma de 1 / (rrf_k + posición) en cada ranking, escalado para que
+        un documento primero en ambos tenga 1.0 (sin modelo semántico, solo tf_idf)
+        """
+        generation = generation or self.generation
+        rankings = [self.tf_idf_search(query, use_synonyms, fuzzy, generation)]
+        semantic = self.semantic_search(query, fuzzy, generation, lexical_fallback=False)
+        if semantic is not None:
+            rankings.append(semantic)
+        fused = defaultdict(float)
+        for ranking in rankings:
+            for rank, doc_id in enumerate(ranking, 1):
+                fused[doc_id] += 1 / (self.rrf_k + rank)
+        scale = len(rankings) / (self.rrf_k + 1)
+        return dict(sorted(((doc_id, score / scale) for doc_id, score in fused.items()),
+                           key=lambda x: x[1], reverse=True))
+
+    def text_signature(self, text: str) -> Optional[bytes]:
+        """Firma MinHash de un texto (la misma que se guarda al indexarlo)"""
+        return self.duplicates.hasher.signature(self._tokenize(text))
+
+    def find_duplicates(self, signature: Optional[bytes], exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Documentos indexados casi duplicados de una firma (sin contar exclude), de más a menos parecido"""
+        return self.duplicates.find(self.generation, signature, exclude)
+
+    def duplicate_clusters(self) -> List[Dict]:
+        """Grupos de documentos casi duplicados de la colección indexada"""
+        return self.duplicates.clusters(self.generation)
+
+    def _positive_query_tokens(self, query: str) -> List[str]:
+        """Tokens de una consulta sin stopwords, operadores booleanos ni las palabras negadas con NOT"""
+        tokens = []
+        negated = False
+        for word in query.replace('(', ' ').replace(')', ' ').split():
+            operator = word.upper()
+            if operator in ('AND', 'OR', 'NOT'):
+                negated = operator == 'NOT'
+                continue
+            if not negated:
+                tokens.extend(self._filter_tokens(self._tokenize(word)))
+            negated = False
+        return tokens
+
+    def highlight_terms(self, query: str, use_synonyms: Optional[bool] = None) -> Set[str]:
+        """
+        Términos del índice que genera cada palabra de una consulta (token y stem y, si
+        use_synonyms, los de su expansión por sinónimos), sin operadores booleanos ni
+        las palabras negadas con NOT
+        """
+        expand = self._resolve_synonyms(use_synonyms)
+        terms = set()
+        for token in self._positive_query_tokens(query):
+            terms |= self._token_terms(token)[0 if expand else 1]
+        return terms
+
+    def route_categories(self, query: str, generation: Optional[IndexGeneration] = None) -> List[str]:
+        """
+        Categorías a las que está ligado el vocabulario de una consulta: las de los
+        términos que aparecen en al menos route_min_documents documentos y casi solo
+        (route_min_share) en los de una categoría, como 'auriculares' o 'cafetera'.
+        Returns:
+            Categorías ordenadas; vacía si ningún término está ligado a una categoría
+        """
+        generation = generation or self.generation
+        if len(generation.partitions()) < 2:
+            return []
+        categories = set()
+        for stem in {self.stem(token) for token in self._positive_query_tokens(query)}:
+            frequencies = generation.category_frequencies(stem, BASE)
+            total = sum(frequencies.values())
+            if total < self.route_min_documents:
+                continue
+            category = max(frequencies, key=frequencies.get)
+            if frequencies[category] >= self.route_min_share * total:
+                categories.add(category)
+        return sorted(categories)
+
+    def select_partitions(self, query: str, categories: Optional[List[str]] = None, route: bool = False,
+                          generation: Optional[IndexGeneration] = None) -> Optional[List[str]]:
+        """
+        Categorías (particiones del índice) a las que se envía una consulta: las pedidas
+        (sin distinguir mayúsculas ni acentos) o, con route, las de su vocabulario
+        (route_categories). La consulta se busca una sola vez en la partición que las
+        reúne (IndexGeneration.partition).
+        Returns:
+            Categorías seleccionadas, o None si la consulta va al índice completo
+        """
+        generation = generation or self.generation
+        if categories:
+            wanted = {self.normalize_text(category) for category in categories}
+            return [category for category in generation.partitions() if self.normalize_text(category) in wanted]
+        if route:
+            routed = self.route_categories(query, generation)
+            if routed:
+                return routed
+        return None
+
+    def partition_stats(self) -> List[Dict]:
+        """Documentos, longitud media y segmentos de cada partición de la generación actual"""
+        return [{'category': category, 'documents': partition.total_documents,
+                 'average_length': partition.average_length(), 'segments': len(partition.segments)}
+                for category, partition in self.generation.partitions().items()]
+
+    def snippets(self, doc_id: str, text: str, terms: Set[str], use_synonyms: Optional[bool] = None,
+                 start: int = 0, generation: Optional[IndexGeneration] = None) -> List[str]:
+        """
+        Fragmentos de text con los términos de la consulta resaltados, a partir de las
+        posiciones guardadas al indexar: las postings del documento dan los tokens que
+        coinciden (también por stem o por sinónimos si use_synonyms) y sus posiciones de
+        carácter, el trozo de texto. No se vuelve a analizar el texto y el coste por
+        resultado está acotado por snippet_max_matches.
+        Args:
+            text: Texto indexado del documento (el mismo que se analizó al indexarlo)
+            terms: Términos de la consulta (highlight_terms)
+            start: Los fragmentos se toman de text[start:]
+        Returns:
+            Hasta snippet_fragments fragmentos en orden de aparición, con el texto escapado
+            para HTML (solo highlight_tags queda sin escapar)
+        """
+        generation = generation or self.generation
+        position = generation.locate(doc_id)
+        if position is None:
+            return []
+        segment = generation.segments[position]
+        offsets = segment.offsets.get(doc_id)
+        if not offsets or offsets[-1] > len(text):
+            return []
+        layers = (BASE, SYNONYMS) if self._resolve_synonyms(use_synonyms) else (BASE,)
+        matched = set()
+        for layer in layers:
+            postings = segment.postings[layer]
+            for term in terms:
+                positions = postings.get(term, {}).get(doc_id)
+                if positions:
+                    matched.update(positions)
+        spans = [(offsets[2 * token], offsets[2 * token + 1]) for token in sorted(matched)
+                 if offsets[2 * token] >= start][:self.snippet_max_matches]
+        if not spans:
+            return []
+
+        # Ventanas de snippet_size caracteres con más coincidencias (dos punteros por ventana)
+        starts, ends = offsets[0::2], offsets[1::2]
+        windows = []
+        remaining = spans
+        while remaining and len(windows) < self.snippet_fragments:
+            best_first, best_last, last = 0, 1, 1
+            for first in range(len(remaining)):
+                last = max(last, first + 1)
+                while last < len(remaining) and remaining[last][1] - remaining[first][0] <= self.snippet_size:
+                    last += 1
+                if last - first > best_last - best_first:
+                    best_first, best_last = first, last
+            match_start, match_end = remaining[best_first][0], remaining[best_last - 1][1]
+            # Centrar las coincidencias en el fragmento y ajustarlo a límites de token
+            low = max(start, match_start - max(0, self.snippet_size - (match_end - match_start)) // 2)
+            high = max(match_end, low + self.snippet_size)
+            window_start = starts[bisect_left(starts, low)]
+            window_end = ends[bisect_right(ends, high) - 1]
+            windows.append((window_start, window_end))
+            remaining = [span for span in remaining if span[1] <= window_start or span[0] >= window_end]
+
+        pre, post = self.highlight_tags
+        fragments = []
+        for window_start, window_end in sorted(windows):
+            if fragments and window_start < fragments[-1][1]:
+                fragments[-1] = (fragments[-1][0], max(fragments[-1][1], window_end))
+            else:
+                fragments.append((window_start, window_end))
+        result = []
+        for window_start, window_end in fragments:
+            parts = []
+            cursor = window_start
+            for span_start, span_end in spans:
+                if span_start >= window_start and span_end <= window_end:
+                    parts.extend((html.escape(text[cursor:span_start]), pre,
+                                  html.escape(text[span_start:span_end]), post))
+                    cursor = span_end
+            parts.append(html.escape(text[cursor:window_end]))
+            result.append(''.join(parts))
+        return result
+
+    def fuzzy_index(self, generation: Optional[IndexGeneration] = None) -> DeletionIndex:
+        """Índice de borrados (SymSpell) sobre las palabras del índice y las formas de sinonimos.json"""
+        def build(generation: IndexGeneration) -> DeletionIndex:
+            words = dict(self._vocabulary_words(generation, wait=True))
+            for concepto, sinonimos_list in self.sinonimos.items():
+                for form in [concepto] + list(sinonimos_list):
+                    normalized = self.normalize_text(form)
+                    if ' ' not in normalized:
+                        words.setdefault(normalized, 0)
+            return DeletionIndex(words, max_distance=self.fuzzy_max_distance)
+        return self._derived_structure('fuzzy', build, generation)
+
+    def correct_term(self, token: str, generation: Optional[IndexGeneration] = None) -> Optional[str]:
+        """
+        Corrección de un token normalizado que no aparece en el índice (ni él, ni su stem,
+        ni como forma de un sinónimo): la palabra más frecuente a la menor distancia de
+        edición. La distancia admitida crece con la longitud del token.
+        Returns:
+            La corrección o None si el token es conocido o no hay ninguna cercana
+        """
+        generation = generation or self.generation
+        max_distance = 0 if len(token) < 4 else 1 if len(token) < 7 else 2
+        if max_distance == 0 or token in self._synonyms_by_normalized:
+            return None
+        if self.get_postings(token, True, generation) or self.get_postings(self.stem(token), True, generation):
+            return None
+        matches = self.fuzzy_index(generation).lookup(token, max_distance, limit=1)
+        return matches[0][0] if matches else None
+
+    def correct_query(self, query: str, generation: Optional[IndexGeneration] = None) -> Tuple[str, Dict[str, str]]:
+        """
+        Corrige los términos mal escritos de una consulta conservando los operadores
+        booleanos y los paréntesis
+        Returns:
+            (consulta corregida, token original -> corrección); sin correcciones la
+            consulta se devuelve tal cual
+        """
+        generation = generation or self.generation
+        corrections = {}
+        words = []
+        for word in query.replace('(', ' ( ').replace(')', ' ) ').split():
+            if word in ('(', ')') or word.upper() in ('AND', 'OR', 'NOT'):
+                words.append(word)
+                continue
+            tokens = self._filter_tokens(self._tokenize(word))
+            corrected = []
+            for token in tokens:
+                correction = self.correct_term(token, generation)
+                if correction:
+                    corrections[token] = correction
+                corrected.append(correction or token)
+            words.append(' '.join(corrected) if corrected != tokens else word)
+        if not corrections:
+            return query, corrections
+        print(f"Correcciones de la consulta: {corrections}")
+        return ' '.join(words), corrections
+
+    def bm25_search(self, query: str, use_synonyms: Optional[bool] = None, k1: Optional[float] = None,
+                    b: Optional[float] = None, delta: Optional[float] = None, fuzzy: bool = False,
+                    generation: Optional[IndexGeneration] = None) -> Dict[str, float]:
+        """
+        Búsqueda BM25 (BM25+ si delta > 0) con frecuencias reales por documento.
+        La consulta no se expande: la expansión ya está en el índice y use_synonyms
+        decide si se recorre también la capa de sinónimos. term_importance y
+        penalty_terms actúan como pesos de los términos de la consulta.
+        k1, b y delta sustituyen, solo para esta consulta, a los de self.bm25.
+        fuzzy corrige antes los términos que no están en el índice.
+        generation limita la búsqueda a una partición (con el IDF y el avgdl de la colección).
+        """
+        print(f"\nRealizando búsqueda BM25 para: {query}")
+        use_synonyms = self._resolve_synonyms(use_synonyms)
+        generation = generation or self.generation  # Toda la consulta ve la misma generación del índice
+        if fuzzy:
+            query, _ = self.correct_query(query, generation)
+        scorer = self.bm25.with_params(k1, b, delta)
+        
+        tokens = self._filter_tokens(self._tokenize(query))
+        stemmed_tokens, stem_map = self._stem_tokens(tokens)
+        query_weights = defaultdict(float)
+        for stem in stemmed_tokens:
+            query_weights[stem] += self._query_term_weight(stem, stem_map[stem])
+        print(f"Términos de la consulta: {dict(query_weights)}, parámetros: {scorer.params()}")
+        
+        scores = scorer.score(generation, query_weights, use_synonyms)
+        return dict(sorted(scores.items(), key=lambda x: x[1], reverse=True))
@@ -1,36 +1,108 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field, HttpUrl
-from typing import List, Dict, Optional
-import nltk
+import time
+# Inicio del arranque: el desglose de tiempos se imprime al arrancar y se expone en /index/startup
+STARTUP_BEGIN = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Header, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, Field, HttpUrl, ValidationError
+from typing import List, Dict, Optional, Tuple
+from collections import OrderedDict
 import os
+import hmac
 import json
-from text_processor import TextProcessor
+import threading
+import uuid
 from review_file_handler import ReviewFileHandler
-from evaluator import Evaluator
-from experiments import ExperimentRunner
+from bulk_ingest import BulkIngestor
+from index_rebuilder import IndexRebuilder
+from index_compactor import IndexCompactor
+from service_lifecycle import ServiceLifecycle
+from request_profiler import RequestProfiler, ProfilerMiddleware, run_in_threadpool
 import statistics
-import time
 
-# Set NLTK data path to a local directory
-nltk.data.path.append(os.path.join(os.path.dirname(__file__), 'nltk_data'))
+# Desglose del arranque en segundos (importaciones, almacén, índice, WAL, calentamiento y listo)
+startup_timings: "OrderedDict[str, float]" = OrderedDict()
+startup_timings['imports'] = time.perf_counter() - STARTUP_BEGIN
 
 # Initialize FastAPI app
 app = FastAPI(title="Sistema de Recuperación de Información - Reseñas de Productos",
              description="API para búsqueda y gestión de reseñas de productos")
 
 # Initialize services
-text_processor = TextProcessor()
-review_handler = ReviewFileHandler()
-evaluator = Evaluator(similarity_threshold=0.15)
+# El índice no se recupera al importar: lo carga el ciclo de vida en segundo plano al arrancar
+# (DATA_DIR cambia el directorio del almacén y el WAL; por defecto, data/)
+review_handler = ReviewFileHandler(recover_index=False, data_dir=os.environ.get('DATA_DIR'))
+startup_timings.update(review_handler.startup_timings)
+_services_start = time.perf_counter()
+bulk_ingestor = BulkIngestor(review_handler)
+index_rebuilder = IndexRebuilder(review_handler, analyze=bulk_ingestor.analyze)
+index_compactor = IndexCompactor(review_handler, analyze=bulk_ingestor.analyze)
+
+# El evaluador (y sus dependencias) se crea la primera vez que un endpoint calcula métricas
+_evaluator = None
+_evaluator_lock = threading.Lock()
+
+def get_evaluator():
+    global _evaluator
+    if _evaluator is None:
+        with _evaluator_lock:
+            if _evaluator is None:
+                from evaluator import Evaluator
+                _evaluator = Evaluator(similarity_threshold=0.15)
+    return _evaluator
+
+# Token de los endpoints de administración (si no se define, esos endpoints responden 503)
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# Reseñas por lote en la ingesta masiva (validación, análisis y commit)
+BULK_BATCH_SIZE = 1000
 
 # Load information needs
 with open(os.path.join(os.path.dirname(__file__), 'data/necesidades_informacion.json'), 'r', encoding='utf-8') as f:
     NECESIDADES = json.load(f)['necesidades']
 
+# Métricas de búsqueda calculadas en segundo plano: metrics_id -> estado y resultado
+MAX_METRICS_JOBS = 1000
+metrics_jobs: "OrderedDict[str, Dict]" = OrderedDict()
+metrics_jobs_lock = threading.Lock()
+
+def warm_up_queries() -> List[Tuple[str, str]]:
+    """Consultas de las necesidades de información guardadas con las que se calienta el índice"""
+    queries = []
+    for necesidad in NECESIDADES:
+        queries.append((necesidad['consulta_libre'], 'tf_idf'))
+        queries.append((necesidad['consulta_libre'], 'bm25'))
+        queries.append((necesidad['consulta_booleana'], 'boolean'))
+    return queries
+
+# Ciclo de vida: carga y calentamiento del índice en segundo plano (WARM_UP=0 para no calentar)
+lifecycle = ServiceLifecycle(review_handler,
+                             warm_queries=warm_up_queries if os.environ.get('WARM_UP', '1') == '1' else None,
+                             timings=startup_timings, began=STARTUP_BEGIN)
+# Endpoints que responden mientras el índice se carga
+LIFECYCLE_PATHS = {'/health/live', '/health/ready', '/index/startup', '/docs', '/redoc', '/openapi.json'}
+
+# Perfilador por muestreo bajo demanda (endpoints /admin/profile)
+profiler = RequestProfiler()
+app.add_middleware(ProfilerMiddleware, profiler=profiler)
+
+startup_timings['services'] = time.perf_counter() - _services_start
+
 @app.on_event("startup")
 async def load_reviews():
-    """Carga y procesa todas las reseñas al iniciar el servidor"""
-    review_handler.process_reviews()
+    """Recupera el índice (checkpoint + cola del WAL) y lo calienta en segundo plano"""
+    lifecycle.start()
+
+@app.on_event("shutdown")
+async def save_index_checkpoint():
+    """Guarda un checkpoint al parar para que el siguiente arranque no reproduzca el WAL"""
+    try:
+        # Sin el índice cargado el checkpoint guardaría un índice incompleto
+        if lifecycle.ready:
+            review_handler.checkpoint()
+    except Exception as e:
+        print(f"Error guardando checkpoint: {str(e)}")
+    bulk_ingestor.close()
 
 class Website(BaseModel):
     nombre: str = Field(..., description="Nombre del sitio web (Amazon, AliExpress, MediaMarkt)")
@@ -60,8 +132,19 @@ class ReviewData(BaseModel):
 
 class SearchRequest(BaseModel):
     query: str
-    search_type: str = 'tf_idf'  # 'boolean' o 'tf_idf'
+    search_type: str = 'tf_idf'  # 'boolean', 'tf_idf', 'bm25', 'semantic' o 'hybrid'
     operator: Optional[str] = 'AND'
+    use_synonyms: bool = Field(True, description="Expandir la consulta con sinónimos (capa de sinónimos del índice)")
+    bm25_k1: Optional[float] = Field(None, ge=0, description="k1 de BM25 para esta consulta (por defecto 1.2)")
+    bm25_b: Optional[float] = Field(None, ge=0, le=1, description="b de BM25 para esta consulta (por defecto 0.75)")
+    bm25_delta: Optional[float] = Field(None, ge=0, description="delta de BM25+ (por defecto 0, BM25 clásico)")
+    fuzzy: bool = Field(False, description="Corregir los términos mal escritos que no están en el índice")
+    snippets: bool = Field(True, description="Añadir a cada resultado fragmentos de la reseña con los términos resaltados")
+    fields: Optional[List[str]] = Field(None, description="Campos de cada resultado (p. ej. ['producto', 'score']; el id siempre se incluye). Por defecto, todos")
+    categories: Optional[List[str]] = Field(None, description="Buscar solo en las particiones de estas categorías")
+    route: bool = Field(False, description="Sin categories, buscar solo en las categorías a las que está ligado el vocabulario de la consulta")
+    limit: Optional[int] = Field(None, ge=1, description="Número máximo de resultados (no se aplica a la búsqueda booleana). Por defecto, todos")
+    include_metrics: bool = Field(False, description="Calcular métricas y estadísticas en segundo plano (consultables con metrics_id)")
 
 class ScoreStats(BaseModel):
     min_score: float
@@ -76,6 +159,9 @@ class SearchResponse(BaseModel):
     results: List[Dict]
     metrics: Optional[Dict] = None
     score_statistics: Optional[ScoreStats] = None
+    metrics_id: Optional[str] = None  # Identificador para recuperar las métricas en /search/metrics/{metrics_id}
+    corrections: Optional[Dict[str, str]] = None  # Términos corregidos si la búsqueda es fuzzy
+    categories: Optional[List[str]] = None  # Particiones consultadas (None: índice completo)
 
 class EvaluationRequest(BaseModel):
     necesidad_id: str
@@ -84,124 +170,460 @@ class EvaluationRequest(BaseModel):
 class ExperimentRequest(BaseModel):
     necesidad_id: str = Field(..., description="ID de la necesidad a analizar")
 
+class ProfileRequest(BaseModel):
+    requests: Optional[int] = Field(None, ge=1, description="Perfilar las próximas N peticiones")
+    seconds: Optional[float] = Field(None, gt=0, le=3600, description="Perfilar las peticiones durante una ventana de tiempo")
+    interval_ms: float = Field(5.0, ge=1, le=1000, description="Milisegundos entre muestras de las pilas")
+    paths: Optional[List[str]] = Field(None, description="Prefijos de ruta a perfilar (p. ej. ['/search', '/evaluate_all']). Por defecto, todas")
+
+def project_results(results: List[Dict], fields: Optional[List[str]]) -> List[Dict]:
+    """Reduce cada resultado a los campos pedidos (y su id)"""
+    if not fields:
+        return results
+    keep = ['id'] + [field for field in fields if field != 'id']
+    return [{field: result[field] for field in keep if field in result} for result in results]
+
+def compute_search_metrics(request: SearchRequest, results: List[Dict]) -> Tuple[Optional[Dict], Optional[ScoreStats]]:
+    """
+    Calcula las métricas y estadísticas de scores de una búsqueda ya resuelta
+    Args:
+        request: SearchRequest original
+        results: Resultados devueltos por search_reviews
+    Returns:
+        Tuple(métricas, estadísticas de scores)
+    """
+    # Calcular métricas y estadísticas según el tipo de búsqueda
+    metrics = None
+    score_statistics = None
+    
+    if request.search_type in ('tf_idf', 'bm25', 'semantic', 'hybrid') and results:
+        # Métricas y estadísticas para búsquedas con ranking (TF-IDF, BM25, semántica o híbrida)
+        scores = [r.get('score', 0.0) for r in results]
+        
+        # Crear rangos de scores para distribución
+        score_ranges = {
+            '0.0-0.1': 0,
+            '0.1-0.2': 0,
+            '0.2-0.3': 0,
+            '0.3-0.4': 0,
+            '0.4-0.5': 0,
+            '0.5+': 0
+        }
+        
+        for score in scores:
+            if score >= 0.5:
+                score_ranges['0.5+'] += 1
+            elif score >= 0.4:
+                score_ranges['0.4-0.5'] += 1
+            elif score >= 0.3:
+                score_ranges['0.3-0.4'] += 1
+            elif score >= 0.2:
+                score_ranges['0.2-0.3'] += 1
+            elif score >= 0.1:
+                score_ranges['0.1-0.2'] += 1
+            else:
+                score_ranges['0.0-0.1'] += 1
+        
+        # Contar matches por categoría
+        category_matches = {}
+        for result in results:
+            category = result.get('categoria', 'Unknown')
+            category_matches[category] = category_matches.get(category, 0) + 1
+        
+        score_statistics = ScoreStats(
+            min_score=min(scores),
+            max_score=max(scores),
+            mean_score=statistics.mean(scores),
+            median_score=statistics.median(scores),
+            score_distribution=score_ranges,
+            total_matches=len(results),
+            matches_by_category=category_matches
+        )
+        
+        # Evaluar usando pseudo-relevance feedback
+        scores_dict = {str(r['id']): r.get('score', 0.0) for r in results}
+        search_results = {request.query: scores_dict}
+        metrics = get_evaluator().evaluate_ranked_search(search_results)
+        
+    elif request.search_type == 'boolean' and results:
+        # Métricas básicas para búsqueda booleana
+        category_matches = {}
+        rating_distribution = {
+            '1-2': 0,
+            '2-3': 0,
+            '3-4': 0,
+            '4-5': 0
+        }
+        
+        for result in results:
+            # Contar por categoría
+            category = result.get('categoria', 'Unknown')
+            category_matches[category] = category_matches.get(category, 0) + 1
+            
+            # Contar por rango de puntuación
+            rating = result.get('puntuacion', 0)
+            if rating >= 4:
+                rating_distribution['4-5'] += 1
+            elif rating >= 3:
+                rating_distribution['3-4'] += 1
+            elif rating >= 2:
+                rating_distribution['2-3'] += 1
+            else:
+                rating_distribution['1-2'] += 1
+        
+        metrics = {
+            'total_results': len(results),
+            'matches_by_category': category_matches,
+            'rating_distribution': rating_distribution,
+            'avg_rating': statistics.mean([r.get('puntuacion', 0) for r in results]) if results else 0
+        }
+    
+    return metrics, score_statistics
+
+def run_metrics_job(metrics_id: str, request: SearchRequest, results: List[Dict]):
+    """Calcula en segundo plano las métricas de una búsqueda y las guarda para su consulta"""
+    try:
+        metrics, score_statistics = compute_search_metrics(request, results)
+        job = {
+            'status': 'done',
+            'metrics': metrics,
+            'score_statistics': score_statistics.dict() if score_statistics else None
+        }
+    except Exception as e:
+        job = {'status': 'error', 'detail': str(e)}
+    with metrics_jobs_lock:
+        if metrics_id in metrics_jobs:
+            metrics_jobs[metrics_id] = job
+
 @app.post("/search")
-async def search(request: SearchRequest) -> SearchResponse:
+async def search(request: SearchRequest, background_tasks: BackgroundTasks) -> SearchResponse:
     """
-    Busca reseñas que coincidan con la consulta y proporciona estadísticas detalladas
+    Busca reseñas que coincidan con la consulta. Las métricas y estadísticas de scores
+    solo se calculan si include_metrics es True, en segundo plano tras enviar la respuesta
     Args:
         request: SearchRequest con query y tipo de búsqueda
     Returns:
-        SearchResponse con resultados, métricas y estadísticas de scores
+        SearchResponse con resultados (reducidos a fields si se indican) y, si se
+        piden métricas, su metrics_id
     """
     try:
         # Realizar búsqueda
+        details = {}
         results = review_handler.search_reviews(
             request.query, 
             request.search_type, 
-            request.operator
+            request.operator,
+            use_synonyms=request.use_synonyms,
+            bm25_params={'k1': request.bm25_k1, 'b': request.bm25_b, 'delta': request.bm25_delta},
+            fuzzy=request.fuzzy,
+            snippets=request.snippets and (not request.fields or 'snippets' in request.fields),
+            categories=request.categories,
+            route=request.route,
+            limit=request.limit,
+            details=details
         )
+        corrections = details['corrections']
+        partitions = details['categories']
         
-        # Calcular métricas y estadísticas según el tipo de búsqueda
-        metrics = None
-        score_statistics = None
+        metrics_id = None
+        if request.include_metrics:
+            metrics_id = str(uuid.uuid4())
+            with metrics_jobs_lock:
+                metrics_jobs[metrics_id] = {'status': 'pending'}
+                while len(metrics_jobs) > MAX_METRICS_JOBS:
+                    metrics_jobs.popitem(last=False)
+            background_tasks.add_task(run_metrics_job, metrics_id, request, results)
         
-        if request.search_type == 'tf_idf' and results:
-            # Métricas y estadísticas para TF-IDF
-            scores = [r.get('score', 0.0) for r in results]
-            
-            # Crear rangos de scores para distribución
-            score_ranges = {
-                '0.0-0.1': 0,
-                '0.1-0.2': 0,
-                '0.2-0.3': 0,
-                '0.3-0.4': 0,
-                '0.4-0.5': 0,
-                '0.5+': 0
-            }
-            
-            for score in scores:
-                if score >= 0.5:
-                    score_ranges['0.5+'] += 1
-                elif score >= 0.4:
-                    score_ranges['0.4-0.5'] += 1
-                elif score >= 0.3:
-                    score_ranges['0.3-0.4'] += 1
-                elif score >= 0.2:
-                    score_ranges['0.2-0.3'] += 1
-                elif score >= 0.1:
-                    score_ranges['0.1-0.2'] += 1
-                else:
-                    score_ranges['0.0-0.1'] += 1
-            
-            # Contar matches por categoría
-            category_matches = {}
-            for result in results:
-                category = result.get('categoria', 'Unknown')
-                category_matches[category] = category_matches.get(category, 0) + 1
-            
-            score_statistics = ScoreStats(
-                min_score=min(scores),
-                max_score=max(scores),
-                mean_score=statistics.mean(scores),
-                median_score=statistics.median(scores),
-                score_distribution=score_ranges,
-                total_matches=len(results),
-                matches_by_category=category_matches
-            )
-            
-            # Evaluar usando pseudo-relevance feedback
-            scores_dict = {str(r['id']): r.get('score', 0.0) for r in results}
-            search_results = {request.query: scores_dict}
-            metrics = evaluator.evaluate_ranked_search(search_results)
-            
-        elif request.search_type == 'boolean' and results:
-            # Métricas básicas para búsqueda booleana
-            category_matches = {}
-            rating_distribution = {
-                '1-2': 0,
-                '2-3': 0,
-                '3-4': 0,
-                '4-5': 0
-            }
-            
-            for result in results:
-                # Contar por categoría
-                category = result.get('categoria', 'Unknown')
-                category_matches[category] = category_matches.get(category, 0) + 1
-                
-                # Contar por rango de puntuación
-                rating = result.get('puntuacion', 0)
-                if rating >= 4:
-                    rating_distribution['4-5'] += 1
-                elif rating >= 3:
-                    rating_distribution['3-4'] += 1
-                elif rating >= 2:
-                    rating_distribution['2-3'] += 1
-                else:
-                    rating_distribution['1-2'] += 1
-            
-            metrics = {
-                'total_results': len(results),
-                'matches_by_category': category_matches,
-                'rating_distribution': rating_distribution,
-                'avg_rating': statistics.mean([r.get('puntuacion', 0) for r in results]) if results else 0
-            }
-        
-        return SearchResponse(
-            results=results,
-            metrics=metrics,
-            score_statistics=score_statistics
-        )
+        return SearchResponse(results=project_results(results, request.fields), metrics_id=metrics_id,
+                              corrections=corrections, categories=partitions)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/search/metrics/{metrics_id}")
+async def get_search_metrics(metrics_id: str):
+    """Devuelve las métricas calculadas en segundo plano para una búsqueda con include_metrics"""
+    with metrics_jobs_lock:
+        job = metrics_jobs.get(metrics_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="metrics_id no encontrado o caducado")
+    return {"metrics_id": metrics_id, **job}
+
+@app.get("/suggest")
+async def suggest(q: str, limit: int = Query(10, ge=1, le=20)):
+    """Autocompletado: términos y conceptos que empiezan por la última palabra de q"""
+    try:
+        suggestions = await run_in_threadpool(review_handler.text_processor.suggest, q, limit)
+        return {"status": "success", "prefix": q, "suggestions": suggestions}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+DUPLICATES_PATTERN = '^(allow|link|skip)$'
+
 @app.post("/process_review")
-async def process_review(review: ReviewData):
-    """Procesa y almacena una nueva reseña"""
+async def process_review(review: ReviewData, duplicates: Optional[str] = Query(None, pattern=DUPLICATES_PATTERN)):
+    """
+    Procesa y almacena una nueva reseña. Con duplicates (o DUPLICATE_POLICY) se decide
+    qué hacer si es casi duplicada de otra: 'skip' no la guarda, 'link' la guarda con
+    duplicate_of y 'allow' no comprueba.
+    """
     try:
-        filename = review_handler.save_review(review.dict())
-        return {"status": "success", "filename": filename}
+        review_data = review.dict()
+        review_id = review_handler.save_review(review_data, duplicates)
+        if review_id != review_data['id']:
+            return {"status": "duplicate", "id": review_data['id'], "duplicate_of": review_id}
+        response = {"status": "success", "id": review_id}
+        if 'duplicate_of' in review_data:
+            response["duplicate_of"] = review_data['duplicate_of']
+        return response
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/reviews/{review_id}")
+async def delete_review(review_id: str):
+    """Borra una reseña del almacén y del índice"""
+    try:
+        deleted = review_handler.delete_review(review_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Reseña no encontrada")
+    return {"status": "success", "id": review_id}
+
+@app.get("/reviews/{review_id}/similar")
+async def similar_reviews(review_id: str, limit: int = Query(10, ge=1, le=50)):
+    """Reseñas parecidas a una reseña indexada, a partir de su vector de términos guardado"""
+    try:
+        results = review_handler.similar_reviews(review_id, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if results is None:
+        raise HTTPException(status_code=404, detail="Reseña no encontrada")
+    return {"status": "success", "id": review_id, "results": results}
+
+@app.post("/bulk_ingest")
+async def bulk_ingest(request: Request, duplicates: Optional[str] = Query(None, pattern=DUPLICATES_PATTERN)):
+    """
+    Ingesta masiva de reseñas en formato NDJSON (una ReviewData por línea).
+    Las líneas se validan y procesan por lotes: análisis en paralelo, escritura en el
+    almacén con un commit por lote y actualización del índice en bloque. Las casi
+    duplicadas (del índice o del propio envío) siguen la política duplicates.
+    Returns:
+        Resumen y estado por línea ('indexed', 'duplicate', 'invalid' o 'error')
+    """
+    statuses = []
+    batch = []
+    buffer = b''
+    line_number = 0
+    start_time = time.time()
+    
+    def parse_line(raw: bytes):
+        nonlocal line_number
+        line_number += 1
+        raw = raw.strip()
+        if not raw:
+            return
+        try:
+            obj = json.loads(raw)
+            if not isinstance(obj, dict):
+                raise ValueError(f"se esperaba un objeto JSON, no {type(obj).__name__}")
+            review = ReviewData(**obj)
+            batch.append((line_number, review.dict()))
+        except (ValueError, ValidationError) as e:
+            statuses.append({'line': line_number, 'status': 'invalid', 'error': str(e)})
+    
+    try:
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b'\n')
+            for raw in lines:
+                parse_line(raw)
+            if len(batch) >= BULK_BATCH_SIZE:
+                statuses.extend(await run_in_threadpool(bulk_ingestor.ingest_batch, batch, duplicates))
+                batch = []
+        parse_line(buffer)
+        statuses.extend(await run_in_threadpool(bulk_ingestor.ingest_batch, batch, duplicates))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    statuses.sort(key=lambda status: status['line'])
+    elapsed = time.time() - start_time
+    indexed = sum(1 for status in statuses if status['status'] == 'indexed')
+    skipped = sum(1 for status in statuses if status['status'] == 'duplicate')
+    return {
+        "status": "success",
+        "total": len(statuses),
+        "indexed": indexed,
+        "duplicates": skipped,
+        "failed": len(statuses) - indexed - skipped,
+        "elapsed_seconds": elapsed,
+        "reviews_per_second": indexed / elapsed if elapsed > 0 else 0.0,
+        "results": statuses
+    }
+
+@app.get("/store/stats")
+async def store_stats(x_admin_token: Optional[str] = Header(None)):
+    """Ocupación del almacén segmentado de reseñas"""
+    check_admin(x_admin_token)
+    return {"status": "success", "store": review_handler.store.stats()}
+
+@app.post("/store/compact")
+async def compact_store(x_admin_token: Optional[str] = Header(None)):
+    """
+    Reescribe el almacén sin las versiones reemplazadas ni las reseñas borradas (en un
+    hilo del pool: la reescritura es larga y no debe bloquear el bucle de eventos)
+    """
+    check_admin(x_admin_token)
+    try:
+        return {"status": "success", "compaction": await run_in_threadpool(review_handler.compact_store)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def check_admin(token: Optional[str]):
+    """
+    Comprueba la cabecera X-Admin-Token. Sin ADMIN_TOKEN configurado los endpoints de
+    administración quedan desactivados (503): nunca se abren sin token
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=503, detail="Administración desactivada: configure ADMIN_TOKEN")
+    if token is None or not hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        raise HTTPException(status_code=403, detail="Token de administración no válido")
+
+@app.post("/admin/rebuild")
+async def admin_rebuild(x_admin_token: Optional[str] = Header(None)):
+    """
+    Reconstruye el índice en segundo plano: se construye uno nuevo aparte y se
+    sustituye al activo de forma atómica, sin interrumpir las búsquedas
+    """
+    check_admin(x_admin_token)
+    if not index_rebuilder.start():
+        raise HTTPException(status_code=409, detail="Ya hay una reconstrucción o compactación del índice en curso")
+    return {"status": "started", "rebuild": index_rebuilder.status()}
+
+@app.get("/admin/rebuild")
+async def admin_rebuild_status(x_admin_token: Optional[str] = Header(None)):
+    """Estado y progreso de la última reconstrucción del índice"""
+    check_admin(x_admin_token)
+    return {"status": "success", "rebuild": index_rebuilder.status()}
+
+@app.post("/admin/compact")
+async def admin_compact(reconcile: bool = True, x_admin_token: Optional[str] = Header(None)):
+    """
+    Compacta el índice en segundo plano: lo reconcilia con el almacén, lo reescribe sin
+    postings de reseñas borradas o reemplazadas ni términos vacíos y guarda un checkpoint
+    """
+    check_admin(x_admin_token)
+    if not index_compactor.start(reconcile=reconcile):
+        raise HTTPException(status_code=409, detail="Ya hay una reconstrucción o compactación del índice en curso")
+    return {"status": "started", "compaction": index_compactor.status()}
+
+@app.get("/admin/compact")
+async def admin_compact_status(x_admin_token: Optional[str] = Header(None)):
+    """Estado y resultado (memoria recuperada) de la última compactación del índice"""
+    check_admin(x_admin_token)
+    return {"status": "success", "compaction": index_compactor.status()}
+
+@app.post("/admin/profile")
+async def start_profile(request: ProfileRequest, x_admin_token: Optional[str] = Header(None)):
+    """
+    Perfila por muestreo las próximas `requests` peticiones o las de los próximos
+    `seconds` segundos; los resultados se consultan en GET /admin/profile
+    """
+    check_admin(x_admin_token)
+    try:
+        session = profiler.start(request.requests, request.seconds, request.interval_ms / 1000, request.paths)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "started", "profile": session}
+
+@app.get("/admin/profile")
+async def profile_report(top: int = Query(25, ge=1, le=200), x_admin_token: Optional[str] = Header(None)):
+    """Estado de la sesión de perfilado y tiempo por función y por componente"""
+    check_admin(x_admin_token)
+    return {"status": "success", **profiler.report(top)}
+
+@app.get("/admin/profile/collapsed", response_class=PlainTextResponse)
+async def profile_collapsed(x_admin_token: Optional[str] = Header(None)):
+    """Pilas plegadas de la última sesión (entrada de flamegraph.pl o speedscope)"""
+    check_admin(x_admin_token)
+    return PlainTextResponse(profiler.collapsed())
+
+@app.delete("/admin/profile")
+async def stop_profile(x_admin_token: Optional[str] = Header(None)):
+    """Termina la sesión de perfilado en curso y conserva sus resultados"""
+    check_admin(x_admin_token)
+    return {"status": "stopped", "profile": profiler.stop()}
+
+@app.get("/index/wal")
+async def wal_stats(x_admin_token: Optional[str] = Header(None)):
+    """Estado del write-ahead log y del último checkpoint del índice"""
+    check_admin(x_admin_token)
+    return {"status": "success", "wal": review_handler.wal.stats()}
+
+@app.middleware("http")
+async def require_ready_index(request: Request, call_next):
+    """Hasta que el índice está listo solo responden los endpoints de salud y arranque (503)"""
+    if not lifecycle.ready and request.url.path not in LIFECYCLE_PATHS:
+        return JSONResponse(status_code=503, headers={"Retry-After": "1"},
+                            content={"detail": f"Índice no disponible ({lifecycle.state})"})
+    return await call_next(request)
+
+@app.get("/health/live")
+async def health_live():
+    """
+    El proceso responde (aunque el índice se esté cargando); 503 si la carga del índice
+    falló, porque la instancia ya no llegará a estar lista y hay que reiniciarla
+    """
+    if lifecycle.state == ServiceLifecycle.FAILED:
+        return JSONResponse(status_code=503, content={"status": "failed", "state": lifecycle.state,
+                                                      "error": lifecycle.error})
+    return {"status": "alive", "state": lifecycle.state}
+
+@app.get("/health/ready")
+async def health_ready():
+    """Listo para recibir tráfico: generación del índice cargada y calentada (503 si no)"""
+    status = lifecycle.status()
+    if not status['ready']:
+        return JSONResponse(status_code=503, content={"status": "not_ready", "lifecycle": status})
+    return {"status": "ready", "lifecycle": status}
+
+@app.get("/index/startup")
+async def startup_stats():
+    """Desglose en segundos del arranque del servicio (importaciones, carga del índice y WAL)"""
+    return {"status": "success", "state": lifecycle.state, "startup": startup_timings}
+
+@app.get("/index/partitions")
+async def partition_stats():
+    """Particiones del índice por categoría (documentos, longitud media y segmentos de cada una)"""
+    return {"status": "success", "partitions": review_handler.text_processor.partition_stats()}
+
+@app.get("/index/semantic")
+async def semantic_stats():
+    """Estado del modelo semántico (LSA) de la búsqueda semantic/hybrid"""
+    return {"status": "success", "semantic": review_handler.text_processor.semantic.stats()}
+
+@app.get("/duplicates/report")
+async def duplicates_report():
+    """Grupos de reseñas casi duplicadas (MinHash/LSH) del corpus indexado"""
+    try:
+        clusters = await run_in_threadpool(review_handler.duplicate_report)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "status": "success",
+        "clusters": len(clusters),
+        "duplicated_reviews": sum(cluster['size'] for cluster in clusters),
+        "report": clusters
+    }
+
+@app.post("/index/checkpoint")
+async def index_checkpoint(x_admin_token: Optional[str] = Header(None)):
+    """Fuerza un checkpoint del índice y vacía el WAL"""
+    check_admin(x_admin_token)
+    try:
+        return {"status": "success", "wal": await run_in_threadpool(review_handler.checkpoint)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -217,20 +639,22 @@ async def evaluate_search(eval_request: EvaluationRequest):
         # Usar la consulta apropiada según el tipo de búsqueda
         query = necesidad['consulta_libre'] if eval_request.search_type == 'tf_idf' else necesidad['consulta_booleana']
         
-        # Reutilizar la lógica del endpoint /search
+        # Reutilizar la lógica del endpoint /search, calculando las métricas de forma síncrona
         search_request = SearchRequest(
             query=query,
-            search_type=eval_request.search_type
+            search_type=eval_request.search_type,
+            include_metrics=True
         )
         
-        search_response = await search(search_request)
+        results = review_handler.search_reviews(query, eval_request.search_type, search_request.operator)
+        metrics, score_statistics = compute_search_metrics(search_request, results)
         
         return {
             "status": "success",
             "necesidad": necesidad,
-            "results": search_response.results,
-            "metrics": search_response.metrics,
-            "score_statistics": search_response.score_statistics
+            "results": results,
+            "metrics": metrics,
+            "score_statistics": score_statistics
         }
         
     except Exception as e:
@@ -284,7 +708,7 @@ async def run_experiments(request: ExperimentRequest):
         else:
             tfidf_scores = tfidf_results
             
-        metrics_with_syn = evaluator.evaluate_ranked_search({necesidad['id']: tfidf_scores})
+        metrics_with_syn = get_evaluator().evaluate_ranked_search({necesidad['id']: tfidf_scores})
         
         results['synonyms'] = {
             'with_synonyms': {
@@ -307,7 +731,7 @@ async def run_experiments(request: ExperimentRequest):
             }
             
             # Evaluar con el umbral
-            metrics = evaluator.evaluate_ranked_search({necesidad['id']: filtered_results})
+            metrics = get_evaluator().evaluate_ranked_search({necesidad['id']: filtered_results})
             
             # Calcular estadísticas de scores
             scores = list(tfidf_scores.values())
@@ -339,7 +763,7 @@ async def run_experiments(request: ExperimentRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/evaluate_all")
-async def evaluate_all():
+async def evaluate_all(k: int = Query(10, ge=1, description="Corte para las métricas @k (P@k, R@k, nDCG@k)")):
     """Evalúa todas las necesidades de información usando tf-idf y pseudo-relevance feedback"""
     try:
         all_metrics = {
@@ -351,29 +775,31 @@ async def evaluate_all():
             }
         }
         
-        # Evaluar cada necesidad
+        # Realizar las búsquedas tf-idf de cada necesidad
+        search_results = {}
         for necesidad in NECESIDADES:
-            # Realizar búsqueda tf-idf
             results = review_handler.search_reviews(
                 necesidad['consulta_libre'],
                 'tf_idf'
             )
-            
-            # Calcular métricas si hay resultados
             if results:
-                scores = {str(r['id']): r.get('score', 0.0) for r in results}
-                search_results = {necesidad['id']: scores}
-                metrics = evaluator.evaluate_ranked_search(search_results)
-                
-                all_metrics['per_necesidad'][necesidad['id']] = {
-                    'descripcion': necesidad['descripcion'],
-                    'metricas': metrics['per_query'][necesidad['id']]
-                }
-                
-                # Actualizar métricas globales
-                all_metrics['overall']['map'] += metrics['overall']['map']
-                all_metrics['overall']['precision'] += metrics['overall']['precision']
-                all_metrics['overall']['recall'] += metrics['overall']['recall']
+                search_results[necesidad['id']] = {str(r['id']): r.get('score', 0.0) for r in results}
+        
+        # Calcular las métricas de todas las necesidades con resultados en un solo lote
+        metrics = get_evaluator().evaluate_ranked_batch(search_results, k=k)
+        for necesidad in NECESIDADES:
+            if necesidad['id'] not in metrics['per_query']:
+                continue
+            per_query = metrics['per_query'][necesidad['id']]
+            all_metrics['per_necesidad'][necesidad['id']] = {
+                'descripcion': necesidad['descripcion'],
+                'metricas': per_query
+            }
+            
+            # Actualizar métricas globales
+            all_metrics['overall']['map'] += per_query['average_precision']
+            all_metrics['overall']['precision'] += per_query['precision']
+            all_metrics['overall']['recall'] += per_query['recall']
         
         # Calcular promedios globales
         num_necesidades = len(NECESIDADES)
@@ -403,12 +829,12 @@ async def get_statistics():
 
 if __name__ == "__main__":
     import uvicorn
-    # Ensure NLTK data is downloaded
-    try:
-        nltk.download('punkt', download_dir='nltk_data')
-        nltk.download('stopwords', download_dir='nltk_data')
-        nltk.download('wordnet', download_dir='nltk_data')
-    except Exception as e:
-        print(f"Warning: Failed to download NLTK data: {e}")
+    # El servicio arranca sin red; los recursos de NLTK solo se descargan si se pide
+    if os.environ.get('NLTK_DOWNLOAD') == '1':
+        try:
+            import nltk
+            nltk.download('stopwords', download_dir='nltk_data')
+        except Exception as e:
+            print(f"Warning: Failed to download NLTK data: {e}")
     
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000) 
@@ -0,0 +1,188 @@
+import json
+import os
+import pickle
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+class WriteAheadLog:
+    """
+    Registro de escritura anticipada (WAL) para las mutaciones de reseñas e índice.
+    Cada mutación (alta/actualización o borrado) se escribe y se hace duradera con
+    fsync antes de aplicarse al almacén y al índice en memoria. Junto al log se
+    guardan checkpoints del índice: al arrancar se carga el último checkpoint y solo
+    se reproducen las mutaciones posteriores, de modo que la recuperación depende de
+    la cola del log y no del tamaño del corpus.
+    """
+    MAGIC = b'WAL1'
+    HEADER = struct.Struct('<4sQII')  # magic, LSN, longitud payload, crc32
+    OP_PUT = 'put'
+    OP_DELETE = 'delete'
+
+    def __init__(self, log_dir: Path):
+        """
+        Args:
+            log_dir: Directorio donde se guardan wal.log y los checkpoints index_*.ckpt
+        """
+        self.log_dir = Path(log_dir)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.log_path = self.log_dir / 'wal.log'
+        self._lock = threading.Lock()
+        self.checkpoint_lsn = self._latest_checkpoint_lsn()
+        self.last_lsn = self.checkpoint_lsn
+        self.records_since_checkpoint = 0
+        self._recover_tail()
+        self._file = self.log_path.open('ab')
+
+    # ------------------------------------------------------------------
+    # Log
+    # ------------------------------------------------------------------
+    def _iter_log(self) -> Iterator[Tuple[int, int, Dict]]:
+        """Recorre los registros válidos del log: (LSN, offset final, mutación)"""
+        if not self.log_path.exists():
+            return
+        with self.log_path.open('rb') as f:
+            data = f.read()
+        offset = 0
+        while offset + self.HEADER.size <= len(data):
+            magic, lsn, payload_len, crc = self.HEADER.unpack_from(data, offset)
+            end = offset + self.HEADER.size + payload_len
+            if magic != self.MAGIC or end > len(data):
+                break
+            payload = data[offset + self.HEADER.size:end]
+            if zlib.crc32(payload) != crc:
+                break
+            yield lsn, end, json.loads(payload)
+            offset = end
+
+    def _recover_tail(self):
+        """Obtiene el último LSN y descarta un registro incompleto al final del log"""
+        valid_end = 0
+        for lsn, end, _ in self._iter_log():
+            valid_end = end
+            self.last_lsn = max(self.last_lsn, lsn)
+            if lsn > self.checkpoint_lsn:
+                self.records_since_checkpoint += 1
+        if self.log_path.exists() and valid_end < self.log_path.stat().st_size:
+            print(f"WriteAheadLog: truncando wal.log en {valid_end} bytes")
+            with self.log_path.open('r+b') as f:
+                f.truncate(valid_end)
+
+    def append(self, op: str, review_id: str, review: Optional[Dict] = None) -> int:
+        """Registra una mutación y la hace duradera antes de devolver su LSN"""
+        return self.append_many([(op, review_id, review)])
+
+    def append_many(self, mutations: Iterable[Tuple[str, str, Optional[Dict]]]) -> int:
+        """
+        Registra varias mutaciones con un único fsync (group commit)
+        Returns:
+            LSN de la última mutación registrada
+        """
+        with self._lock:
+            records = []
+            for op, review_id, review in mutations:
+                self.last_lsn += 1
+                mutation = {'op': op, 'id': review_id}
+                if review is not None:
+                    mutation['review'] = review
+                payload = json.dumps(mutation, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+                records.append(self.HEADER.pack(self.MAGIC, self.last_lsn, len(payload), zlib.crc32(payload)) + payload)
+            if records:
+                self._file.write(b''.join(records))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self.records_since_checkpoint += len(records)
+            return self.last_lsn
+
+    def replay(self, after_lsn: Optional[int] = None) -> Iterator[Tuple[int, Dict]]:
+        """Recorre en orden las mutaciones con LSN posterior a after_lsn (por defecto, al último checkpoint)"""
+        after_lsn = self.checkpoint_lsn if after_lsn is None else after_lsn
+        with self._lock:
+            self._file.flush()
+        for lsn, _, mutation in self._iter_log():
+            if lsn > after_lsn:
+                yield lsn, mutation
+
+    # ------------------------------------------------------------------
+    # Checkpoints
+    # ------------------------------------------------------------------
+    def _checkpoint_path(self, lsn: int) -> Path:
+        return self.log_dir / f"index_{lsn:012d}.ckpt"
+
+    def _checkpoint_lsns(self) -> List[int]:
+        return sorted(int(path.stem.split('_')[1]) for path in self.log_dir.glob('index_*.ckpt'))
+
+    def _latest_checkpoint_lsn(self) -> int:
+        lsns = self._checkpoint_lsns()
+        return lsns[-1] if lsns else 0
+
+    def has_checkpoint(self) -> bool:
+        return bool(self._checkpoint_lsns())
+
+    def load_checkpoint(self) -> Optional[Dict]:
+        """Carga el estado del índice del último checkpoint (None si no hay o está dañado)"""
+        for lsn in reversed(self._checkpoint_lsns()):
+            try:
+                with self._checkpoint_path(lsn).open('rb') as f:
+                    checkpoint = pickle.load(f)
+                self.checkpoint_lsn = lsn
+                return checkpoint['state']
+            except Exception as e:
+                print(f"WriteAheadLog: checkpoint {lsn} no válido: {str(e)}")
+        self.checkpoint_lsn = 0
+        return None
+
+    def save_checkpoint(self, state: Dict, lsn: int):
+        """
+        Guarda el estado del índice hasta lsn (fichero temporal + fsync + rename atómico)
+        y vacía el log, cuyas mutaciones quedan cubiertas por el checkpoint.
+        El llamante debe impedir nuevas mutaciones mientras tanto.
+        """
+        path = self._checkpoint_path(lsn)
+        tmp_path = path.with_suffix('.tmp')
+        with tmp_path.open('wb') as f:
+            pickle.dump({'lsn': lsn, 'state': state}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self._sync_dir()
+
+        with self._lock:
+            self.checkpoint_lsn = lsn
+            self.records_since_checkpoint = 0
+            self._file.close()
+            self._file = self.log_path.open('wb')
+            os.fsync(self._file.fileno())
+        for old_lsn in self._checkpoint_lsns():
+            if old_lsn < lsn:
+                self._checkpoint_path(old_lsn).unlink()
+
+    def _sync_dir(self):
+        """Hace duradero el rename del checkpoint en el directorio"""
+        try:
+            fd = os.open(self.log_dir, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def stats(self) -> Dict:
+        """Estado del log y del último checkpoint"""
+        return {
+            'last_lsn': self.last_lsn,
+            'checkpoint_lsn': self.checkpoint_lsn,
+            'records_since_checkpoint': self.records_since_checkpoint,
+            'log_bytes': self.log_path.stat().st_size if self.log_path.exists() else 0
+        }
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None